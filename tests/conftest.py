@@ -0,0 +1,58 @@
+"""测试公共设置：把缓存目录指向临时目录，加载字体查看器模块，并生成测试字体"""
+import importlib
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("FONT_VIEWER_CACHE", tempfile.mkdtemp(prefix="font-viewer-test-"))
+
+# 进程池使用spawn方式，子进程需要能按名称导入模块
+sys.path.insert(0, ROOT)
+viewer_module = importlib.import_module("字体查看器")
+
+TEST_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 .,"
+
+
+def build_test_font(path, family="Test Sans", style="Regular", os2=True):
+    """用 fontTools 生成一个每个字形都是矩形的小TrueType字体"""
+    fontBuilder = pytest.importorskip("fontTools.fontBuilder")
+    from fontTools.pens.ttGlyphPen import TTGlyphPen
+
+    names = [".notdef"] + [f"uni{ord(char):04X}" for char in TEST_CHARS]
+    glyphs = {}
+    for name in names:
+        pen = TTGlyphPen(None)
+        if name != "uni0020":
+            pen.moveTo((50, 0))
+            pen.lineTo((50, 700))
+            pen.lineTo((450, 700))
+            pen.lineTo((450, 0))
+            pen.closePath()
+        glyphs[name] = pen.glyph()
+
+    builder = fontBuilder.FontBuilder(1000, isTTF=True)
+    builder.setupGlyphOrder(names)
+    builder.setupCharacterMap({ord(char): f"uni{ord(char):04X}" for char in TEST_CHARS})
+    builder.setupGlyf(glyphs)
+    builder.setupHorizontalMetrics({name: (500, 50) for name in names})
+    builder.setupHorizontalHeader(ascent=900, descent=-300, lineGap=100)
+    builder.setupNameTable({"familyName": family, "styleName": style})
+    builder.setupOS2(sTypoAscender=800, sTypoDescender=-200, sTypoLineGap=200, usWeightClass=400)
+    builder.setupPost()
+    if not os2:
+        del builder.font["OS/2"]
+    builder.save(str(path))
+    return str(path)
+
+
+@pytest.fixture(scope="session")
+def viewer():
+    return viewer_module
+
+
+@pytest.fixture
+def font_path(tmp_path):
+    return build_test_font(tmp_path / "TestSans-Regular.ttf")
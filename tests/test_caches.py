@@ -0,0 +1,70 @@
+"""统一内存预算缓存的测试"""
+
+
+def test_least_recently_used_entry_is_evicted_first(viewer):
+    manager = viewer.CacheManager(3000)
+    cache = manager.cache("test")
+    for key in ("a", "b", "c"):
+        cache.put(key, key, size=1000)
+    assert cache.get("a") == "a"
+    cache.put("d", "d", size=1000)
+    assert cache.keys() == ["c", "a", "d"]
+    assert cache.evictions == 1
+    assert manager.used == 3000
+
+
+def test_expensive_entries_outlive_cheap_ones(viewer):
+    manager = viewer.CacheManager(3000)
+    cache = manager.cache("test")
+    cache.put("expensive", 1, size=1000, cost=10.0)
+    cache.put("cheap1", 2, size=1000)
+    cache.put("cheap2", 3, size=1000)
+    cache.put("cheap3", 4, size=1000)
+    cache.put("cheap4", 5, size=1000)
+    assert "expensive" in cache
+    assert cache.keys() == ["expensive", "cheap3", "cheap4"]
+
+
+def test_large_entries_are_evicted_before_small_ones(viewer):
+    manager = viewer.CacheManager(10000)
+    cache = manager.cache("test")
+    cache.put("large", 1, size=8000)
+    cache.put("small", 2, size=1000)
+    cache.put("new", 3, size=2000)
+    assert cache.keys() == ["small", "new"]
+
+
+def test_priority_is_shared_across_caches(viewer):
+    manager = viewer.CacheManager(2000)
+    important = manager.cache("important", priority=4.0)
+    disposable = manager.cache("disposable", priority=1.0)
+    important.put("a", 1, size=1000)
+    disposable.put("b", 2, size=1000)
+    disposable.put("c", 3, size=1000)
+    assert important.keys() == ["a"]
+    assert disposable.keys() == ["c"]
+
+
+def test_old_entries_are_eventually_evicted(viewer):
+    # 基准值随淘汰提升，长期不用的高代价条目最终也会被淘汰
+    manager = viewer.CacheManager(2000)
+    cache = manager.cache("test")
+    cache.put("old", 0, size=1000, cost=5.0)
+    for i in range(20):
+        cache.put(i, i, size=1000)
+    assert "old" not in cache
+
+
+def test_set_budget_and_stats(viewer):
+    manager = viewer.CacheManager(10000)
+    cache = manager.cache("test")
+    for key in range(5):
+        cache.put(key, key, size=1000)
+    cache.get(0)
+    cache.get("missing")
+    manager.set_budget(2000)
+    stats = manager.stats()
+    assert stats["used_bytes"] <= 2000
+    assert stats["caches"]["test"]["evictions"] == 3
+    assert stats["hit_rate"] == 0.5
+    assert manager.cache("test") is cache
@@ -0,0 +1,44 @@
+"""目录报告断点续写的测试"""
+import csv
+import json
+
+import pytest
+
+
+def report_items(count):
+    face = {"style": "Regular", "weight": 400, "units_per_em": 1000, "codepoints": 95,
+            "coverage": "", "path": "/fonts/x.ttf", "index": 0}
+    return [(f"Family {i:03d}", ["英文字体"], face, "") for i in range(count)]
+
+
+@pytest.mark.parametrize("suffix", ["csv", "jsonl"])
+def test_resume_skips_completed_families_and_drops_partial_line(viewer, tmp_path, suffix):
+    path = tmp_path / f"report.{suffix}"
+    report = viewer.CatalogReport(str(path))
+    items = report_items(10)
+    assert report.write(items[:4]) == 4
+
+    # 模拟中断：最后一行只写了一半
+    with open(path, "ab") as f:
+        f.write(b"Family 004,")
+    assert report.completed_families() == {f"Family {i:03d}" for i in range(4)}
+
+    progress = []
+    assert report.write(items, progress=lambda done, total: progress.append((done, total)), resume=True) == 6
+    assert progress[-1] == (10, 10)
+
+    with open(path, encoding="utf-8", newline="") as f:
+        if suffix == "csv":
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f]
+    assert [row["family"] for row in rows] == [family for family, *rest in items]
+    assert rows[0]["categories"] == "英文字体"
+    assert str(rows[0]["weight"]) == "400"
+
+
+def test_resume_without_existing_file(viewer, tmp_path):
+    report = viewer.CatalogReport(str(tmp_path / "report.csv"))
+    assert report.completed_families() == set()
+    assert report.write(report_items(3), resume=True) == 3
+    assert len(report.completed_families()) == 3
@@ -0,0 +1,69 @@
+"""目录快照的测试"""
+import pytest
+
+from conftest import build_test_font
+
+
+@pytest.fixture
+def catalog(viewer, tmp_path):
+    fonts = tmp_path / "fonts"
+    fonts.mkdir()
+    for family in ("Alpha Sans", "Beta Serif", "Gamma Mono"):
+        build_test_font(fonts / f"{family.replace(' ', '')}.ttf", family=family)
+    resolver = viewer.FontFileResolver(directories=[str(fonts)])
+    resolver.scan()
+    families = resolver.families()
+    categories = {"等宽字体": ["Gamma Mono"], "衬线字体": ["Beta Serif"]}
+    path = str(tmp_path / "catalog.snap")
+    files, faces = viewer.CatalogSnapshot.write(path, resolver, families, categories, "digest")
+    assert (files, faces) == (3, 3)
+    snapshot = viewer.CatalogSnapshot(path)
+    yield snapshot, resolver, fonts
+    snapshot.close()
+
+
+def test_round_trip(catalog):
+    snapshot, resolver, fonts = catalog
+    assert snapshot.families() == ["Alpha Sans", "Beta Serif", "Gamma Mono"]
+    assert snapshot.categories() == {"等宽字体": ["Gamma Mono"], "衬线字体": ["Beta Serif"]}
+    assert snapshot.info["rules"] == "digest"
+    assert snapshot.family_faces("beta serif") == resolver.faces["beta serif"]
+    assert snapshot.family_faces("delta") is None
+    assert snapshot.search("SANS") == {"Alpha Sans"}
+    assert snapshot.search("a") == {"Alpha Sans", "Beta Serif", "Gamma Mono"}
+    assert snapshot.search("a\nb") == set()
+
+
+def test_validate_reports_changed_and_removed_files(catalog):
+    snapshot, resolver, fonts = catalog
+    verified = {}
+    assert snapshot.validate([str(fonts)], verified) == ([], [])
+    assert len(verified) == 3
+
+    build_test_font(fonts / "BetaSerif.ttf", family="Beta Serif", style="Bold")
+    (fonts / "GammaMono.ttf").unlink()
+    build_test_font(fonts / "Delta.ttf", family="Delta")
+    updated, removed = snapshot.validate([str(fonts)], {})
+    assert sorted(updated) == [str(fonts / "BetaSerif.ttf"), str(fonts / "Delta.ttf")]
+    assert removed == [str(fonts / "GammaMono.ttf")]
+
+
+def test_update_files_patches_only_affected_families(viewer, catalog, monkeypatch):
+    snapshot, resolver, fonts = catalog
+    resolver.faces = viewer.SnapshotFaceMap(snapshot)
+    build_test_font(fonts / "Delta.ttf", family="Delta")
+    (fonts / "GammaMono.ttf").unlink()
+
+    decoded = []
+    original_face = snapshot.face
+    monkeypatch.setattr(snapshot, "face", lambda face_id: decoded.append(face_id) or original_face(face_id))
+    parsed = resolver.update_files([str(fonts / "Delta.ttf")], [str(fonts / "GammaMono.ttf")])
+
+    assert [face["family"] for face in parsed] == ["Delta"]
+    assert isinstance(resolver.faces, viewer.SnapshotFaceMap)
+    assert sorted(set(decoded)) == [2]
+    assert sorted(resolver.faces) == ["alpha sans", "beta serif", "delta"]
+    assert len(resolver.faces) == 3
+    assert resolver.faces.get("gamma mono") is None
+    assert resolver.resolve("Delta") == (str(fonts / "Delta.ttf"), 0)
+    assert resolver.resolve("Alpha Sans") == (str(fonts / "AlphaSans.ttf"), 0)
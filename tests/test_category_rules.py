@@ -0,0 +1,82 @@
+"""分类规则和关键字自动机的测试"""
+import json
+
+import pytest
+
+
+def test_keyword_automaton_finds_overlapping_keywords(viewer):
+    automaton = viewer.KeywordAutomaton(["he", "she", "his", "hers"])
+    assert automaton.search("ushers") == {0, 1, 3}
+    assert automaton.search("this") == {2}
+    assert automaton.search("xyz") == set()
+
+
+def test_keyword_automaton_without_keywords(viewer):
+    assert viewer.KeywordAutomaton([]).search("anything") == set()
+
+
+def test_default_rules_classify_by_name(viewer):
+    rules = viewer.CategoryRuleSet(viewer.DEFAULT_CATEGORY_RULES)
+    assert rules.classify("Courier New") == ["英文字体", "等宽字体"]
+    assert rules.classify("Microsoft YaHei") == ["中文字体", "无衬线字体"]
+    # 已属于衬线字体时不再归入无衬线字体
+    assert rules.classify("Times New Roman") == ["英文字体", "衬线字体"]
+    assert rules.classify("Unknown") == []
+
+
+def test_exclude_and_metadata_conditions(viewer):
+    rules = viewer.CategoryRuleSet([
+        {"name": "黑体", "keywords": ["hei"], "exclude": ["yahei"]},
+        {"name": "粗体", "weight_min": 600},
+        {"name": "等宽", "monospace": True, "unless": ["粗体"]},
+    ])
+    assert rules.needs_metadata
+    assert rules.metadata_names == {"粗体", "等宽"}
+    assert rules.classify("SimHei") == ["黑体"]
+    assert rules.classify("Microsoft YaHei") == []
+    assert rules.classify("Mono", {"weight": 700, "monospace": True}) == ["粗体"]
+    assert rules.classify("Mono", {"weight": 400, "monospace": True}) == ["等宽"]
+    # 没有字体信息时元数据规则不匹配
+    assert rules.classify("Mono") == []
+
+
+def test_affected_by_follows_unless(viewer):
+    old = viewer.CategoryRuleSet([{"name": "A", "keywords": ["a"]}, {"name": "B", "keywords": ["b"], "unless": ["A"]},
+                                  {"name": "C", "keywords": ["c"]}])
+    new = viewer.CategoryRuleSet([{"name": "A", "keywords": ["x"]}, {"name": "B", "keywords": ["b"], "unless": ["A"]},
+                                  {"name": "C", "keywords": ["c"]}])
+    assert new.affected_by(old) == {"A", "B"}
+
+
+@pytest.mark.parametrize("rules", [
+    {},
+    "rules",
+    [1],
+    [["name", "A"]],
+    [{"keywords": ["a"]}],
+    [{"name": "A"}, {"name": "A"}],
+    [{"name": "所有字体", "keywords": ["a"]}],
+    [{"name": "收藏夹", "keywords": ["a"]}],
+    [{"name": "A", "keywords": "abc"}],
+    [{"name": "A", "keywords": ["a", 1]}],
+    [{"name": "A", "exclude": [""]}],
+    [{"name": "A", "unless": "B"}],
+    [{"name": "A", "unless": ["B"]}],
+    [{"name": "A", "monospace": "yes"}],
+    [{"name": "A", "weight_min": "600"}],
+    [{"name": "A", "coverage": ["latin"]}],
+    [{"name": "A", "coverage": {"未知文字": 0.5}}],
+])
+def test_invalid_rules_raise_value_error(viewer, rules):
+    with pytest.raises(ValueError):
+        viewer.CategoryRuleSet(rules)
+
+
+def test_load_category_rules(viewer, tmp_path):
+    path = tmp_path / "rules.json"
+    assert viewer.load_category_rules(str(path)).names == [rule["name"] for rule in viewer.DEFAULT_CATEGORY_RULES]
+    path.write_text(json.dumps([{"name": "等宽", "keywords": ["mono"]}]), encoding="utf-8")
+    assert viewer.load_category_rules(str(path)).names == ["等宽"]
+    path.write_text("{not json", encoding="utf-8")
+    with pytest.raises(ValueError):
+        viewer.load_category_rules(str(path))
@@ -0,0 +1,34 @@
+"""重复字体检测的测试"""
+import pytest
+
+
+@pytest.mark.parametrize("family, style, identity", [
+    ("Univers 55", "Roman", "univers55roman"),
+    ("Helvetica Neue 45", "Light", "helveticaneue45light"),
+    ("Source Sans v2.010", "Regular", "sourcesansregular"),
+    ("Source Sans Version 3", "Regular", "sourcesansregular"),
+    ("Source Sans Ver. 1.002", "Regular", "sourcesansregular"),
+    ("Source Sans 1.002", "Regular", "sourcesansregular"),
+    ("Source-Sans", "Regular", "sourcesansregular"),
+])
+def test_font_identity(viewer, family, style, identity):
+    assert viewer.font_identity(family, style) == identity
+
+
+def face_record(family, style="Roman"):
+    return {"index": 0, "family": family, "families": [family], "style": style,
+            "identity": None, "phash": None}
+
+
+def test_numbered_weights_are_not_grouped(viewer, tmp_path):
+    detector = viewer.FontDuplicateDetector(str(tmp_path))
+    names = ["Univers 55", "Univers 75", "Univers v1.1 55", "Helvetica Neue 45", "Helvetica Neue 65"]
+    for i, family in enumerate(names):
+        face = face_record(family)
+        face["identity"] = viewer.font_identity(family, face["style"])
+        detector.records[f"/fonts/{i}.ttf"] = {"sha1": f"{i:040x}", "faces": [face]}
+
+    groups = detector.find_groups()
+    assert [[face["family"] for face in group["faces"]] for group in groups] == [["Univers 55", "Univers v1.1 55"]]
+    assert groups[0]["reasons"] == ["名称相同"]
+    assert detector.redundant_families(groups) == {"univers v1.1 55"}
@@ -0,0 +1,45 @@
+"""矢量导出的测试"""
+import re
+
+import pytest
+
+from conftest import build_test_font
+
+
+@pytest.fixture
+def outline_cache(viewer):
+    if not viewer.FONTTOOLS_AVAILABLE:
+        pytest.skip("需要 fontTools")
+    return viewer.GlyphOutlineCache()
+
+
+def svg_height(path):
+    with open(path, encoding="utf-8") as f:
+        return int(re.search(r'<svg [^>]*height="(\d+)"', f.read()).group(1))
+
+
+def test_export_svg_uses_os2_metrics(viewer, font_path, outline_cache, tmp_path):
+    face = viewer.read_font_faces(font_path)[0]
+    assert (face["ascender"], face["descender"], face["line_gap"]) == (800, -200, 200)
+    output = tmp_path / "out.svg"
+    viewer.export_text_svg(str(output), "ABC", face, 100, 800, viewer.TextLayoutEngine(), outline_cache, margin=0)
+    assert svg_height(output) == 120
+
+
+def test_export_svg_without_os2_falls_back_to_hhea(viewer, outline_cache, tmp_path):
+    path = build_test_font(tmp_path / "NoOS2.ttf", family="No OS2", os2=False)
+    face = viewer.read_font_faces(path)[0]
+    assert (face["ascender"], face["descender"], face["line_gap"]) == (900, -300, 100)
+    output = tmp_path / "out.svg"
+    viewer.export_text_svg(str(output), "ABC\nabc", face, 100, 800, viewer.TextLayoutEngine(), outline_cache, margin=0)
+    assert svg_height(output) == 260
+    assert "<use" in output.read_text(encoding="utf-8")
+
+
+def test_export_svg_without_vertical_metrics(viewer, font_path, outline_cache, tmp_path):
+    face = dict(viewer.read_font_faces(font_path)[0])
+    for key in ("ascender", "descender", "line_gap"):
+        del face[key]
+    output = tmp_path / "out.svg"
+    viewer.export_text_svg(str(output), "ABC", face, 100, 800, viewer.TextLayoutEngine(), outline_cache, margin=0)
+    assert svg_height(output) == 100
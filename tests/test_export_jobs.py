@@ -0,0 +1,63 @@
+"""导出任务队列的测试"""
+import threading
+
+
+def wait_all(queue, jobs):
+    for _ in jobs:
+        queue.finished.get(timeout=10)
+
+
+def test_job_ids_are_never_reused(viewer):
+    queue = viewer.ExportJobQueue(max_workers=2)
+    first = [queue.submit(f"job {i}", lambda job: None) for i in range(3)]
+    wait_all(queue, first)
+    assert [job.id for job in first] == [1, 2, 3]
+    assert all(job.status == "已完成" for job in first)
+
+    queue.clear_finished()
+    assert queue.jobs == []
+    second = [queue.submit("again", lambda job: None) for _ in range(2)]
+    wait_all(queue, second)
+    assert [job.id for job in second] == [4, 5]
+
+
+def test_failed_and_cancelled_jobs(viewer):
+    queue = viewer.ExportJobQueue(max_workers=1)
+    release = threading.Event()
+
+    def blocking(job):
+        release.wait(10)
+        job.report(1, 1)
+
+    def failing(job):
+        raise RuntimeError("boom")
+
+    running = queue.submit("running", blocking)
+    failed = queue.submit("failed", failing)
+    cancelled = queue.submit("cancelled", lambda job: None)
+    cancelled.cancel()
+    assert cancelled.status == "已取消"
+    release.set()
+    wait_all(queue, [running, failed, cancelled])
+
+    assert running.status == "已完成"
+    assert running.progress == 1.0
+    assert failed.status == "失败"
+    assert str(failed.error) == "boom"
+    assert cancelled.status == "已取消"
+
+
+def test_report_raises_after_cancel(viewer):
+    queue = viewer.ExportJobQueue(max_workers=1)
+    started = threading.Event()
+
+    def task(job):
+        started.set()
+        while True:
+            job.report(0, 1)
+
+    job = queue.submit("long", task)
+    assert started.wait(10)
+    job.cancel()
+    queue.finished.get(timeout=10)
+    assert job.status == "已取消"
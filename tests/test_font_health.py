@@ -0,0 +1,25 @@
+"""字体文件健康检查的测试"""
+
+
+def test_check_font_file_accepts_valid_font(viewer, font_path):
+    result = viewer.check_font_file(font_path)
+    assert result["status"] in ("ok", "warning")
+    assert result["faces"] == 1
+    assert not [issue for issue in result["issues"] if "校验和" not in issue and "渲染缓慢" not in issue]
+
+
+def test_check_font_file_rejects_truncated_font(viewer, font_path, tmp_path):
+    with open(font_path, "rb") as f:
+        data = f.read()
+    path = tmp_path / "truncated.ttf"
+    path.write_bytes(data[:len(data) // 2])
+    result = viewer.check_font_file(str(path))
+    assert result["status"] == "error"
+    assert result["issues"]
+
+
+def test_check_font_file_rejects_junk(viewer, tmp_path):
+    path = tmp_path / "junk.ttf"
+    path.write_bytes(b"this is not a font file" * 64)
+    result = viewer.check_font_file(str(path))
+    assert result == {"status": "error", "issues": ["不是可识别的字体文件"], "faces": 0, "render_ms": 0.0}
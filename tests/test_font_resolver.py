@@ -0,0 +1,21 @@
+"""字体家族索引和隔离的测试"""
+from conftest import build_test_font
+
+
+def test_quarantine_is_applied_at_lookup(viewer, tmp_path):
+    fonts = tmp_path / "fonts"
+    fonts.mkdir()
+    good = build_test_font(fonts / "Good.ttf", family="Good Sans")
+    bad = build_test_font(fonts / "Bad.ttf", family="Bad Sans")
+
+    resolver = viewer.FontFileResolver(directories=[str(fonts)])
+    resolver.set_quarantine({bad})
+    resolver.scan()
+    assert resolver.quarantined_families() == {"bad sans"}
+    assert resolver.resolve("Bad Sans") is None
+    assert resolver.resolve("Good Sans") == (good, 0)
+
+    # 取消隔离后不需要重新扫描
+    resolver.set_quarantine(set())
+    assert resolver.quarantined_families() == set()
+    assert resolver.resolve("Bad Sans") == (bad, 0)
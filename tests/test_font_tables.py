@@ -0,0 +1,61 @@
+"""字体表解析的测试"""
+import struct
+
+import pytest
+
+from conftest import TEST_CHARS
+
+
+def cmap_format4(segments):
+    """构造只有一个 (3, 1, 4) 子表的cmap表，segments 为 [(起始, 结束), ...]"""
+    segments = list(segments) + [(0xFFFF, 0xFFFF)]
+    seg_count = len(segments)
+    subtable = struct.pack(">7H", 4, 16 + seg_count * 8, 0, seg_count * 2, 0, 0, 0)
+    subtable += struct.pack(f">{seg_count}H", *[last for first, last in segments]) + b"\0\0"
+    subtable += struct.pack(f">{seg_count}H", *[first for first, last in segments])
+    subtable += struct.pack(f">{seg_count}H", *[1] * seg_count)
+    subtable += struct.pack(f">{seg_count}H", *[0] * seg_count)
+    return struct.pack(">HHHHL", 0, 1, 3, 1, 12) + subtable
+
+
+def cmap_format12(groups):
+    """构造只有一个 (3, 10, 12) 子表的cmap表，groups 为 [(起始, 结束), ...]"""
+    subtable = struct.pack(">HHLLL", 12, 0, 16 + 12 * len(groups), 0, len(groups))
+    for glyph, (first, last) in enumerate(groups, 1):
+        subtable += struct.pack(">3L", first, last, glyph)
+    return struct.pack(">HHHHL", 0, 1, 3, 10, 12) + subtable
+
+
+def test_parse_cmap_format4_merges_adjacent_segments(viewer):
+    data = b"pad" + cmap_format4([(0x20, 0x7E), (0x7F, 0x80), (0x4E00, 0x4E10)])
+    assert viewer.parse_cmap_ranges(data, 3, len(data) - 3) == [(0x20, 0x80), (0x4E00, 0x4E10)]
+
+
+def test_parse_cmap_prefers_format12(viewer):
+    data = cmap_format12([(0x1F600, 0x1F64F), (0x41, 0x5A), (0x50, 0x60)])
+    assert viewer.parse_cmap_ranges(data, 0, len(data)) == [(0x41, 0x60), (0x1F600, 0x1F64F)]
+
+
+def test_parse_cmap_without_unicode_subtable(viewer):
+    data = struct.pack(">HHHHL", 0, 1, 1, 0, 12) + struct.pack(">HHH", 0, 262, 0) + bytes(256)
+    assert viewer.parse_cmap_ranges(data, 0, len(data)) == []
+
+
+@pytest.mark.parametrize("ranges", [[], [(0x41, 0x41)], [(0x20, 0x7E), (0x4E00, 0x9FFF), (0x20000, 0x2A6DF)]])
+def test_encode_decode_ranges_round_trip(viewer, ranges):
+    encoded = viewer.encode_ranges(ranges)
+    assert isinstance(encoded, str)
+    starts, ends = viewer.decode_ranges(encoded)
+    assert list(zip(starts, ends)) == ranges
+    for first, last in ranges:
+        assert viewer.ranges_contain((starts, ends), first)
+        assert viewer.ranges_contain((starts, ends), last)
+        assert not viewer.ranges_contain((starts, ends), last + 1)
+
+
+def test_read_font_faces(viewer, font_path):
+    face, = viewer.read_font_faces(font_path)
+    assert face["family"] == "Test Sans"
+    assert face["style"] == "Regular"
+    assert face["units_per_em"] == 1000
+    assert face["codepoints"] == len(set(TEST_CHARS))
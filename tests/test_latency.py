@@ -0,0 +1,27 @@
+"""交互回放延迟统计的测试"""
+
+
+def test_latency_percentiles_nearest_rank(viewer):
+    samples = [i / 1000 for i in range(100, 0, -1)]
+    assert viewer.latency_percentiles(samples) == {"count": 100, "p50": 50.0, "p95": 95.0, "p99": 99.0,
+                                                   "max": 100.0}
+    assert viewer.latency_percentiles([0.002]) == {"count": 1, "p50": 2.0, "p95": 2.0, "p99": 2.0, "max": 2.0}
+    assert viewer.latency_percentiles([]) == {"count": 0}
+
+
+def test_latency_report_groups_by_action(viewer):
+    report = viewer.latency_report([("select", 0.01), ("scroll", 0.002), ("select", 0.03)])
+    assert report["overall"]["count"] == 3
+    assert list(report["actions"]) == ["scroll", "select"]
+    assert report["actions"]["select"]["max"] == 30.0
+
+
+def test_compare_latency_reports(viewer):
+    baseline = {"overall": {"p95": 10.0}, "actions": {"select": {"p95": 10.0}, "scroll": {"p95": 4.0}}}
+    report = {"overall": {"p95": 12.0},
+              "actions": {"select": {"p95": 20.0}, "scroll": {"p95": 5.0}, "search": {"p95": 50.0},
+                          "idle": {"count": 0}}}
+    regressions = viewer.compare_latency_reports(report, baseline)
+    assert regressions == ["select: p95 20.0 ms > 基准 10.0 ms x 1.25"]
+    assert len(viewer.compare_latency_reports(report, baseline, tolerance=1.1)) == 3
+    assert viewer.compare_latency_reports(report, {}) == []
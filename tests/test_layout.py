@@ -0,0 +1,58 @@
+"""导出文本排版的测试"""
+
+
+class FixedWidthFont:
+    """每个字符宽度相同的假字体，只提供排版需要的接口"""
+
+    def __init__(self, advance=10, size=10):
+        self.advance = advance
+        self.size = size
+
+    def getlength(self, text):
+        return self.advance * len(text)
+
+
+def wrap(viewer, text, width, font=None):
+    return viewer.TextLayoutEngine().wrap(text, font or FixedWidthFont(), "test", width)
+
+
+def test_wrap_breaks_between_words(viewer):
+    assert wrap(viewer, "aaa bbb ccc", 70) == ["aaa bbb", "ccc"]
+    assert wrap(viewer, "aaa bbb ccc", 1000) == ["aaa bbb ccc"]
+
+
+def test_wrap_keeps_empty_paragraphs(viewer):
+    assert wrap(viewer, "aaa\n\nbbb", 100) == ["aaa", "", "bbb"]
+
+
+def test_wrap_splits_words_longer_than_line(viewer):
+    assert wrap(viewer, "ab abcdefgh", 30) == ["ab", "abc", "def", "gh"]
+
+
+def test_wrap_breaks_between_cjk_characters(viewer):
+    assert wrap(viewer, "一二三四五六", 30) == ["一二三", "四五六"]
+
+
+def test_wrap_hangs_closing_punctuation(viewer):
+    # 句号不能出现在行首，悬挂在上一行末尾
+    assert wrap(viewer, "一二三。四", 30) == ["一二三。", "四"]
+
+
+def test_wrap_moves_opening_punctuation(viewer):
+    # 左括号不能留在行尾，随下一个字移到下一行
+    assert wrap(viewer, "一二（三", 30) == ["一二", "（三"]
+
+
+def test_wrap_measures_each_character_once(viewer):
+    class CountingFont(FixedWidthFont):
+        calls = 0
+
+        def getlength(self, text):
+            CountingFont.calls += 1
+            return super().getlength(text)
+
+    engine = viewer.TextLayoutEngine()
+    font = CountingFont()
+    engine.wrap("abab abab", font, "counting", 1000)
+    engine.wrap("abab abab", font, "counting", 1000)
+    assert CountingFont.calls == 3
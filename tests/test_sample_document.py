@@ -0,0 +1,32 @@
+"""示例文本共享文档模型的测试"""
+
+
+def test_document_update_reports_changed_lines(viewer):
+    document = viewer.SampleDocument("a\nb\nc\nd")
+    changes = []
+    document.subscribe(lambda *change: changes.append(change))
+
+    assert document.update("a\nB\nc\nd") == (1, 1, ["B"])
+    assert document.update("a\nB\nx\ny\nc\nd") == (2, 0, ["x", "y"])
+    assert document.update("a\nd") == (1, 4, [])
+    assert document.update("a\nd") is None
+    assert changes == [(1, 1, ["B"]), (2, 0, ["x", "y"]), (1, 4, [])]
+    assert document.version == 3
+    assert document.text == "a\nd"
+
+
+def test_document_update_with_repeated_lines(viewer):
+    # 公共前缀和后缀不能重叠
+    document = viewer.SampleDocument("a\na")
+    assert document.update("a\na\na") == (2, 0, ["a"])
+    assert document.update("a") == (1, 2, [])
+
+
+def test_document_unsubscribe(viewer):
+    document = viewer.SampleDocument("a")
+    changes = []
+    listener = lambda *change: changes.append(change)
+    document.subscribe(listener)
+    document.unsubscribe(listener)
+    document.update("b")
+    assert changes == []
@@ -0,0 +1,48 @@
+"""会话快照文件的测试"""
+import zlib
+
+import pytest
+
+
+def test_sections_round_trip(viewer, tmp_path):
+    store = viewer.SessionStore(str(tmp_path / "session" / "session.bin"))
+    state = {"font_family": "思源黑体", "font_size": 24, "recent": ["Arial", "宋体"]}
+    store.save({"STAT": viewer.SessionStore.encode_json(state), "RAW ": b"\0\1\2"})
+    sections = store.load()
+    assert set(sections) == {"STAT", "RAW "}
+    assert viewer.SessionStore.decode_json(sections, "STAT") == state
+    assert zlib.decompress(sections["RAW "]) == b"\0\1\2"
+
+
+def test_missing_corrupted_and_foreign_files(viewer, tmp_path):
+    path = tmp_path / "session.bin"
+    store = viewer.SessionStore(str(path))
+    assert store.load() == {}
+    path.write_bytes(b"XXXX\1\0\0\0")
+    assert store.load() == {}
+    path.write_bytes(b"\0\1")
+    assert store.load() == {}
+
+
+def test_truncated_file_keeps_complete_sections(viewer, tmp_path):
+    path = tmp_path / "session.bin"
+    store = viewer.SessionStore(str(path))
+    store.save({"ONE ": viewer.SessionStore.encode_json(1), "TWO ": viewer.SessionStore.encode_json(2)})
+    data = path.read_bytes()
+    path.write_bytes(data[:-4])
+    sections = store.load()
+    assert viewer.SessionStore.decode_json(sections, "ONE ") == 1
+    assert viewer.SessionStore.decode_json(sections, "TWO ") is None
+    assert viewer.SessionStore.decode_json(sections, "MISS") is None
+
+
+def test_frames_round_trip(viewer):
+    if not viewer.PIL_AVAILABLE:
+        pytest.skip("需要 Pillow")
+    image = viewer.Image.new("RGB", (4, 3), (10, 20, 30))
+    key = ("/fonts/a.ttf", 0, 48, "AaBb", (400.0, 100.0))
+    payload = zlib.compress(viewer.SessionStore.encode_frames([(key, image)]))
+    (decoded_key, decoded_image), = viewer.SessionStore.decode_frames(payload)
+    assert decoded_key == key
+    assert decoded_image.tobytes() == image.tobytes()
+    assert viewer.SessionStore.decode_frames(b"corrupted") == []
@@ -0,0 +1,58 @@
+"""字体名称缩略图图集的测试"""
+import json
+import threading
+
+import pytest
+
+from conftest import build_test_font
+
+FAMILIES = ["Ab", "Bcd Sans", "Cdefg Long Family", "Dz"]
+
+
+@pytest.fixture
+def resolver(viewer, tmp_path):
+    if not viewer.PIL_AVAILABLE:
+        pytest.skip("需要 Pillow")
+    fonts = tmp_path / "fonts"
+    fonts.mkdir()
+    for family in FAMILIES:
+        build_test_font(fonts / f"{family.replace(' ', '')}.ttf", family=family)
+    resolver = viewer.FontFileResolver(directories=[str(fonts)])
+    resolver.scan()
+    return resolver
+
+
+def expected_pixels(viewer, resolver, family):
+    path, index = resolver.resolve(family)
+    (identity, width, height, pixels), = viewer.render_thumbnails(
+        [(family, path, index, family)], viewer.FontThumbnailAtlas.HEIGHT, viewer.FontThumbnailAtlas.MAX_WIDTH)
+    return b"P5 %d %d 255\n" % (width, height) + pixels
+
+
+def test_overlapping_updates_keep_offsets_consistent(viewer, resolver, tmp_path):
+    atlas = viewer.FontThumbnailAtlas(str(tmp_path / "cache"))
+    threads = [threading.Thread(target=atlas.update, args=(resolver, families))
+               for families in (FAMILIES, FAMILIES[::-1], FAMILIES[1:])]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    reloaded = viewer.FontThumbnailAtlas(str(tmp_path / "cache"))
+    reloaded.load()
+    for family in FAMILIES[1:]:
+        assert atlas.get(family) == expected_pixels(viewer, resolver, family)
+        assert reloaded.get(family) == expected_pixels(viewer, resolver, family)
+    assert not (tmp_path / "cache" / "thumbnails.json.tmp").exists()
+    with open(tmp_path / "cache" / "thumbnails.json", encoding="utf-8") as f:
+        assert set(json.load(f)["families"]) == set(FAMILIES[1:])
+
+
+def test_update_compacts_dead_thumbnails(viewer, resolver, tmp_path):
+    atlas = viewer.FontThumbnailAtlas(str(tmp_path / "cache"))
+    atlas.update(resolver, FAMILIES)
+    size = (tmp_path / "cache" / "thumbnails.atlas").stat().st_size
+    atlas.update(resolver, FAMILIES[:1])
+    assert (tmp_path / "cache" / "thumbnails.atlas").stat().st_size < size
+    assert atlas.get(FAMILIES[0]) == expected_pixels(viewer, resolver, FAMILIES[0])
+    assert atlas.get(FAMILIES[1]) is None
@@ -0,0 +1,73 @@
+"""字体使用记录的测试"""
+import json
+
+
+def test_save_prunes_incoming_links(viewer, tmp_path, monkeypatch):
+    monkeypatch.setattr(viewer.UsageHistory, "MAX_FONTS", 2)
+    history = viewer.UsageHistory(str(tmp_path / "usage.json"))
+    for name in ("A", "B", "A", "C", "A", "B"):
+        history.record_selection(name, now=1000.0)
+    history.record_compare(["A", "C"])
+    history.save()
+
+    assert set(history.fonts) == {"A", "B"}
+    for links in (history.follows, history.compared):
+        assert "C" not in links
+        assert all("C" not in targets for targets in links.values())
+    with open(tmp_path / "usage.json", encoding="utf-8") as f:
+        assert "C" not in json.dumps(json.load(f)["follows"])
+
+
+def test_predict_prefers_fonts_opened_after_current(viewer, tmp_path):
+    history = viewer.UsageHistory(str(tmp_path / "usage.json"))
+    now = 1_000_000.0
+    for _ in range(3):
+        history.record_selection("A", now=now)
+        history.record_selection("B", now=now)
+    history.record_selection("C", now=now)
+    history.record_selection("A", now=now)
+
+    predictions = history.predict("A", now=now)
+    assert predictions[0] == "B"
+    assert "A" not in predictions
+    assert set(predictions) == {"B", "C"}
+    assert history.predict("A", limit=1, now=now) == ["B"]
+
+
+def test_predict_uses_compare_sessions_and_neighbours(viewer, tmp_path):
+    history = viewer.UsageHistory(str(tmp_path / "usage.json"))
+    history.record_compare(["A", "D"])
+    assert history.predict("A", now=1000.0) == ["D"]
+    assert history.predict("A", neighbours=["E", "F"], now=1000.0)[:2] == ["D", "E"]
+    assert viewer.UsageHistory(str(tmp_path / "empty.json")).predict("A", neighbours=["B"]) == ["B"]
+
+
+def test_frequency_decays_with_half_life(viewer, tmp_path):
+    history = viewer.UsageHistory(str(tmp_path / "usage.json"))
+    history.record_selection("A", now=1000.0)
+    assert history.frequency("A", 1000.0) == 1.0
+    assert history.frequency("A", 1000.0 + history.HALF_LIFE) == 0.5
+    assert history.frequency("missing", 1000.0) == 0.0
+
+
+def test_save_and_load_round_trip(viewer, tmp_path):
+    path = str(tmp_path / "usage.json")
+    history = viewer.UsageHistory(path)
+    history.record_selection("A", now=1000.0)
+    history.record_selection("B", now=1000.0)
+    history.save()
+    assert not history.dirty
+
+    loaded = viewer.UsageHistory(path)
+    loaded.load()
+    assert loaded.fonts == history.fonts
+    assert loaded.follows == {"A": {"B": 1}}
+    assert loaded.last_selected == "B"
+
+
+def test_history_lives_in_cache_directory(viewer, tmp_path):
+    assert viewer.USAGE_HISTORY_FILE == viewer.os.path.join(viewer.CACHE_DIR, "usage_history.json")
+    history = viewer.UsageHistory(str(tmp_path / "missing" / "usage.json"))
+    history.record_selection("A", now=1000.0)
+    history.save()
+    assert (tmp_path / "missing" / "usage.json").exists()
@@ -0,0 +1,53 @@
+"""可变字体帧渲染失败记录的测试"""
+
+
+def test_recent_failures_are_bounded(viewer):
+    failures = viewer.RecentFailures(limit=3)
+    for key in range(5):
+        failures.add(key)
+    assert len(failures) == 3
+    assert 0 not in failures and 1 not in failures
+    assert all(key in failures for key in (2, 3, 4))
+
+
+def test_recent_failures_expire(viewer, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(viewer.time, "monotonic", lambda: now[0])
+    failures = viewer.RecentFailures(retry_after=30.0)
+    failures.add("key")
+    now[0] += 29
+    assert "key" in failures
+    now[0] += 1
+    assert "key" not in failures
+    assert len(failures) == 0
+
+
+def test_failed_frame_is_retried_after_forgetting(viewer, monkeypatch):
+    attempts = []
+
+    def render(path, index, size, text, coordinates):
+        attempts.append(coordinates)
+        if len(attempts) == 1:
+            raise OSError("transient")
+        return "frame"
+
+    monkeypatch.setattr(viewer.VariationFrameRenderer, "_render", staticmethod(render))
+    renderer = viewer.VariationFrameRenderer(workers=1)
+    key = ("/fonts/a.ttf", 0, 24, "Aa", (400.0,))
+
+    renderer.request(key)
+    for _ in range(200):
+        if renderer.has_failed(key):
+            break
+        viewer.time.sleep(0.01)
+    assert renderer.has_failed(key)
+    renderer.request(key)
+    assert len(attempts) == 1
+
+    renderer.forget_failures()
+    renderer.request(key)
+    for _ in range(200):
+        if renderer.get(key) is not None:
+            break
+        viewer.time.sleep(0.01)
+    assert renderer.get(key) == "frame"
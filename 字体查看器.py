@@ -21,48 +21,3911 @@ from tkinter import ttk, font, messagebox, filedialog, simpledialog
 import sys
 import json
 import os
+import csv
+import argparse
+import itertools
 from datetime import datetime
 from io import BytesIO
 import math
+import mmap
+import re
+import zlib
+import base64
+import hashlib
+import unicodedata
+import struct
+import threading
+import time
+import queue
+import bisect
+import heapq
+import array
+import select
+import ctypes
+from collections import OrderedDict, deque
+from collections.abc import Mapping, Sequence
+import multiprocessing
+import multiprocessing.connection
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 
 # 尝试导入PIL库用于导出图片
 try:
     from PIL import Image, ImageDraw, ImageFont, ImageTk
+    from PIL import features as pil_features
     PIL_AVAILABLE = True
+    # OpenType特性预览需要 libraqm 整形
+    RAQM_AVAILABLE = pil_features.check("raqm")
 except ImportError:
     PIL_AVAILABLE = False
+    RAQM_AVAILABLE = False
+
+# 尝试导入brotli库用于读取WOFF2字体
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# 尝试导入NumPy库用于字形特征计算
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# 尝试导入fontTools库用于读取字形轮廓（矢量导出）
+try:
+    from fontTools.ttLib import TTFont
+    from fontTools.pens.svgPathPen import SVGPathPen
+    FONTTOOLS_AVAILABLE = True
+except ImportError:
+    FONTTOOLS_AVAILABLE = False
+
+def user_cache_dir(app_name="font-viewer"):
+    """每个用户的缓存目录：Windows 为 %LOCALAPPDATA%，macOS 为 ~/Library/Caches，其他为 $XDG_CACHE_HOME 或 ~/.cache"""
+    if sys.platform.startswith("win"):
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser(r"~\AppData\Local")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, app_name)
+
+# 缓存文件目录（可用环境变量 FONT_VIEWER_CACHE 指定）
+CACHE_DIR = os.environ.get("FONT_VIEWER_CACHE") or user_cache_dir()
+
+# 支持解析的字体文件扩展名
+FONT_EXTENSIONS = (".ttf", ".otf", ".ttc", ".otc")
+FOLDER_FONT_EXTENSIONS = FONT_EXTENSIONS + (".woff", ".woff2")
+
+def get_font_directories():
+    """获取系统和用户字体目录"""
+    if sys.platform.startswith("win"):
+        directories = [
+            os.path.join(os.environ.get("WINDIR", r"C:\Windows"), "Fonts"),
+            os.path.join(os.environ.get("LOCALAPPDATA", ""), "Microsoft", "Windows", "Fonts")
+        ]
+    elif sys.platform == "darwin":
+        directories = [
+            "/System/Library/Fonts",
+            "/Library/Fonts",
+            os.path.expanduser("~/Library/Fonts")
+        ]
+    else:
+        directories = [
+            "/usr/share/fonts",
+            "/usr/local/share/fonts",
+            os.path.expanduser("~/.fonts"),
+            os.path.expanduser("~/.local/share/fonts")
+        ]
+    return [d for d in directories if os.path.isdir(d)]
+
+def iter_font_files(directories):
+    """遍历目录下的所有字体文件"""
+    for directory in directories:
+        for dirpath, dirnames, filenames in os.walk(directory):
+            for filename in filenames:
+                if filename.lower().endswith(FONT_EXTENSIONS):
+                    yield os.path.join(dirpath, filename)
+
+def create_process_pool(max_workers=None):
+    """创建进程池（使用spawn方式，避免在带Tk的进程中fork）"""
+    return ProcessPoolExecutor(max_workers=max_workers,
+                               mp_context=multiprocessing.get_context("spawn"))
+
+def sfnt_face_offsets(data):
+    """返回sfnt文件中每个字体的表目录偏移（支持TTC字体集合）"""
+    if data[:4] == b"ttcf":
+        num_fonts = struct.unpack_from(">L", data, 8)[0]
+        return list(struct.unpack_from(f">{num_fonts}L", data, 12))
+    if data[:4] in (b"\x00\x01\x00\x00", b"OTTO", b"true"):
+        return [0]
+    return []
+
+def read_sfnt_tables(data, offset=0):
+    """读取表目录，返回 {表标签: (偏移, 长度)}"""
+    num_tables = struct.unpack_from(">H", data, offset + 4)[0]
+    tables = {}
+    for i in range(num_tables):
+        tag, checksum, table_offset, length = struct.unpack_from(">4sLLL", data, offset + 12 + i * 16)
+        tables[tag.decode("latin-1")] = (table_offset, length)
+    return tables
+
+def parse_name_table(data, offset, length):
+    """解析name表，返回 {nameID: [字符串, ...]}，英文名称排在最前"""
+    fmt, count, string_offset = struct.unpack_from(">HHH", data, offset)
+    names = {}
+    for i in range(count):
+        platform_id, encoding_id, language_id, name_id, str_length, str_offset = \
+            struct.unpack_from(">6H", data, offset + 6 + i * 12)
+        start = offset + string_offset + str_offset
+        raw = bytes(data[start:start + str_length])
+        if platform_id in (0, 3):
+            text = raw.decode("utf-16-be", errors="ignore")
+        elif platform_id == 1:
+            text = raw.decode("mac_roman", errors="ignore")
+        else:
+            continue
+        text = text.strip("\x00 ")
+        values = names.setdefault(name_id, [])
+        if not text or text in values:
+            continue
+        if platform_id == 3 and language_id == 0x409:
+            values.insert(0, text)
+        else:
+            values.append(text)
+    return names
+
+def parse_cmap_ranges(data, offset, length):
+    """解析cmap表，返回合并后的码位区间列表 [(起始, 结束), ...]"""
+    version, num_tables = struct.unpack_from(">HH", data, offset)
+    subtables = {}
+    for i in range(num_tables):
+        platform_id, encoding_id, sub_offset = struct.unpack_from(">HHL", data, offset + 4 + i * 8)
+        fmt = struct.unpack_from(">H", data, offset + sub_offset)[0]
+        subtables[(platform_id, encoding_id, fmt)] = offset + sub_offset
+    
+    for key in ((3, 10, 12), (0, 6, 12), (0, 4, 12), (3, 1, 4), (0, 3, 4), (0, 1, 4), (3, 0, 4)):
+        if key in subtables:
+            start = subtables[key]
+            break
+    else:
+        return []
+    
+    ranges = []
+    if key[2] == 12:
+        num_groups = struct.unpack_from(">L", data, start + 12)[0]
+        for i in range(num_groups):
+            first, last, glyph = struct.unpack_from(">3L", data, start + 16 + i * 12)
+            ranges.append((first, last))
+    else:
+        seg_count = struct.unpack_from(">H", data, start + 6)[0] // 2
+        ends = struct.unpack_from(f">{seg_count}H", data, start + 14)
+        starts = struct.unpack_from(f">{seg_count}H", data, start + 16 + seg_count * 2)
+        ranges = [(first, last) for first, last in zip(starts, ends) if first != 0xFFFF]
+    
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], last)
+        else:
+            merged.append([first, last])
+    return [tuple(r) for r in merged]
+
+def parse_fvar_table(data, offset, length, names):
+    """解析fvar表，返回 (设计轴列表, 命名实例列表)"""
+    (major, minor, axes_offset, reserved, axis_count, axis_size,
+     instance_count, instance_size) = struct.unpack_from(">8H", data, offset)
+    axes = []
+    for i in range(axis_count):
+        tag, minimum, default, maximum, flags, name_id = \
+            struct.unpack_from(">4slllHH", data, offset + axes_offset + i * axis_size)
+        tag = tag.decode("latin-1")
+        axes.append({
+            "tag": tag,
+            "min": minimum / 65536,
+            "default": default / 65536,
+            "max": maximum / 65536,
+            "name": (names.get(name_id) or [tag])[0]
+        })
+    
+    instances = []
+    instances_offset = offset + axes_offset + axis_count * axis_size
+    for i in range(instance_count):
+        record = instances_offset + i * instance_size
+        name_id, = struct.unpack_from(">H", data, record)
+        coordinates = struct.unpack_from(f">{axis_count}l", data, record + 4)
+        instances.append({
+            "name": (names.get(name_id) or [f"#{i + 1}"])[0],
+            "coordinates": [value / 65536 for value in coordinates]
+        })
+    return axes, instances
+
+def encode_ranges(ranges):
+    """将码位区间压缩编码为base64字符串（便于JSON缓存）"""
+    values = [v for r in ranges for v in r]
+    return base64.b64encode(struct.pack(f">{len(values)}L", *values)).decode("ascii")
+
+def decode_ranges(text):
+    """解码码位区间，返回 (起始列表, 结束列表)"""
+    data = base64.b64decode(text)
+    values = struct.unpack(f">{len(data) // 4}L", data)
+    return list(values[0::2]), list(values[1::2])
+
+def ranges_contain(ranges, codepoint):
+    """判断码位是否在 decode_ranges 返回的区间中"""
+    starts, ends = ranges
+    i = bisect.bisect_right(starts, codepoint) - 1
+    return i >= 0 and codepoint <= ends[i]
+
+# WOFF2表目录中用索引表示的已知表标签
+WOFF2_KNOWN_TAGS = (
+    "cmap", "head", "hhea", "hmtx", "maxp", "name", "OS/2", "post", "cvt ", "fpgm", "glyf", "loca",
+    "prep", "CFF ", "VORG", "EBDT", "EBLC", "gasp", "hdmx", "kern", "LTSH", "PCLT", "VDMX", "vhea",
+    "vmtx", "BASE", "GDEF", "GPOS", "GSUB", "EBSC", "JSTF", "MATH", "CBDT", "CBLC", "COLR", "CPAL",
+    "SVG ", "sbix", "acnt", "avar", "bdat", "bloc", "bsln", "cvar", "fdsc", "feat", "fmtx", "fvar",
+    "gvar", "hsty", "just", "lcar", "mort", "morx", "opbd", "prop", "trak", "Zapf", "Silf", "Glat",
+    "Gloc", "Feat", "Sill"
+)
+
+class SfntFile:
+    """只读的TTF/OTF/TTC/WOFF/WOFF2字体文件，按需读取表数据
+    
+    table() 返回 (缓冲区, 偏移, 长度)。TTF/OTF/TTC直接引用mmap，不复制表数据；
+    WOFF只解压被访问的表，WOFF2需要brotli库解压整个表数据流。
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise
+        self.faces = []
+        signature = self.data[:4]
+        if signature == b"wOFF":
+            self._read_woff()
+        elif signature == b"wOF2":
+            self._read_woff2()
+        else:
+            for offset in sfnt_face_offsets(self.data):
+                tables = read_sfnt_tables(self.data, offset)
+                self.faces.append({tag: (self.data, o, n) for tag, (o, n) in tables.items()})
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def close(self):
+        self.data.close()
+        self._file.close()
+    
+    def table(self, index, tag):
+        """返回表数据 (缓冲区, 偏移, 长度)，不存在时返回None"""
+        entry = self.faces[index].get(tag)
+        if entry is not None and entry[0] == "zlib":
+            offset, comp_length, orig_length = entry[1:]
+            entry = (zlib.decompress(self.data[offset:offset + comp_length]), 0, orig_length)
+            self.faces[index][tag] = entry
+        return entry
+    
+    def _read_woff(self):
+        num_tables = struct.unpack_from(">H", self.data, 12)[0]
+        tables = {}
+        for i in range(num_tables):
+            tag, offset, comp_length, orig_length, checksum = struct.unpack_from(">4sLLLL", self.data, 44 + i * 20)
+            if comp_length < orig_length:
+                tables[tag.decode("latin-1")] = ("zlib", offset, comp_length, orig_length)
+            else:
+                tables[tag.decode("latin-1")] = (self.data, offset, orig_length)
+        self.faces.append(tables)
+    
+    def _read_woff2(self):
+        if not BROTLI_AVAILABLE:
+            raise ValueError("读取WOFF2字体需要brotli库")
+        data = self.data
+        flavor, = struct.unpack_from(">4s", data, 4)
+        num_tables, = struct.unpack_from(">H", data, 12)
+        total_compressed, = struct.unpack_from(">L", data, 20)
+        pos = 48
+        
+        def read_base128():
+            nonlocal pos
+            value = 0
+            for _ in range(5):
+                byte = data[pos]
+                pos += 1
+                value = (value << 7) | (byte & 0x7F)
+                if not byte & 0x80:
+                    return value
+            raise ValueError("无效的UIntBase128")
+        
+        def read_255uint16():
+            nonlocal pos
+            code = data[pos]
+            pos += 1
+            if code == 253:
+                value, = struct.unpack_from(">H", data, pos)
+                pos += 2
+                return value
+            if code in (254, 255):
+                value = data[pos] + (506 if code == 254 else 253)
+                pos += 1
+                return value
+            return code
+        
+        directory = []
+        for _ in range(num_tables):
+            flags = data[pos]
+            pos += 1
+            if flags & 0x3F == 63:
+                tag = bytes(data[pos:pos + 4]).decode("latin-1")
+                pos += 4
+            else:
+                tag = WOFF2_KNOWN_TAGS[flags & 0x3F]
+            length = read_base128()
+            transform = flags >> 6
+            if (tag in ("glyf", "loca") and transform == 0) or (tag not in ("glyf", "loca") and transform != 0):
+                length = read_base128()
+            directory.append((tag, length))
+        
+        if flavor == b"ttcf":
+            pos += 4
+            face_indices = []
+            for _ in range(read_255uint16()):
+                count = read_255uint16()
+                pos += 4
+                face_indices.append([read_255uint16() for _ in range(count)])
+        else:
+            face_indices = [list(range(num_tables))]
+        
+        stream = brotli.decompress(bytes(data[pos:pos + total_compressed]))
+        entries = []
+        offset = 0
+        for tag, length in directory:
+            entries.append((tag, (stream, offset, length)))
+            offset += length
+        for indices in face_indices:
+            self.faces.append(dict(entries[i] for i in indices))
+
+def read_font_faces(path):
+    """读取字体文件中每个字体的头部信息（name、OS/2、head、post、cmap表）"""
+    faces = []
+    with SfntFile(path) as sfnt:
+        for index in range(len(sfnt.faces)):
+            name_table = sfnt.table(index, "name")
+            if name_table is None:
+                continue
+            names = parse_name_table(*name_table)
+            families = names.get(16, []) + [n for n in names.get(1, []) if n not in names.get(16, [])]
+            if not families:
+                continue
+            
+            face = {
+                "path": path,
+                "index": index,
+                "family": families[0],
+                "families": families,
+                "style": (names.get(17) or names.get(2) or ["Regular"])[0],
+                "full_name": (names.get(4) or [families[0]])[0],
+                "version": (names.get(5) or [""])[0],
+                "units_per_em": 1000,
+                "weight": 400,
+                "width": 5,
+                "italic": False,
+                "monospace": False,
+                "coverage": "",
+                "codepoints": 0
+            }
+            
+            head = sfnt.table(index, "head")
+            if head:
+                face["units_per_em"], = struct.unpack_from(">H", head[0], head[1] + 18)
+                mac_style, = struct.unpack_from(">H", head[0], head[1] + 44)
+                face["italic"] = bool(mac_style & 0x02)
+            
+            # 没有OS/2表时用hhea中的上升、下降和行距
+            hhea = sfnt.table(index, "hhea")
+            if hhea and hhea[2] >= 10:
+                face["ascender"], face["descender"], face["line_gap"] = struct.unpack_from(">hhh", hhea[0], hhea[1] + 4)
+            
+            os2 = sfnt.table(index, "OS/2")
+            if os2 and os2[2] >= 78:
+                buffer, offset = os2[0], os2[1]
+                face["weight"], face["width"] = struct.unpack_from(">HH", buffer, offset + 4)
+                face["monospace"] = buffer[offset + 32] == 2 and buffer[offset + 35] == 9
+                fs_selection, = struct.unpack_from(">H", buffer, offset + 62)
+                face["italic"] = face["italic"] or bool(fs_selection & 0x01)
+                face["ascender"], face["descender"], face["line_gap"] = struct.unpack_from(">hhh", buffer, offset + 68)
+                if struct.unpack_from(">H", buffer, offset)[0] >= 2 and os2[2] >= 90:
+                    face["x_height"], face["cap_height"] = struct.unpack_from(">hh", buffer, offset + 86)
+            
+            post = sfnt.table(index, "post")
+            if post and post[2] >= 16:
+                face["monospace"] = face["monospace"] or struct.unpack_from(">L", post[0], post[1] + 12)[0] != 0
+            
+            fvar = sfnt.table(index, "fvar")
+            if fvar:
+                face["axes"], face["instances"] = parse_fvar_table(*fvar, names)
+            
+            cmap = sfnt.table(index, "cmap")
+            if cmap:
+                ranges = parse_cmap_ranges(*cmap)
+                face["coverage"] = encode_ranges(ranges)
+                face["codepoints"] = sum(last - first + 1 for first, last in ranges)
+            
+            faces.append(face)
+    return faces
+
+def default_cache_budget():
+    """默认缓存预算：物理内存的1/16，取不到时为512MB"""
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // 16
+    except (AttributeError, ValueError, OSError):
+        return 512 * 1024 * 1024
+
+def estimate_size(value):
+    """粗略估计缓存值占用的字节数"""
+    if PIL_AVAILABLE and isinstance(value, Image.Image):
+        return value.width * value.height * len(value.getbands())
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value) + 64
+    if isinstance(value, (tuple, list)):
+        return 64 + sum(estimate_size(item) for item in value[:64]) * max(1, len(value) / 64)
+    if isinstance(value, dict):
+        return 256 + 96 * len(value)
+    return 64
+
+class ManagedCache:
+    """由 CacheManager 统一管理的单个缓存（最近使用顺序保存在 OrderedDict 中）"""
+    
+    def __init__(self, manager, name, priority=1.0, sizeof=estimate_size):
+        self.manager = manager
+        self.name = name
+        self.priority = priority
+        self.sizeof = sizeof
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key, default=None):
+        with self.manager.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.entries.move_to_end(key)
+            self.manager._touch(self, key, entry)
+            return entry[0]
+    
+    def put(self, key, value, size=None, cost=1.0):
+        """加入缓存；cost 为重新生成的相对代价，代价越高越晚被淘汰"""
+        if size is None:
+            size = self.sizeof(value)
+        with self.manager.lock:
+            self._remove(key)
+            entry = [value, size, cost, 0.0, None]
+            self.entries[key] = entry
+            self.bytes += size
+            self.manager.used += size
+            self.manager._touch(self, key, entry)
+            self.manager._enforce()
+        return value
+    
+    def setdefault(self, key, value, size=None, cost=1.0):
+        with self.manager.lock:
+            if key in self.entries:
+                return self.get(key)
+            return self.put(key, value, size, cost)
+    
+    def pop(self, key, default=None):
+        with self.manager.lock:
+            entry = self._remove(key)
+            return default if entry is None else entry[0]
+    
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+            self.manager.used -= entry[1]
+        return entry
+    
+    def clear(self):
+        with self.manager.lock:
+            self.manager.used -= self.bytes
+            self.entries.clear()
+            self.bytes = 0
+    
+    def __contains__(self, key):
+        with self.manager.lock:
+            return key in self.entries
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def keys(self):
+        with self.manager.lock:
+            return list(self.entries)
+    
+    def items(self):
+        """按最近使用顺序（最旧的在前）返回 [(键, 值), ...]"""
+        with self.manager.lock:
+            return [(key, entry[0]) for key, entry in self.entries.items()]
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"entries": len(self.entries), "bytes": self.bytes, "priority": self.priority,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None}
+
+class CacheManager:
+    """全局内存预算下的缓存管理
+    
+    淘汰采用 GreedyDual-Size（代价感知的LRU）：每个条目的分值为
+    当前基准值 + 优先级 × 代价 / 大小（按KB计），访问时刷新；
+    超出预算时淘汰分值最低的条目，并把基准值提升到该分值，
+    这样长期不用的条目无论大小最终都会被淘汰。
+    """
+    
+    def __init__(self, budget_bytes=None):
+        self.budget_bytes = budget_bytes or default_cache_budget()
+        self.used = 0
+        self.caches = {}
+        self.heap = []
+        self.baseline = 0.0
+        self.sequence = itertools.count()
+        self.lock = threading.RLock()
+    
+    def cache(self, name, priority=1.0, sizeof=estimate_size):
+        """返回（必要时创建）指定名称的缓存"""
+        with self.lock:
+            cache = self.caches.get(name)
+            if cache is None:
+                cache = self.caches[name] = ManagedCache(self, name, priority, sizeof)
+            return cache
+    
+    def set_budget(self, budget_bytes):
+        with self.lock:
+            self.budget_bytes = max(1, int(budget_bytes))
+            self._enforce()
+    
+    def _touch(self, cache, key, entry):
+        entry[3] = self.baseline + cache.priority * entry[2] * 1024 / max(entry[1], 1)
+        entry[4] = next(self.sequence)
+        heapq.heappush(self.heap, (entry[3], entry[4], cache.name, key))
+        # 过期的堆项过多时重建，避免堆无限增长
+        if len(self.heap) > 4 * sum(len(c.entries) for c in self.caches.values()) + 1024:
+            self.heap = [(e[3], e[4], c.name, k) for c in self.caches.values() for k, e in c.entries.items()]
+            heapq.heapify(self.heap)
+    
+    def _enforce(self):
+        while self.used > self.budget_bytes and self.heap:
+            score, sequence, name, key = heapq.heappop(self.heap)
+            cache = self.caches[name]
+            entry = cache.entries.get(key)
+            if entry is None or entry[4] != sequence:
+                continue
+            cache._remove(key)
+            cache.evictions += 1
+            self.baseline = score
+    
+    def stats(self):
+        """返回每个缓存和总计的统计"""
+        with self.lock:
+            caches = {name: cache.stats() for name, cache in self.caches.items()}
+            hits = sum(c["hits"] for c in caches.values())
+            misses = sum(c["misses"] for c in caches.values())
+            return {"budget_bytes": self.budget_bytes, "used_bytes": self.used,
+                    "hits": hits, "misses": misses,
+                    "evictions": sum(c["evictions"] for c in caches.values()),
+                    "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+                    "caches": caches}
+
+class FontFileResolver:
+    """字体家族名到字体文件的映射"""
+    REGULAR_STYLES = ("regular", "normal", "book", "roman", "standard")
+    
+    def __init__(self, directories=None):
+        self.directories = directories or get_font_directories()
+        self.faces = {}
+        self.quarantine = set()
+        self.ready = False
+        self.lock = threading.Lock()
+    
+    def ensure_ready(self, progress=None):
+        """尚未扫描时扫描一次（可在多个后台线程中同时调用）"""
+        with self.lock:
+            if not self.ready:
+                self.scan(progress)
+    
+    def scan(self, progress=None):
+        """扫描字体目录，建立家族名索引（文件头解析结果按目录缓存）"""
+        faces = {}
+        for directory in self.directories:
+            catalog = FontFolderCatalog(directory)
+            catalog.load()
+            catalog.scan(progress)
+            for face in catalog.iter_faces():
+                for family in face["families"]:
+                    faces.setdefault(family.lower(), []).append(face)
+        self.faces = faces
+        self.ready = True
+    
+    def set_quarantine(self, paths):
+        """设置被隔离的字体文件：索引中仍保留这些文件，解析家族时跳过它们"""
+        self.quarantine = set(paths)
+    
+    def quarantined_families(self):
+        """返回所有字体文件都被隔离的家族名称（小写）"""
+        if not self.quarantine:
+            return set()
+        return {family for family, family_faces in self.faces.items()
+                if all(face["path"] in self.quarantine for face in family_faces)}
+    
+    def families(self):
+        """返回所有家族的显示名称（每个家族取第一个名称）"""
+        names = {}
+        for family_faces in self.faces.values():
+            for face in family_faces:
+                names.setdefault(face["family"].lower(), face["family"])
+        return sorted(names.values(), key=str.lower)
+    
+    def update_files(self, updated, removed):
+        """增量更新：移除已删除或变化文件的记录，再重新解析变化的文件，返回新解析的字体"""
+        stale = set(updated) | set(removed)
+        parsed = []
+        for path in updated:
+            try:
+                parsed += read_font_faces(path)
+            except (OSError, ValueError, struct.error):
+                continue
+        # 快照映射只修改涉及的家族，不解码整个快照
+        if isinstance(self.faces, SnapshotFaceMap):
+            self.faces = self.faces.patched(stale, parsed)
+            return parsed
+        faces = {}
+        for family, family_faces in self.faces.items():
+            kept = [face for face in family_faces if face["path"] not in stale]
+            if kept:
+                faces[family] = kept
+        for face in parsed:
+            for family in face["families"]:
+                faces.setdefault(family.lower(), []).append(face)
+        self.faces = faces
+        return parsed
+    
+    def resolve(self, family, bold=False, italic=False):
+        """返回最匹配的 (文件路径, 字体索引)，找不到时返回None"""
+        face = self.resolve_face(family, bold, italic)
+        if face is None:
+            return None
+        return face["path"], face["index"]
+    
+    def resolve_face(self, family, bold=False, italic=False):
+        """返回最匹配的字体头部信息，找不到时返回None"""
+        candidates = self.faces.get(family.lower())
+        if candidates and self.quarantine:
+            candidates = [face for face in candidates if face["path"] not in self.quarantine]
+        if not candidates:
+            return None
+        
+        def score(face):
+            style = face["style"].lower()
+            value = 0
+            if ("bold" in style) == bold:
+                value += 2
+            if ("italic" in style or "oblique" in style) == italic:
+                value += 2
+            if any(word in style for word in self.REGULAR_STYLES):
+                value += 1
+            return value
+        
+        return max(candidates, key=score)
+
+FALLBACK_CHAINS_FILE = "fallback_chains.json"
+
+class FontFallbackResolver:
+    """逐字符判断实际渲染字体：主字体缺字时依次查找回退链和其他已安装字体
+    
+    结果按 (主字体, 码位) 缓存，每行文本的结果也会缓存，
+    编辑大段文本后重新检查只需处理变化的行和新出现的字符。
+    没有回退链覆盖时按字体名称顺序取第一个包含该字符的字体，这只是对系统替换行为的估计。
+    """
+    def __init__(self, resolver, chains=None, cache_manager=None):
+        self.resolver = resolver
+        self.chains = chains or {}
+        cache_manager = cache_manager or CacheManager(64 * 1024 * 1024)
+        self.memo = cache_manager.cache("fallback_codepoints", priority=2.0)
+        self.coverages = cache_manager.cache("coverage_ranges", priority=4.0)
+        self.lines = cache_manager.cache("fallback_lines", priority=1.0)
+        self.all_families = None
+        self.lock = threading.Lock()
+    
+    def load_chains(self, path=FALLBACK_CHAINS_FILE):
+        """加载用户定义的回退链 {主字体或"*": [字体, ...]}"""
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.set_chains(json.load(f))
+    
+    def save_chains(self, path=FALLBACK_CHAINS_FILE):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chains, f, ensure_ascii=False, indent=2)
+    
+    def set_chains(self, chains):
+        """更换回退链，清空依赖回退链的缓存"""
+        with self.lock:
+            self.chains = {key: list(value) for key, value in chains.items() if value}
+            self.memo.clear()
+            self.lines.clear()
+    
+    def invalidate(self):
+        """字体文件变化后清空所有缓存"""
+        with self.lock:
+            self.memo.clear()
+            self.coverages.clear()
+            self.lines.clear()
+            self.all_families = None
+    
+    def chain_for(self, primary):
+        return self.chains.get(primary) or self.chains.get("*", [])
+    
+    def coverage(self, family):
+        """返回字体家族常规字形的码位区间，未知字体返回None"""
+        face = self.resolver.resolve_face(family)
+        if face is None or not face.get("coverage"):
+            return None
+        key = (face["path"], face["index"])
+        ranges = self.coverages.get(key)
+        if ranges is None:
+            ranges = decode_ranges(face["coverage"])
+            self.coverages.put(key, ranges, size=16 * len(ranges[0]) + 128)
+        return ranges
+    
+    def covers(self, family, codepoint):
+        ranges = self.coverage(family)
+        return ranges is not None and ranges_contain(ranges, codepoint)
+    
+    def resolve(self, primary, codepoint):
+        """返回渲染该码位的字体家族；主字体自身渲染时返回主字体，没有字体包含时返回None"""
+        key = (primary, codepoint)
+        result = self.memo.get(key, self)
+        if result is not self:
+            return result
+        
+        # 控制字符和空白不需要字形，也不必标记
+        if codepoint < 0x20 or unicodedata.category(chr(codepoint)) in ("Zs", "Zl", "Zp", "Cc", "Cf"):
+            result = primary
+        elif self.coverage(primary) is None or self.covers(primary, codepoint):
+            result = primary
+        else:
+            result = next((family for family in self.chain_for(primary) if self.covers(family, codepoint)), None)
+            if result is None:
+                if self.all_families is None:
+                    self.all_families = self.resolver.families()
+                result = next((family for family in self.all_families if self.covers(family, codepoint)), None)
+        self.memo.put(key, result, size=96)
+        return result
+    
+    def line_runs(self, primary, line):
+        """返回一行中不由主字体渲染的连续片段 [(起始列, 结束列, 字体), ...]"""
+        key = (primary, line)
+        runs = self.lines.get(key)
+        if runs is not None:
+            return runs
+        
+        runs = []
+        for column, char in enumerate(line):
+            family = self.resolve(primary, ord(char))
+            if family == primary:
+                continue
+            if runs and runs[-1][1] == column and runs[-1][2] == family:
+                runs[-1] = (runs[-1][0], column + 1, family)
+            else:
+                runs.append((column, column + 1, family))
+        
+        self.lines.put(key, runs, size=len(line) + 96 * len(runs) + 128)
+        return runs
+    
+    def runs(self, primary, text):
+        """返回整段文本的替换片段 [(行号, 起始列, 结束列, 字体), ...]，行号从1开始"""
+        with self.lock:
+            return [(number, start, end, family)
+                    for number, line in enumerate(text.split("\n"), 1)
+                    for start, end, family in self.line_runs(primary, line)]
+
+class FontFolderCatalog:
+    """字体文件夹目录：并发遍历目录并解析文件头，结果按文件修改时间和大小缓存"""
+    CACHE_VERSION = 2
+    
+    def __init__(self, folder, cache_dir=CACHE_DIR, max_workers=16):
+        self.folder = os.path.abspath(folder)
+        self.max_workers = max_workers
+        key = hashlib.sha1(self.folder.encode("utf-8")).hexdigest()[:16]
+        self.cache_path = os.path.join(cache_dir, f"folder_{key}.json")
+        self.files = {}
+    
+    def load(self):
+        """加载缓存的解析结果"""
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("folder") == self.folder and cached.get("version") == self.CACHE_VERSION:
+                self.files = cached["files"]
+        except (OSError, ValueError, KeyError):
+            self.files = {}
+    
+    def save(self):
+        """保存解析结果到缓存"""
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        with open(self.cache_path, "w", encoding="utf-8") as f:
+            json.dump({"folder": self.folder, "version": self.CACHE_VERSION, "files": self.files},
+                      f, ensure_ascii=False)
+    
+    @staticmethod
+    def _list_directory(directory):
+        subdirs, files = [], []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.name.lower().endswith(FOLDER_FONT_EXTENSIONS):
+                    stat = entry.stat()
+                    files.append((entry.path, stat.st_mtime, stat.st_size))
+        return subdirs, files
+    
+    def scan(self, progress=None):
+        """并发遍历目录树，只解析新增或有变化的文件"""
+        files = {}
+        total = 0
+        finished = 0
+        changed = False
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {executor.submit(self._list_directory, self.folder): None}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    info = pending.pop(future)
+                    if info is None:
+                        try:
+                            subdirs, found = future.result()
+                        except OSError:
+                            continue
+                        for subdir in subdirs:
+                            pending[executor.submit(self._list_directory, subdir)] = None
+                        for path, mtime, size in found:
+                            total += 1
+                            cached = self.files.get(path)
+                            if cached and cached["mtime"] == mtime and cached["size"] == size:
+                                files[path] = cached
+                                finished += 1
+                            else:
+                                pending[executor.submit(read_font_faces, path)] = (path, mtime, size)
+                    else:
+                        path, mtime, size = info
+                        try:
+                            files[path] = {"mtime": mtime, "size": size, "faces": future.result()}
+                        except Exception as e:
+                            files[path] = {"mtime": mtime, "size": size, "faces": [], "error": str(e)}
+                        finished += 1
+                        changed = True
+                    if progress and total:
+                        progress(finished, total)
+        
+        changed = changed or len(files) != len(self.files)
+        self.files = files
+        if changed:
+            self.save()
+    
+    def iter_faces(self):
+        """遍历所有解析成功的字体"""
+        for record in self.files.values():
+            yield from record["faces"]
+    
+    def resolver(self):
+        """返回该文件夹的家族名映射"""
+        resolver = FontFileResolver(directories=[self.folder])
+        for face in self.iter_faces():
+            for family in face["families"]:
+                resolver.faces.setdefault(family.lower(), []).append(face)
+        resolver.ready = True
+        return resolver
+
+CATALOG_SNAPSHOT_FILE = "font_catalog.snap"
+
+def file_sha1(path):
+    """计算文件内容的SHA-1摘要（字节）"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+def iter_catalog_files(directories):
+    """遍历目录下字体映射会解析的所有文件，返回 (路径, 修改时间, 大小)"""
+    for directory in directories:
+        for dirpath, dirnames, filenames in os.walk(os.path.abspath(directory)):
+            for filename in filenames:
+                if filename.lower().endswith(FOLDER_FONT_EXTENSIONS):
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat.st_mtime, stat.st_size
+
+def category_rules_digest(rules):
+    return hashlib.sha1(json.dumps(rules.rules, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+class _PackedOffsets(Sequence):
+    """mmap中的u32数组，按下标直接读取（供bisect使用）"""
+    
+    def __init__(self, data, offset, count):
+        self.data = data
+        self.offset = offset
+        self.count = count
+    
+    def __len__(self):
+        return self.count
+    
+    def __getitem__(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return struct.unpack_from("<I", self.data, self.offset + 4 * index)[0]
+
+class CatalogSnapshot:
+    """可分发的二进制目录快照：字体家族、分类、元数据、覆盖范围、搜索索引和文件路径
+    
+    文件头之后是段目录（标签、偏移、长度），各段在mmap中按需读取，加载时不解析内容；
+    单个字体的元数据在第一次访问时才解码，家族名查找在mmap中二分。
+    文件表记录每个字体文件的大小和SHA-1，validate() 据此判断本机字体是否与快照一致。
+    """
+    MAGIC = b"FVCT"
+    VERSION = 1
+    HEADER = struct.Struct("<4sHHI")
+    SECTION = struct.Struct("<4sQQ")
+    # 路径偏移、路径长度、大小、修改时间、SHA-1、第一个字体、字体数
+    FILE_RECORD = struct.Struct("<IIQd20sII")
+    
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise
+        magic, version, reserved, count = self.HEADER.unpack_from(self.data, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            self.close()
+            raise ValueError(f"不是有效的目录快照: {path}")
+        self.sections = {}
+        for i in range(count):
+            tag, offset, length = self.SECTION.unpack_from(self.data, self.HEADER.size + i * self.SECTION.size)
+            self.sections[tag.decode("ascii")] = (offset, length)
+        self.info = json.loads(self.section("INFO"))
+        self.face_count = self.info["faces"]
+        self.file_count = self.info["files"]
+        self.face_offsets = _PackedOffsets(self.data, self.sections["FOFF"][0], self.face_count + 1)
+        self.key_offsets = _PackedOffsets(self.data, self.sections["KOFF"][0], self.info["keys"] + 1)
+        self.key_faces = _PackedOffsets(self.data, self.sections["KMAP"][0], self.info["keys"] + 1)
+        self.name_offsets = _PackedOffsets(self.data, self.sections["NOFF"][0], self.info["families"] + 1)
+        self.search_offsets = _PackedOffsets(self.data, self.sections["SOFF"][0], self.info["families"] + 1)
+        self._faces = {}
+    
+    def close(self):
+        self.data.close()
+        self._file.close()
+    
+    def section(self, tag):
+        offset, length = self.sections[tag]
+        return self.data[offset:offset + length]
+    
+    def _blob_item(self, tag, offsets, index):
+        base = self.sections[tag][0]
+        return self.data[base + offsets[index]:base + offsets[index + 1]].decode("utf-8")
+    
+    def file_record(self, index):
+        """返回 (路径, 大小, 修改时间, SHA-1, 第一个字体, 字体数)"""
+        path_offset, path_length, size, mtime, sha1, first, count = self.FILE_RECORD.unpack_from(
+            self.data, self.sections["FILE"][0] + index * self.FILE_RECORD.size)
+        base = self.sections["PATH"][0] + path_offset
+        return self.data[base:base + path_length].decode("utf-8"), size, mtime, sha1, first, count
+    
+    def face(self, face_id):
+        """返回字体头部信息（与 read_font_faces 的结果相同），第一次访问时解码"""
+        face = self._faces.get(face_id)
+        if face is None:
+            face = json.loads(self._blob_item("FACE", self.face_offsets, face_id))
+            face["path"] = self.file_record(face.pop("file"))[0]
+            face = self._faces.setdefault(face_id, face)
+        return face
+    
+    def family_name(self, index):
+        # 名称之间以换行分隔，偏移包含分隔符
+        base = self.sections["NAME"][0]
+        return self.data[base + self.name_offsets[index]:base + self.name_offsets[index + 1] - 1].decode("utf-8")
+    
+    def family_key(self, index):
+        return self._blob_item("KEYS", self.key_offsets, index)
+    
+    def find_family(self, key):
+        """按小写家族名在mmap中二分查找，返回家族序号，不存在时返回None"""
+        low, high = 0, self.info["keys"]
+        while low < high:
+            middle = (low + high) // 2
+            if self.family_key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.info["keys"] or self.family_key(low) != key:
+            return None
+        return low
+    
+    def family_faces(self, key):
+        """返回小写家族名对应的字体列表，不存在时返回None"""
+        index = self.find_family(key)
+        if index is None:
+            return None
+        start, end = self.key_faces[index], self.key_faces[index + 1]
+        ids = struct.unpack_from(f"<{end - start}I", self.data, self.sections["KIDS"][0] + 4 * start)
+        return [self.face(face_id) for face_id in ids]
+    
+    def families(self):
+        """字体列表中显示的家族名称（已排序）"""
+        names = self.section("NAME").decode("utf-8")
+        return names.split("\n") if names else []
+    
+    def categories(self):
+        """返回 {分类名: [家族名, ...]}"""
+        blocks = self.section("CATG").decode("utf-8").split("\0")
+        return {name: block.split("\n") if block else [] for name, block in zip(self.info["categories"], blocks)}
+    
+    def search(self, term):
+        """在小写名称索引中查找子串，返回匹配的家族名称集合"""
+        needle = term.lower().encode("utf-8")
+        if b"\n" in needle:
+            return set()
+        start, length = self.sections["SRCH"]
+        matches = set()
+        position = self.data.find(needle, start, start + length)
+        while position >= 0:
+            index = bisect.bisect_right(self.search_offsets, position - start) - 1
+            matches.add(self.family_name(index))
+            # 跳到下一个名称，同一名称只记一次
+            position = self.data.find(needle, start + self.search_offsets[index + 1], start + length)
+        return matches
+    
+    def validate(self, directories, verified, workers=8):
+        """与本机字体文件比较，返回 (变化或新增的路径, 已删除的路径)
+        
+        大小不同直接视为变化；大小相同时比较SHA-1。verified 为 {路径: [大小, 修改时间, SHA-1]}，
+        记录已核对过的文件，修改时间未变的文件不再重新计算哈希（会被更新）。
+        """
+        local = {path: (mtime, size) for path, mtime, size in iter_catalog_files(directories)}
+        updated, removed, unverified = [], [], []
+        for index in range(self.file_count):
+            path, size, mtime, sha1, first, count = self.file_record(index)
+            stat = local.pop(path, None)
+            if stat is None:
+                removed.append(path)
+            elif stat[1] != size:
+                updated.append(path)
+            else:
+                record = verified.get(path)
+                if record and record[0] == size and record[1] == stat[0]:
+                    if record[2] != sha1.hex():
+                        updated.append(path)
+                else:
+                    unverified.append((path, sha1, stat))
+        
+        if unverified:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                digests = executor.map(lambda item: file_sha1(item[0]), unverified)
+                for (path, sha1, (mtime, size)), digest in zip(unverified, digests):
+                    verified[path] = [size, mtime, digest.hex()]
+                    if digest != sha1:
+                        updated.append(path)
+        return updated + sorted(local), removed
+    
+    def faces_of_files(self, paths):
+        """返回快照中属于指定文件的字体"""
+        paths = set(paths)
+        faces = []
+        for index in range(self.file_count):
+            path, size, mtime, sha1, first, count = self.file_record(index)
+            if path in paths:
+                faces += [self.face(face_id) for face_id in range(first, first + count)]
+        return faces
+    
+    @classmethod
+    def write(cls, path, resolver, families, categories, rules_digest, progress=None):
+        """由已扫描的字体映射生成快照；families 为字体列表显示的名称，categories 为 {分类名: [家族名]}"""
+        files = sorted(iter_catalog_files(resolver.directories))
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            digests = []
+            for done, digest in enumerate(executor.map(file_sha1, [item[0] for item in files]), 1):
+                digests.append(digest)
+                if progress:
+                    progress(done, len(files))
+        
+        # 按文件顺序为字体编号，每个文件的字体连续存放
+        faces_by_file = {}
+        for family_faces in resolver.faces.values():
+            for face in family_faces:
+                faces_by_file.setdefault(face["path"], {})[face["index"]] = face
+        face_ids = {}
+        face_blobs = []
+        path_blob = bytearray()
+        file_records = []
+        for file_index, ((file_path, mtime, size), digest) in enumerate(zip(files, digests)):
+            encoded = file_path.encode("utf-8")
+            file_faces = faces_by_file.get(file_path, {})
+            file_records.append(cls.FILE_RECORD.pack(len(path_blob), len(encoded), size, mtime, digest,
+                                                     len(face_blobs), len(file_faces)))
+            path_blob += encoded
+            for index in sorted(file_faces):
+                face = dict(file_faces[index], file=file_index)
+                del face["path"]
+                face_ids[(file_path, index)] = len(face_blobs)
+                face_blobs.append(json.dumps(face, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        
+        keys = sorted(resolver.faces)
+        key_faces = [[face_ids[(face["path"], face["index"])] for face in resolver.faces[key]
+                      if (face["path"], face["index"]) in face_ids] for key in keys]
+        
+        def packed_blob(items):
+            offsets = [0]
+            for item in items:
+                offsets.append(offsets[-1] + len(item))
+            return b"".join(items), struct.pack(f"<{len(offsets)}I", *offsets)
+        
+        def packed_counts(groups):
+            offsets = [0]
+            for group in groups:
+                offsets.append(offsets[-1] + len(group))
+            return struct.pack(f"<{len(offsets)}I", *offsets)
+        
+        face_blob, face_offsets = packed_blob(face_blobs)
+        key_blob, key_offsets = packed_blob([key.encode("utf-8") for key in keys])
+        # 名称和小写的搜索索引都以换行分隔，各自保存偏移（小写后字节长度可能变化）
+        name_blob, name_offsets = packed_blob([f"{name}\n".encode("utf-8") for name in families])
+        search_blob, search_offsets = packed_blob([f"{name.lower()}\n".encode("utf-8") for name in families])
+        info = {"created": datetime.now().isoformat(timespec="seconds"), "rules": rules_digest,
+                "directories": resolver.directories, "categories": list(categories),
+                "files": len(files), "faces": len(face_blobs), "keys": len(keys), "families": len(families)}
+        sections = [
+            ("INFO", json.dumps(info, ensure_ascii=False).encode("utf-8")),
+            ("PATH", bytes(path_blob)),
+            ("FILE", b"".join(file_records)),
+            ("FOFF", face_offsets),
+            ("FACE", face_blob),
+            ("KOFF", key_offsets),
+            ("KEYS", key_blob),
+            ("KMAP", packed_counts(key_faces)),
+            ("KIDS", struct.pack(f"<{sum(map(len, key_faces))}I", *itertools.chain.from_iterable(key_faces))),
+            ("NOFF", name_offsets),
+            ("NAME", name_blob[:-1]),
+            ("SOFF", search_offsets),
+            ("SRCH", search_blob),
+            ("CATG", "\0".join("\n".join(fonts) for fonts in categories.values()).encode("utf-8"))
+        ]
+        
+        # 各段按8字节对齐
+        offset = cls.HEADER.size + cls.SECTION.size * len(sections)
+        directory, payloads = [], []
+        for tag, payload in sections:
+            offset += -offset % 8
+            directory.append(cls.SECTION.pack(tag.encode("ascii"), offset, len(payload)))
+            payloads.append((offset, payload))
+            offset += len(payload)
+        
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, 0, len(sections)))
+            f.write(b"".join(directory))
+            for payload_offset, payload in payloads:
+                f.write(b"\0" * (payload_offset - f.tell()))
+                f.write(payload)
+        os.replace(temp_path, path)
+        return len(files), len(face_blobs)
+
+class SnapshotFaceMap(Mapping):
+    """以目录快照为后端的 {小写家族名: [字体, ...]}，查找时才从mmap中读取
+    
+    overrides 记录文件变化后重新计算的家族（空列表表示家族已不存在），优先于快照中的内容。
+    """
+    
+    def __init__(self, snapshot, overrides=None):
+        self.snapshot = snapshot
+        self.overrides = overrides or {}
+    
+    def __getitem__(self, key):
+        faces = self.get(key)
+        if faces is None:
+            raise KeyError(key)
+        return faces
+    
+    def get(self, key, default=None):
+        if key in self.overrides:
+            faces = self.overrides[key] or None
+        else:
+            faces = self.snapshot.family_faces(key)
+        return default if faces is None else faces
+    
+    def __iter__(self):
+        for index in range(self.snapshot.info["keys"]):
+            key = self.snapshot.family_key(index)
+            if self.overrides.get(key, True):
+                yield key
+        for key, faces in self.overrides.items():
+            if faces and self.snapshot.find_family(key) is None:
+                yield key
+    
+    def __len__(self):
+        if not self.overrides:
+            return self.snapshot.info["keys"]
+        return sum(1 for key in self)
+    
+    def patched(self, stale, parsed):
+        """返回去掉 stale 文件的字体、加入新解析字体后的映射，只重新计算涉及的家族"""
+        keys = {family.lower() for face in self.snapshot.faces_of_files(stale) for family in face["families"]}
+        for faces in self.overrides.values():
+            keys.update(family.lower() for face in faces if face["path"] in stale for family in face["families"])
+        keys.update(family.lower() for face in parsed for family in face["families"])
+        overrides = dict(self.overrides)
+        for key in keys:
+            faces = [face for face in self.get(key, []) if face["path"] not in stale]
+            faces += [face for face in parsed if key in (family.lower() for family in face["families"])]
+            overrides[key] = faces
+        return SnapshotFaceMap(self.snapshot, overrides)
+
+def run_build_snapshot(output):
+    """无界面生成目录快照（命令行入口使用）"""
+    resolver = FontFileResolver()
+    resolver.scan()
+    rules = load_category_rules()
+    families = resolver.families()
+    categories = {name: [] for name in rules.names}
+    for family in families:
+        for category in rules.classify(family, resolver.resolve_face(family)):
+            categories[category].append(family)
+    
+    def progress(done, total):
+        sys.stderr.write(f"\r已计算哈希 {done}/{total}")
+        sys.stderr.flush()
+    
+    file_count, face_count = CatalogSnapshot.write(output, resolver, families, categories,
+                                                   category_rules_digest(rules), progress)
+    sys.stderr.write(f"\n快照已写入 {output}: {len(families)} 个家族，{face_count} 个字体，{file_count} 个文件\n")
+
+class RecentFailures:
+    """最近渲染失败的键：超过重试间隔后允许重新请求，数量超过上限时丢弃最早的记录
+    
+    由使用者的锁保护，本身不加锁。
+    """
+    
+    def __init__(self, limit=256, retry_after=30.0):
+        self.limit = limit
+        self.retry_after = retry_after
+        self.times = OrderedDict()
+    
+    def add(self, key):
+        self.times.pop(key, None)
+        self.times[key] = time.monotonic()
+        while len(self.times) > self.limit:
+            self.times.popitem(last=False)
+    
+    def __contains__(self, key):
+        failed_at = self.times.get(key)
+        if failed_at is None:
+            return False
+        if time.monotonic() - failed_at >= self.retry_after:
+            del self.times[key]
+            return False
+        return True
+    
+    def __len__(self):
+        return len(self.times)
+    
+    def clear(self):
+        self.times.clear()
+
+class VariationFrameRenderer:
+    """可变字体实例的后台渲染与帧缓存
+    
+    轴坐标按滑块轨道量化，拖动时除当前帧外还会预渲染附近的帧；
+    待渲染请求后进先出，保证最新的位置最先渲染。
+    """
+    STEPS = 64
+    PREFETCH = 6
+    MAX_PENDING = 64
+    
+    def __init__(self, workers=2, cache_manager=None):
+        self.frames = (cache_manager or CacheManager(64 * 1024 * 1024)).cache("variation_frames", priority=1.5)
+        self.requests = []
+        self.pending = set()
+        self.failed = RecentFailures()
+        self.condition = threading.Condition()
+        for _ in range(workers):
+            threading.Thread(target=self._work, daemon=True).start()
+    
+    def quantize(self, axes, coordinates):
+        """把轴坐标对齐到滑块轨道上的固定位置"""
+        values = []
+        for axis, value in zip(axes, coordinates):
+            span = axis["max"] - axis["min"]
+            if span <= 0:
+                values.append(axis["default"])
+                continue
+            step = round((value - axis["min"]) / span * self.STEPS)
+            values.append(round(axis["min"] + span * step / self.STEPS, 3))
+        return tuple(values)
+    
+    def get(self, key):
+        """返回缓存的帧，未缓存时返回None"""
+        with self.condition:
+            return self.frames.get(key)
+    
+    def request(self, key):
+        """请求渲染一帧，key 为 (路径, 索引, 字号, 文本, 坐标)；已在队列中的请求移到最前"""
+        with self.condition:
+            if key in self.frames or key in self.failed:
+                return
+            if key in self.pending:
+                if key in self.requests:
+                    self.requests.remove(key)
+                    self.requests.append(key)
+                return
+            self.pending.add(key)
+            self.requests.append(key)
+            if len(self.requests) > self.MAX_PENDING:
+                self.pending.discard(self.requests.pop(0))
+            self.condition.notify()
+    
+    def has_failed(self, key):
+        """该帧最近是否渲染失败（超过重试间隔后视为未失败）"""
+        with self.condition:
+            return key in self.failed
+    
+    def forget_failures(self):
+        """切换字体时清除失败记录，之前失败的帧可以重新渲染"""
+        with self.condition:
+            self.failed.clear()
+    
+    def prefetch(self, key, axes, axis_index):
+        """沿正在拖动的轴预渲染附近的帧（远处的先入队，近处的先渲染）"""
+        path, index, size, text, coordinates = key
+        axis = axes[axis_index]
+        step = (axis["max"] - axis["min"]) / self.STEPS
+        for distance in range(self.PREFETCH, 0, -1):
+            for sign in (1, -1):
+                value = coordinates[axis_index] + sign * distance * step
+                if axis["min"] <= value <= axis["max"]:
+                    moved = list(coordinates)
+                    moved[axis_index] = value
+                    self.request((path, index, size, text, self.quantize(axes, moved)))
+    
+    def _work(self):
+        while True:
+            with self.condition:
+                while not self.requests:
+                    self.condition.wait()
+                key = self.requests.pop()
+            try:
+                image = self._render(*key)
+            except Exception:
+                image = None
+            with self.condition:
+                self.pending.discard(key)
+                if image is None:
+                    self.failed.add(key)
+                else:
+                    self.frames.put(key, image)
+    
+    @staticmethod
+    def _render(path, index, size, text, coordinates):
+        img_font = ImageFont.truetype(path, size, index=index)
+        img_font.set_variation_by_axes(list(coordinates))
+        width = int(img_font.getlength(text)) + 20
+        image = Image.new("RGB", (max(width, 40), int(size * 1.6) + 10), "#FFFFFF")
+        ImageDraw.Draw(image).text((10, 5), text, fill="#000000", font=img_font)
+        return image
+
+class SpecimenRenderer:
+    """字体样张墙的后台光栅化池
+    
+    请求后进先出，滚动时只保留可见卡片的请求；渲染结果放在受内存预算管理的缓存中，
+    每个线程各自缓存打开的字体（FreeType 字体对象不能跨线程共用）。
+    """
+    
+    def __init__(self, workers=None, cache_manager=None):
+        self.cache = (cache_manager or CacheManager(64 * 1024 * 1024)).cache("specimen_cards", priority=0.5)
+        self.requests = []
+        self.pending = set()
+        self.failed = RecentFailures()
+        self.completed = deque()
+        self.closed = False
+        self.local = threading.local()
+        self.condition = threading.Condition()
+        for _ in range(workers or max(1, min(4, (os.cpu_count() or 2) // 2))):
+            threading.Thread(target=self._work, daemon=True).start()
+    
+    def get(self, key):
+        """返回缓存的图像，未渲染时返回None；key 为 (路径, 索引, 字号, 文本, 宽, 高)"""
+        with self.condition:
+            return self.cache.get(key)
+    
+    def request(self, key):
+        with self.condition:
+            if key in self.cache or key in self.pending or key in self.failed:
+                return
+            self.pending.add(key)
+            self.requests.append(key)
+            self.condition.notify()
+    
+    def retain(self, keys):
+        """丢弃不在 keys 中的待渲染请求（已滚出视口的卡片）"""
+        with self.condition:
+            self.requests = [key for key in self.requests if key in keys]
+            self.pending = set(self.requests) | (self.pending & keys)
+    
+    def take_completed(self):
+        """取出自上次以来渲染完成的键"""
+        with self.condition:
+            keys = list(self.completed)
+            self.completed.clear()
+            return keys
+    
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.requests.clear()
+            self.failed.clear()
+            self.cache.clear()
+            self.condition.notify_all()
+    
+    def _work(self):
+        while True:
+            with self.condition:
+                while not self.requests and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                key = self.requests.pop()
+            try:
+                image = self._render(*key)
+            except Exception:
+                image = None
+            with self.condition:
+                if key not in self.pending:
+                    continue
+                self.pending.discard(key)
+                if image is None:
+                    self.failed.add(key)
+                    continue
+                self.cache.put(key, image)
+                self.completed.append(key)
+    
+    def _render(self, path, index, size, text, width, height):
+        fonts = getattr(self.local, "fonts", None)
+        if fonts is None:
+            fonts = self.local.fonts = OrderedDict()
+        img_font = fonts.get((path, index, size))
+        if img_font is None:
+            img_font = fonts[(path, index, size)] = ImageFont.truetype(path, size, index=index)
+            if len(fonts) > 64:
+                fonts.popitem(last=False)
+        ascent, descent = img_font.getmetrics()
+        image = Image.new("L", (width, height), 255)
+        ImageDraw.Draw(image).text((4, max(0, (height - ascent - descent) // 2)), text, fill=0, font=img_font)
+        return image
+
+# 不能出现在行首和行尾的标点（断行禁则）
+NO_LINE_START = set("，。、；：！？）」』】》〉,.;:!?)]}%…—")
+NO_LINE_END = set("（「『【《〈([{")
+
+# 断行单位：每个中日韩字符单独成段，空白和其他连续字符（单词）各成一段
+_CJK_CHARS = "\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef"
+LAYOUT_TOKEN_PATTERN = re.compile(f"[{_CJK_CHARS}]|\\s+|[^\\s{_CJK_CHARS}]+")
+
+class TextLayoutEngine:
+    """导出图片使用的文本排版：中西文断行、按宽度折行、按字体度量计算行高和分页
+    
+    每个 (字体, 字号) 的字符宽度表会被缓存，排版长文本时每个字符只测量一次。
+    """
+    
+    def __init__(self, cache_manager=None):
+        self.advance_tables = (cache_manager or CacheManager(64 * 1024 * 1024)).cache("advance_tables", priority=3.0)
+    
+    def advance_table(self, font_key, size):
+        """返回 (字体, 字号) 的字符宽度表（按约4000个字符估计大小）"""
+        table = self.advance_tables.get((font_key, size))
+        if table is None:
+            table = self.advance_tables.put((font_key, size), {}, size=4000 * 120)
+        return table
+    
+    @staticmethod
+    def measure(text, img_font, table):
+        """计算文本宽度（逐字符累加缓存的宽度）"""
+        total = 0.0
+        for char in text:
+            advance = table.get(char)
+            if advance is None:
+                advance = table[char] = img_font.getlength(char)
+            total += advance
+        return total
+    
+    def wrap(self, text, img_font, font_key, width):
+        """将文本按宽度折行，返回行列表（空段落保留为空行）"""
+        table = self.advance_table(font_key, img_font.size)
+        lines = []
+        for paragraph in text.split("\n"):
+            line, line_width = [], 0.0
+            for token in LAYOUT_TOKEN_PATTERN.findall(paragraph):
+                token_width = self.measure(token, img_font, table)
+                if token.isspace():
+                    if line:
+                        line.append(token)
+                        line_width += token_width
+                    continue
+                
+                # 放得下，或者是不能出现在行首的标点（悬挂在行尾）
+                if line_width + token_width <= width or (line and token in NO_LINE_START):
+                    line.append(token)
+                    line_width += token_width
+                    continue
+                
+                # 超过整行宽度的单词另起一行，再按字符拆分
+                if token_width > width:
+                    if line:
+                        lines.append("".join(line).rstrip())
+                        line, line_width = [], 0.0
+                    for char in token:
+                        advance = table[char]
+                        if line and line_width + advance > width:
+                            lines.append("".join(line).rstrip())
+                            line, line_width = [], 0.0
+                        line.append(char)
+                        line_width += advance
+                    continue
+                
+                # 不能出现在行尾的标点移到下一行
+                carry = []
+                while line and (line[-1] in NO_LINE_END or line[-1].isspace()):
+                    token_end = line.pop()
+                    if token_end in NO_LINE_END:
+                        carry.insert(0, token_end)
+                if line:
+                    lines.append("".join(line).rstrip())
+                line = carry + [token]
+                line_width = self.measure("".join(line), img_font, table)
+            lines.append("".join(line).rstrip())
+        return lines
+    
+    @staticmethod
+    def line_height(img_font, face=None):
+        """根据字体度量计算行高（上升+下降，再加上OS/2中的行距）"""
+        ascent, descent = img_font.getmetrics()
+        gap = 0
+        if face and face.get("line_gap"):
+            gap = round(face["line_gap"] * img_font.size / face["units_per_em"])
+        return max(ascent + descent + gap, 1)
+    
+    @staticmethod
+    def paginate(lines, line_height, page_height, margin):
+        """按页面高度分页"""
+        per_page = max(1, (page_height - 2 * margin) // line_height)
+        return [lines[i:i + per_page] for i in range(0, len(lines), per_page)] or [[]]
+    
+    def iter_pages(self, text, img_font, font_key, width, height, margin=20,
+                   background="#FFFFFF", foreground="#000000", face=None):
+        """排版并逐页渲染，生成 (页码, 总页数, 图片)"""
+        lines = self.wrap(text, img_font, font_key, width - 2 * margin)
+        while lines and not lines[-1]:
+            lines.pop()
+        line_height = self.line_height(img_font, face)
+        pages = self.paginate(lines, line_height, height, margin)
+        for page_number, page_lines in enumerate(pages, 1):
+            image = Image.new("RGB", (width, height), background)
+            draw = ImageDraw.Draw(image)
+            for i, line in enumerate(page_lines):
+                draw.text((margin, margin + i * line_height), line, fill=foreground, font=img_font)
+            yield page_number, len(pages), image
+    
+    def render_pages(self, text, img_font, font_key, width, height, **options):
+        """排版并渲染为一页或多页图片"""
+        return [image for _, _, image in self.iter_pages(text, img_font, font_key, width, height, **options)]
+
+class SampleDocument:
+    """示例文本的共享文档模型：每次更新只计算变化的行范围并通知订阅者
+    
+    订阅者收到 (起始行, 删除的行数, 插入的行列表)，行号从0开始。
+    """
+    
+    def __init__(self, text=""):
+        self.lines = text.split("\n")
+        self.version = 0
+        self.listeners = []
+    
+    @property
+    def text(self):
+        return "\n".join(self.lines)
+    
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+    
+    def unsubscribe(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+    
+    def update(self, text):
+        """用新文本更新文档，返回变化 (起始行, 删除行数, 插入行) 或 None"""
+        new_lines = text.split("\n")
+        old_lines = self.lines
+        limit = min(len(old_lines), len(new_lines))
+        start = 0
+        while start < limit and old_lines[start] == new_lines[start]:
+            start += 1
+        if start == len(old_lines) == len(new_lines):
+            return None
+        
+        # 公共后缀不能与公共前缀重叠
+        end = 0
+        while end < limit - start and old_lines[-1 - end] == new_lines[-1 - end]:
+            end += 1
+        change = (start, len(old_lines) - start - end, new_lines[start:len(new_lines) - end])
+        
+        self.lines = new_lines
+        self.version += 1
+        for listener in list(self.listeners):
+            listener(*change)
+        return change
+
+class GlyphOutlineCache:
+    """字形轮廓缓存：按 (字体文件, 索引, 字形) 缓存转换好的SVG路径和步进宽度
+    
+    打开的字体和轮廓都放在受内存预算管理的缓存中，导出长文本或多种字体时不必重复读取和转换。
+    路径使用字体单位（y轴向上）。
+    """
+    
+    def __init__(self, cache_manager=None):
+        cache_manager = cache_manager or CacheManager(64 * 1024 * 1024)
+        self.fonts = cache_manager.cache("outline_fonts", priority=4.0)
+        self.outlines = cache_manager.cache("glyph_outlines", priority=2.0)
+        self.lock = threading.Lock()
+    
+    def font(self, path, index):
+        """返回 (字形集, 字符映射, 每em单位数)"""
+        key = (path, index)
+        entry = self.fonts.get(key)
+        if entry is None:
+            tt_font = TTFont(path, fontNumber=index, lazy=True)
+            entry = (tt_font.getGlyphSet(), tt_font.getBestCmap() or {}, tt_font["head"].unitsPerEm)
+            self.fonts.put(key, entry, size=os.path.getsize(path), cost=8.0)
+        return entry
+    
+    def glyph(self, path, index, char):
+        """返回字符的 (字形名, SVG路径, 步进宽度)，缺字时使用 .notdef"""
+        with self.lock:
+            glyph_set, cmap, units_per_em = self.font(path, index)
+            name = cmap.get(ord(char), ".notdef")
+            key = (path, index, name)
+            outline = self.outlines.get(key)
+            if outline is None:
+                glyph = glyph_set[name] if name in glyph_set else None
+                if glyph is None:
+                    outline = (name, "", 0)
+                else:
+                    pen = SVGPathPen(glyph_set)
+                    glyph.draw(pen)
+                    outline = (name, pen.getCommands(), glyph.width)
+                self.outlines.put(key, outline, size=len(outline[1]) + 128)
+            return outline
+    
+    def units_per_em(self, path, index):
+        with self.lock:
+            return self.font(path, index)[2]
+
+class OutlineMetrics:
+    """以轮廓的步进宽度提供 getlength，使 TextLayoutEngine 可以直接为矢量导出折行"""
+    
+    def __init__(self, cache, face, size):
+        self.cache = cache
+        self.face = face
+        self.size = size
+        self.scale = size / cache.units_per_em(face["path"], face["index"])
+    
+    def getlength(self, text):
+        return sum(self.cache.glyph(self.face["path"], self.face["index"], char)[2] for char in text) * self.scale
+
+def export_text_svg(path, text, face, size, width, layout_engine, outline_cache,
+                    background="#FFFFFF", foreground="#000000", margin=60, progress=None):
+    """把文本排版为SVG：每个用到的字形定义一次 <symbol>，文字用 <use> 引用"""
+    metrics = OutlineMetrics(outline_cache, face, size)
+    font_key = ("outline", face["path"], face["index"])
+    lines = layout_engine.wrap(text.rstrip("\n"), metrics, font_key, width - 2 * margin)
+    
+    units_per_em = face["units_per_em"] or outline_cache.units_per_em(face["path"], face["index"])
+    # 旧缓存或缺少OS/2、hhea表的字体没有垂直度量，按常见比例估算
+    ascender = face.get("ascender", round(units_per_em * 0.8))
+    descender = face.get("descender", -round(units_per_em * 0.2))
+    ascent = ascender * size / units_per_em
+    line_height = (ascender - descender + face.get("line_gap", 0)) * size / units_per_em
+    height = round(2 * margin + max(1, len(lines)) * line_height)
+    
+    symbols = {}
+    glyphs = {}
+    uses = []
+    for number, line in enumerate(lines):
+        x = float(margin)
+        baseline = margin + ascent + number * line_height
+        for char in line:
+            outline = glyphs.get(char)
+            if outline is None:
+                outline = glyphs[char] = outline_cache.glyph(face["path"], face["index"], char)
+            name, commands, advance = outline
+            if commands:
+                if name not in symbols:
+                    symbols[name] = (f"g{len(symbols)}", commands)
+                symbol_id = symbols[name][0]
+                uses.append(f'<use xlink:href="#{symbol_id}" transform="translate({x:.2f} {baseline:.2f}) '
+                            f'scale({metrics.scale:.6f} {-metrics.scale:.6f})"/>')
+            x += advance * metrics.scale
+        if progress:
+            progress(number + 1, len(lines))
+    
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write(f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+                f'width="{width}" height="{height}" viewBox="0 0 {width} {height}">\n')
+        f.write(f'<rect width="100%" height="100%" fill="{background}"/>\n<defs>\n')
+        for symbol_id, commands in symbols.values():
+            f.write(f'<symbol id="{symbol_id}" overflow="visible"><path d="{commands}"/></symbol>\n')
+        f.write(f'</defs>\n<g fill="{foreground}">\n')
+        f.write("\n".join(uses))
+        f.write("\n</g>\n</svg>\n")
+    return len(symbols), len(uses)
+
+# OpenType特性 (标签, 名称, 默认是否开启)；默认开启的特性取消勾选时显式关闭
+OPENTYPE_FEATURES = [
+    ("kern", "字距调整", True), ("liga", "标准连字", True), ("calt", "上下文替代", True),
+    ("dlig", "自由连字", False), ("smcp", "小型大写", False), ("c2sc", "大写转小型大写", False),
+    ("case", "大小写相关形式", False), ("onum", "旧式数字", False), ("lnum", "等高数字", False),
+    ("tnum", "等宽数字", False), ("pnum", "比例数字", False), ("zero", "带斜线的零", False),
+    ("frac", "分数", False), ("sups", "上标", False), ("subs", "下标", False),
+    ("vert", "竖排字形（竖排显示）", False)
+] + [(f"ss{i:02d}", f"样式集 {i}", False) for i in range(1, 21)]
+
+def feature_settings(enabled):
+    """把勾选的特性转换为 raqm 的特性列表（元组，可作缓存键）"""
+    settings = []
+    for tag, label, default in OPENTYPE_FEATURES:
+        if default and tag not in enabled:
+            settings.append(f"-{tag}")
+        elif not default and tag in enabled:
+            settings.append(tag)
+    return tuple(settings)
+
+class ShapedRunCache:
+    """整形后文本行的缓存：按 (字体, 字号, 特性, 方向, 行文本) 保存渲染好的灰度图像
+    
+    切换特性或滚动长文档时只有没有缓存的行需要重新整形。行内用到的字距对
+    按 (字体, 字号, 特性, 字符对) 缓存，通过开关kern比较字符对的整形宽度得到。
+    """
+    
+    def __init__(self, cache_manager=None):
+        cache_manager = cache_manager or CacheManager(64 * 1024 * 1024)
+        self.runs = cache_manager.cache("shaped_runs", priority=1.5)
+        self.pairs = cache_manager.cache("kerning_pairs", priority=2.0)
+    
+    @staticmethod
+    def line_box(img_font, direction):
+        """水平排版返回行高，竖排返回列宽"""
+        if direction == "ttb":
+            return int(img_font.size * 1.25)
+        ascent, descent = img_font.getmetrics()
+        return ascent + descent
+    
+    def run(self, img_font, font_key, settings, direction, line):
+        key = (font_key, img_font.size, settings, direction, line)
+        image = self.runs.get(key)
+        if image is None:
+            image = self._shape(img_font, settings, direction, line)
+            self.runs.put(key, image, size=image.width * image.height + 128, cost=2.0)
+        return image
+    
+    def _shape(self, img_font, settings, direction, line):
+        box = self.line_box(img_font, direction)
+        if not line.strip():
+            return Image.new("L", (box, 1) if direction == "ttb" else (1, box))
+        # 没有特性设置时不传参数，基本排版引擎不接受任何整形参数
+        options = {"features": list(settings)} if settings else {}
+        if direction:
+            options["direction"] = direction
+        if direction == "ttb":
+            left, top, right, bottom = img_font.getbbox(line, **options)
+            image = Image.new("L", (box, max(1, math.ceil(bottom - min(top, 0)))))
+            ImageDraw.Draw(image).text(((box - (right - left)) / 2 - left, -min(top, 0)), line,
+                                       font=img_font, fill=255, **options)
+        else:
+            ascent = img_font.getmetrics()[0]
+            left, top, right, bottom = img_font.getbbox(line, anchor="ls", **options)
+            offset = max(0, -left)
+            image = Image.new("L", (max(1, math.ceil(right + offset)), box))
+            ImageDraw.Draw(image).text((offset, ascent), line, font=img_font, fill=255, anchor="ls", **options)
+        return image
+    
+    def kerning_pairs(self, img_font, font_key, settings, direction, line):
+        """返回行内字距调整不为0的相邻字符对 [(字符对, 像素), ...]；kern关闭或竖排时为空"""
+        if "-kern" in settings or direction == "ttb":
+            return []
+        base = [setting for setting in settings if setting != "kern"]
+        pairs = []
+        for a, b in zip(line, line[1:]):
+            if a.isspace() or b.isspace():
+                continue
+            pair = a + b
+            key = (font_key, img_font.size, settings, pair)
+            adjust = self.pairs.get(key)
+            if adjust is None:
+                adjust = round(img_font.getlength(pair, features=base + ["kern"]) -
+                               img_font.getlength(pair, features=base + ["-kern"]), 2)
+                self.pairs.put(key, adjust, size=96)
+            if adjust:
+                pairs.append((pair, adjust))
+        return pairs
+
+class ExportCancelled(Exception):
+    """导出任务被取消"""
+
+class ExportJob:
+    """后台导出任务，task(job) 中通过 job.report() 报告进度并响应取消"""
+    
+    def __init__(self, job_id, title, task):
+        self.id = job_id
+        self.title = title
+        self.task = task
+        self.status = "等待中"
+        self.progress = 0.0
+        self.error = None
+        self.submitted_at = time.perf_counter()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+    
+    def report(self, done, total):
+        """报告进度，任务已取消时抛出 ExportCancelled"""
+        if self.cancel_event.is_set():
+            raise ExportCancelled()
+        self.progress = done / total if total else 1.0
+    
+    def cancel(self):
+        self.cancel_event.set()
+        if self.status == "等待中":
+            self.status = "已取消"
+    
+    def elapsed(self):
+        """已运行时间（秒）"""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+    
+    def run(self):
+        if self.cancel_event.is_set():
+            self.status = "已取消"
+            return
+        self.status = "进行中"
+        self.started_at = time.perf_counter()
+        try:
+            self.task(self)
+            self.progress = 1.0
+            self.status = "已完成"
+        except ExportCancelled:
+            self.status = "已取消"
+        except Exception as e:
+            self.error = e
+            self.status = "失败"
+        finally:
+            self.finished_at = time.perf_counter()
+
+class ExportJobQueue:
+    """导出任务队列：工作线程数可随时调整，任务按提交顺序执行"""
+    IDLE_TIMEOUT = 30
+    
+    def __init__(self, max_workers=2):
+        self.max_workers = max_workers
+        self.jobs = []
+        self.job_ids = itertools.count(1)
+        self.waiting = deque()
+        self.finished = queue.Queue()
+        self.workers = 0
+        self.condition = threading.Condition()
+    
+    def submit(self, title, task):
+        """提交任务，返回 ExportJob"""
+        with self.condition:
+            job = ExportJob(next(self.job_ids), title, task)
+            self.jobs.append(job)
+            self.waiting.append(job)
+            self._spawn()
+            self.condition.notify()
+        return job
+    
+    def set_max_workers(self, max_workers):
+        """调整并发数，多余的工作线程在完成当前任务后退出"""
+        with self.condition:
+            self.max_workers = max(1, max_workers)
+            self._spawn()
+            self.condition.notify_all()
+    
+    def clear_finished(self):
+        """移除已结束的任务"""
+        with self.condition:
+            self.jobs = [job for job in self.jobs if job.finished_at is None and job.status != "已取消"]
+    
+    def _spawn(self):
+        while self.workers < min(self.max_workers, len(self.waiting)):
+            self.workers += 1
+            threading.Thread(target=self._work, daemon=True).start()
+    
+    def _work(self):
+        while True:
+            with self.condition:
+                while not self.waiting or self.workers > self.max_workers:
+                    if self.workers > self.max_workers or not self.condition.wait(self.IDLE_TIMEOUT):
+                        if self.workers > self.max_workers or not self.waiting:
+                            self.workers -= 1
+                            return
+                job = self.waiting.popleft()
+            job.run()
+            self.finished.put(job)
+
+def render_glyph_cells(path, index, size, chars):
+    """把每个字符按同一基线原点渲染到方形单元格中，返回 (字符数, 单元格, 单元格) 的灰度数组"""
+    img_font = ImageFont.truetype(path, size, index=index)
+    cell = size * 2
+    sheet = Image.new("L", (cell, cell * len(chars)), 0)
+    draw = ImageDraw.Draw(sheet)
+    for i, char in enumerate(chars):
+        draw.text((size // 2, i * cell + size * 3 // 2), char, fill=255, font=img_font, anchor="ls")
+    return np.asarray(sheet, dtype=np.float32).reshape(len(chars), cell, cell) / 255.0
+
+def glyph_difference_scores(face_a, face_b, size, chars):
+    """计算每个字符在两种字体中渲染结果的差异（不同墨迹占两者墨迹的比例，0-1）"""
+    cells_a = render_glyph_cells(face_a["path"], face_a["index"], size, chars)
+    cells_b = render_glyph_cells(face_b["path"], face_b["index"], size, chars)
+    difference = np.abs(cells_a - cells_b).sum(axis=(1, 2))
+    ink = np.maximum(cells_a, cells_b).sum(axis=(1, 2))
+    return (difference / np.maximum(ink, 1.0)).tolist()
+
+class FontPixelDiff:
+    """两种字体渲染结果的像素差异：文本热力图和逐字形差异评分"""
+    CHUNK_SIZE = 512
+    
+    def __init__(self, face_a, face_b, size=32):
+        self.face_a = face_a
+        self.face_b = face_b
+        self.size = size
+    
+    def common_characters(self):
+        """两种字体都支持的可见字符"""
+        ranges_a = decode_ranges(self.face_a["coverage"]) if self.face_a.get("coverage") else ([], [])
+        ranges_b = decode_ranges(self.face_b["coverage"]) if self.face_b.get("coverage") else ([], [])
+        chars = []
+        for start, end in zip(*ranges_a):
+            for codepoint in range(start, min(end, 0x10FFFF) + 1):
+                if ranges_contain(ranges_b, codepoint):
+                    char = chr(codepoint)
+                    if unicodedata.category(char)[0] not in ("C", "Z"):
+                        chars.append(char)
+        return chars
+    
+    def glyph_scores(self, chars=None, progress=None):
+        """并行计算逐字形差异，返回按差异从大到小排序的 [(字符, 分数), ...]"""
+        chars = chars if chars is not None else self.common_characters()
+        chunks = [chars[i:i + self.CHUNK_SIZE] for i in range(0, len(chars), self.CHUNK_SIZE)]
+        scores = []
+        if len(chunks) <= 1:
+            for chunk in chunks:
+                scores += zip(chunk, glyph_difference_scores(self.face_a, self.face_b, self.size, chunk))
+        else:
+            with create_process_pool() as executor:
+                futures = {executor.submit(glyph_difference_scores, self.face_a, self.face_b, self.size, chunk): chunk
+                           for chunk in chunks}
+                for done, future in enumerate(as_completed(futures), 1):
+                    scores += zip(futures[future], future.result())
+                    if progress:
+                        progress(done, len(futures))
+        scores.sort(key=lambda item: -item[1])
+        return scores
+    
+    def text_heatmap(self, text, width, layout_engine, max_lines=40):
+        """在对齐的基线网格上渲染两种字体的文本，返回 (叠加图, 差异比例)
+        
+        两者共有的墨迹显示为灰色，只在A中的为红色，只在B中的为蓝色。
+        """
+        font_a = ImageFont.truetype(self.face_a["path"], self.size, index=self.face_a["index"])
+        font_b = ImageFont.truetype(self.face_b["path"], self.size, index=self.face_b["index"])
+        lines = layout_engine.wrap(text, font_a, (self.face_a["path"], self.face_a["index"]), width - 40)[:max_lines]
+        line_height = max(layout_engine.line_height(font_a, self.face_a), layout_engine.line_height(font_b, self.face_b))
+        ascent = max(font_a.getmetrics()[0], font_b.getmetrics()[0])
+        height = line_height * max(len(lines), 1) + 40
+        
+        layers = []
+        for img_font in (font_a, font_b):
+            image = Image.new("L", (width, height), 0)
+            draw = ImageDraw.Draw(image)
+            for i, line in enumerate(lines):
+                draw.text((20, 20 + ascent + i * line_height), line, fill=255, font=img_font, anchor="ls")
+            layers.append(np.asarray(image, dtype=np.float32) / 255.0)
+        
+        a, b = layers
+        both = np.minimum(a, b)
+        only_a = a - both
+        only_b = b - both
+        overlay = np.stack([
+            255 - 180 * both - 255 * only_b,
+            255 - 180 * both - 255 * (only_a + only_b),
+            255 - 180 * both - 255 * only_a
+        ], axis=-1)
+        ratio = float(np.abs(a - b).sum() / max(np.maximum(a, b).sum(), 1.0))
+        return Image.fromarray(np.clip(overlay, 0, 255).astype(np.uint8), "RGB"), ratio
+
+# 内置分类规则（简单分类逻辑，可在 category_rules.json 中修改和添加）
+DEFAULT_CATEGORY_RULES = [
+    {"name": "中文字体", "keywords": ["song", "hei", "kai", "fang", "sim", "microsoft", "yahei"]},
+    {"name": "英文字体", "keywords": ["arial", "times", "courier", "verdana", "tahoma", "georgia"]},
+    {"name": "等宽字体", "keywords": ["mono", "courier", "consolas", "fixedsys"]},
+    {"name": "衬线字体", "keywords": ["times", "georgia", "宋体", "simsun"]},
+    {"name": "无衬线字体", "keywords": ["arial", "helvetica", "verdana", "tahoma", "黑体", "yahei"],
+     "unless": ["衬线字体"]}
+]
+
+CATEGORY_RULES_FILE = "category_rules.json"
+
+# 界面内置的分类，规则不能使用这些名称
+RESERVED_CATEGORY_NAMES = ("所有字体", "收藏夹")
+
+class KeywordAutomaton:
+    """Aho-Corasick 多模式匹配：一次扫描找出文本中出现的所有关键字"""
+    
+    def __init__(self, keywords):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [set()]
+        for index, keyword in enumerate(keywords):
+            state = 0
+            for char in keyword:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(set())
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].add(index)
+        
+        # 广度优先建立失败链接，并合并后缀状态的输出（第一层的失败链接指向根）
+        pending = deque(self.goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, child in self.goto[state].items():
+                pending.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] |= self.output[self.fail[child]]
+    
+    def search(self, text):
+        """返回文本中出现的关键字序号集合"""
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            if self.output[state]:
+                found |= self.output[state]
+        return found
+
+class CategoryRuleSet:
+    """把分类规则编译为一个关键字自动机加每条规则的元数据条件
+    
+    规则字段：
+        name       分类名称
+        keywords   名称中包含任一关键字（不区分大小写）；为空表示只看其他条件
+        exclude    名称中包含任一关键字时不属于该分类
+        unless     已属于这些分类时不属于该分类（只能引用排在前面的规则）
+        monospace, italic, variable       布尔条件
+        weight_min, weight_max, width_min, width_max, min_codepoints   数值条件
+        coverage   {文字: 最低覆盖率}，文字取 SCRIPT_RANGES 的键
+    元数据条件需要字体文件信息，没有信息时该规则不匹配。
+    """
+    METADATA_KEYS = ("monospace", "italic", "variable", "weight_min", "weight_max",
+                     "width_min", "width_max", "min_codepoints", "coverage")
+    LIST_KEYS = ("keywords", "exclude", "unless")
+    BOOL_KEYS = ("monospace", "italic", "variable")
+    NUMBER_KEYS = ("weight_min", "weight_max", "width_min", "width_max", "min_codepoints")
+    
+    def __init__(self, rules):
+        if not isinstance(rules, list):
+            raise ValueError("分类规则必须是规则对象的列表")
+        self.rules = []
+        keywords = []
+        self.keyword_owners = []
+        seen = set()
+        for rule in rules:
+            if not isinstance(rule, dict):
+                raise ValueError(f"分类规则必须是对象: {rule!r}")
+            name = rule.get("name")
+            if not isinstance(name, str) or not name or name in seen:
+                raise ValueError(f"分类规则名称无效或重复: {name!r}")
+            if name in RESERVED_CATEGORY_NAMES:
+                raise ValueError(f"分类名称 {name} 为内置分类保留")
+            self.validate_fields(rule)
+            unknown = [category for category in rule.get("unless", []) if category not in seen]
+            if unknown:
+                raise ValueError(f"规则 {name} 的 unless 引用了未定义的分类: {', '.join(unknown)}")
+            for script in rule.get("coverage", {}):
+                if script not in SCRIPT_RANGES:
+                    raise ValueError(f"规则 {name} 的 coverage 使用了未知文字: {script}")
+            seen.add(name)
+            
+            index = len(self.rules)
+            for field, negate in (("keywords", False), ("exclude", True)):
+                for keyword in rule.get(field, []):
+                    keywords.append(keyword.lower())
+                    self.keyword_owners.append((index, negate))
+            self.rules.append(rule)
+        
+        self.automaton = KeywordAutomaton(keywords)
+        self.names = [rule["name"] for rule in self.rules]
+        self.metadata_names = set()
+        for rule in self.rules:
+            if any(key in rule for key in self.METADATA_KEYS) or self.metadata_names.intersection(rule.get("unless", [])):
+                self.metadata_names.add(rule["name"])
+        self.needs_metadata = bool(self.metadata_names)
+    
+    @classmethod
+    def validate_fields(cls, rule):
+        """检查规则各字段的类型，不合法时抛出 ValueError"""
+        name = rule["name"]
+        for key in cls.LIST_KEYS:
+            value = rule.get(key, [])
+            if not isinstance(value, list) or not all(isinstance(item, str) and item for item in value):
+                raise ValueError(f"规则 {name} 的 {key} 必须是非空字符串的列表")
+        for key in cls.BOOL_KEYS:
+            if key in rule and not isinstance(rule[key], bool):
+                raise ValueError(f"规则 {name} 的 {key} 必须是 true 或 false")
+        for key in cls.NUMBER_KEYS:
+            if key in rule and (isinstance(rule[key], bool) or not isinstance(rule[key], (int, float))):
+                raise ValueError(f"规则 {name} 的 {key} 必须是数字")
+        coverage = rule.get("coverage", {})
+        if not isinstance(coverage, dict) or not all(
+                isinstance(ratio, (int, float)) and not isinstance(ratio, bool) for ratio in coverage.values()):
+            raise ValueError(f"规则 {name} 的 coverage 必须是 {{文字: 比例}} 对象")
+    
+    def metadata_match(self, rule, face):
+        """检查规则的元数据条件"""
+        checks = [key for key in self.METADATA_KEYS if key in rule]
+        if not checks:
+            return True
+        if face is None:
+            return False
+        if "monospace" in rule and bool(face.get("monospace")) != rule["monospace"]:
+            return False
+        if "italic" in rule and bool(face.get("italic")) != rule["italic"]:
+            return False
+        if "variable" in rule and bool(face.get("axes")) != rule["variable"]:
+            return False
+        for key, field, compare in (("weight_min", "weight", max), ("weight_max", "weight", min),
+                                    ("width_min", "width", max), ("width_max", "width", min),
+                                    ("min_codepoints", "codepoints", max)):
+            if key in rule and compare(face.get(field) or 0, rule[key]) != (face.get(field) or 0):
+                return False
+        if "coverage" in rule:
+            coverage = script_coverage(face.get("coverage"))
+            if any(coverage[script] < ratio for script, ratio in rule["coverage"].items()):
+                return False
+        return True
+    
+    def classify(self, font_name, face=None):
+        """一次扫描名称，返回字体所属的分类（按规则顺序）"""
+        included = set()
+        excluded = set()
+        for keyword_index in self.automaton.search(font_name.lower()):
+            rule_index, negate = self.keyword_owners[keyword_index]
+            (excluded if negate else included).add(rule_index)
+        
+        categories = []
+        for index, rule in enumerate(self.rules):
+            if index in excluded:
+                continue
+            if rule.get("keywords") and index not in included:
+                continue
+            if not rule.get("keywords") and not any(key in rule for key in self.METADATA_KEYS):
+                continue
+            if any(category in categories for category in rule.get("unless", [])):
+                continue
+            if self.metadata_match(rule, face):
+                categories.append(rule["name"])
+        return categories
+    
+    def affected_by(self, other):
+        """返回与另一规则集相比需要重新计算的分类名称（包括通过 unless 间接受影响的）"""
+        old_rules = {rule["name"]: rule for rule in other.rules}
+        affected = set()
+        for rule in self.rules:
+            if old_rules.get(rule["name"]) != rule or affected.intersection(rule.get("unless", [])):
+                affected.add(rule["name"])
+        return affected
+
+def load_category_rules(path=CATEGORY_RULES_FILE):
+    """加载用户分类规则，文件不存在时使用内置规则"""
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return CategoryRuleSet(json.load(f))
+    return CategoryRuleSet(DEFAULT_CATEGORY_RULES)
+
+def categorize_font_name(font_name, rules=None, face=None):
+    """按分类规则返回字体所属的分类"""
+    return (rules or CategoryRuleSet(DEFAULT_CATEGORY_RULES)).classify(font_name, face)
+
+# 统计覆盖率的文字及其码位区间
+SCRIPT_RANGES = {
+    "latin": [(0x0041, 0x005A), (0x0061, 0x007A), (0x00C0, 0x024F)],
+    "greek": [(0x0370, 0x03FF)],
+    "cyrillic": [(0x0400, 0x04FF)],
+    "cjk": [(0x4E00, 0x9FFF)],
+    "kana": [(0x3040, 0x30FF)],
+    "hangul": [(0xAC00, 0xD7A3)],
+    "arabic": [(0x0600, 0x06FF)],
+    "hebrew": [(0x0590, 0x05FF)],
+    "thai": [(0x0E00, 0x0E7F)],
+    "devanagari": [(0x0900, 0x097F)]
+}
+
+def script_coverage(coverage):
+    """计算每种文字的码位覆盖率（0-1）"""
+    starts, ends = decode_ranges(coverage) if coverage else ([], [])
+    result = {}
+    for script, blocks in SCRIPT_RANGES.items():
+        total = covered = 0
+        for first, last in blocks:
+            total += last - first + 1
+            i = bisect.bisect_left(ends, first)
+            while i < len(starts) and starts[i] <= last:
+                covered += min(last, ends[i]) - max(first, starts[i]) + 1
+                i += 1
+        result[script] = covered / total
+    return result
+
+REPORT_FIELDS = (
+    ["family", "categories", "path", "index", "style", "weight", "width", "italic", "monospace",
+     "units_per_em", "ascender", "descender", "line_gap", "x_height", "cap_height", "codepoints"]
+    + [f"coverage_{script}" for script in SCRIPT_RANGES]
+    + ["duplicate"]
+)
+
+def build_report_rows(items):
+    """计算一批报告行（在进程池中运行），items 为 [(家族名, 分类列表, 字体头部信息, 重复状态), ...]"""
+    rows = []
+    for family, categories, face, duplicate in items:
+        row = dict.fromkeys(REPORT_FIELDS, "")
+        row["family"] = family
+        row["categories"] = ";".join(categories)
+        row["duplicate"] = duplicate
+        if face:
+            for field in REPORT_FIELDS:
+                if field in face and field not in ("family",):
+                    row[field] = face[field]
+            for script, ratio in script_coverage(face.get("coverage")).items():
+                row[f"coverage_{script}"] = round(ratio, 4)
+        rows.append(row)
+    return rows
+
+class CatalogReport:
+    """全目录字体报告：分批在进程池中计算，逐行写入CSV或JSON Lines，支持断点续写"""
+    CHUNK_SIZE = 200
+    WINDOW = 8
+    
+    def __init__(self, path, fmt=None):
+        self.path = path
+        self.format = fmt or ("jsonl" if path.lower().endswith((".jsonl", ".json")) else "csv")
+    
+    def completed_families(self):
+        """读取已写入的家族名，并截掉中断时写了一半的最后一行"""
+        done = set()
+        if not os.path.exists(self.path):
+            return done
+        
+        valid_end = 0
+        with open(self.path, "rb") as f:
+            offset = 0
+            for raw in f:
+                offset += len(raw)
+                if not raw.endswith(b"\n"):
+                    break
+                valid_end = offset
+                line = raw.decode("utf-8").rstrip("\r\n")
+                if self.format == "jsonl":
+                    try:
+                        done.add(json.loads(line)["family"])
+                    except (ValueError, KeyError):
+                        continue
+                elif valid_end != len(raw):
+                    done.add(next(csv.reader([line]))[0])
+        
+        with open(self.path, "r+b") as f:
+            f.truncate(valid_end)
+        return done
+    
+    def write(self, items, progress=None, resume=False):
+        """计算并写入报告，返回写入的行数"""
+        done = self.completed_families() if resume else set()
+        items = [item for item in items if item[0] not in done]
+        total = len(items) + len(done)
+        append = resume and os.path.exists(self.path) and os.path.getsize(self.path) > 0
+        
+        written = 0
+        with open(self.path, "a" if append else "w", encoding="utf-8", newline="") as f:
+            writer = None
+            if self.format == "csv":
+                writer = csv.DictWriter(f, REPORT_FIELDS)
+                if not append:
+                    writer.writeheader()
+            
+            chunks = (items[i:i + self.CHUNK_SIZE] for i in range(0, len(items), self.CHUNK_SIZE))
+            with create_process_pool() as executor:
+                # 只保留有限数量的待完成批次，按提交顺序写出，内存占用不随字体数量增长
+                pending = deque(executor.submit(build_report_rows, chunk)
+                                for chunk in itertools.islice(chunks, self.WINDOW))
+                while pending:
+                    rows = pending.popleft().result()
+                    for chunk in itertools.islice(chunks, 1):
+                        pending.append(executor.submit(build_report_rows, chunk))
+                    for row in rows:
+                        if writer:
+                            writer.writerow(row)
+                        else:
+                            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                    f.flush()
+                    written += len(rows)
+                    if progress:
+                        progress(len(done) + written, total)
+        return written
+
+def load_duplicate_status(cache_dir=CACHE_DIR):
+    """从重复字体检测的缓存中读取每个家族的重复状态（不重新扫描）"""
+    detector = FontDuplicateDetector(cache_dir)
+    detector.load()
+    if not detector.records:
+        return {}
+    return detector.family_status(detector.find_groups())
+
+def run_catalog_report(output, category=None, fmt=None, resume=False):
+    """无界面生成目录报告（命令行入口使用）"""
+    resolver = FontFileResolver()
+    health = FontHealthChecker()
+    health.load()
+    resolver.set_quarantine(health.quarantined())
+    resolver.scan()
+    rules = load_category_rules()
+    duplicates = load_duplicate_status()
+    items = []
+    for family in resolver.families():
+        face = resolver.resolve_face(family)
+        categories = rules.classify(family, face)
+        if not category or category in categories:
+            items.append((family, categories, face, duplicates.get(family.lower(), "")))
+    
+    def progress(done, total):
+        sys.stderr.write(f"\r已完成 {done}/{total}")
+        sys.stderr.flush()
+    
+    written = CatalogReport(output, fmt).write(items, progress, resume)
+    sys.stderr.write(f"\n报告已写入 {output}，本次写入 {written} 行\n")
+
+def run_health_check(directories=None, timeout=None):
+    """无界面检查字体文件并输出有问题的文件，有文件被隔离时返回1"""
+    checker = FontHealthChecker(timeout=timeout)
+    checker.load()
+    paths = list(iter_font_files(directories or get_font_directories()))
+    
+    def progress(done, total):
+        sys.stderr.write(f"\r已检查 {done}/{total}")
+        sys.stderr.flush()
+    
+    checker.scan(paths, progress)
+    for path in sorted(paths):
+        record = checker.records.get(path)
+        if record and record["status"] != "ok":
+            print(f"{record['status']}\t{path}\t{'; '.join(record['issues'])}")
+    summary = checker.summary()
+    sys.stderr.write(f"\n检查了 {len(paths)} 个文件: {json.dumps(summary, ensure_ascii=False)}\n")
+    return 1 if checker.quarantined() & set(paths) else 0
+
+# 相似度特征使用的字形集合
+SIMILARITY_GLYPHS = "ABGHKMORSaegknorsy25&"
+SIMILARITY_CANVAS = 64
+SIMILARITY_GRID = 8
+
+def render_glyph_array(img_font, char, canvas=SIMILARITY_CANVAS):
+    """将单个字形渲染到固定基线的方形画布上，返回0-1的灰度数组"""
+    image = Image.new("L", (canvas, canvas), 0)
+    ImageDraw.Draw(image).text((canvas // 2, canvas * 13 // 16), char, fill=255,
+                               font=img_font, anchor="ms")
+    return np.asarray(image, dtype=np.float32) / 255.0
+
+def stroke_statistics(glyph):
+    """根据水平/垂直游程估算笔画宽度与粗细对比"""
+    ink = glyph > 0.5
+    ink_total = ink.sum()
+    if ink_total == 0:
+        return 0.0, 0.0, 0.0
+    runs_h = ink[:, 0].sum() + (ink[:, 1:] & ~ink[:, :-1]).sum()
+    runs_v = ink[0, :].sum() + (ink[1:, :] & ~ink[:-1, :]).sum()
+    width_h = ink_total / max(runs_h, 1)
+    width_v = ink_total / max(runs_v, 1)
+    thin, thick = sorted((width_h, width_v))
+    return thick, thick / max(thin, 1e-6), ink_total / ink.size
+
+def extract_font_features(path, index=0):
+    """渲染固定字形集，计算降采样位图与笔画统计组成的特征向量"""
+    img_font = ImageFont.truetype(path, SIMILARITY_CANVAS * 3 // 4, index=index)
+    block = SIMILARITY_CANVAS // SIMILARITY_GRID
+    cells = []
+    stats = []
+    for char in SIMILARITY_GLYPHS:
+        glyph = render_glyph_array(img_font, char)
+        cells.append(glyph.reshape(SIMILARITY_GRID, block, SIMILARITY_GRID, block).mean(axis=(1, 3)).ravel())
+        stats.append(stroke_statistics(glyph))
+    stats = np.asarray(stats, dtype=np.float32)
+    summary = np.array([
+        stats[:, 0].mean() / block,
+        stats[:, 0].std() / block,
+        min(stats[:, 1].mean(), 10.0) / 10.0,
+        stats[:, 2].mean()
+    ], dtype=np.float32)
+    return np.concatenate(cells + [summary * 4.0])
+
+class FontSimilarityIndex:
+    """字体视觉相似度索引
+    
+    特征向量经PCA压缩后保存为矩阵文件，查询时在压缩空间中按余弦相似度排序。
+    原始特征也一并保存：样本不足以求出完整的基，或样本数比上次拟合时翻倍时重新拟合。
+    """
+    
+    def __init__(self, cache_dir=CACHE_DIR, dims=64):
+        self.cache_dir = cache_dir
+        self.dims = dims
+        self.entries = []
+        self.rows = {}
+        self.features = None
+        self.vectors = None
+        self.mean = None
+        self.basis = None
+        self.fit_size = 0
+    
+    def _paths(self):
+        return (os.path.join(self.cache_dir, "similarity_vectors.npy"),
+                os.path.join(self.cache_dir, "similarity_basis.npz"),
+                os.path.join(self.cache_dir, "similarity_entries.json"),
+                os.path.join(self.cache_dir, "similarity_features.npy"))
+    
+    def load(self):
+        """从缓存加载索引"""
+        vectors_path, basis_path, entries_path, features_path = self._paths()
+        try:
+            with open(entries_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            vectors = np.load(vectors_path)
+            features = np.load(features_path)
+            model = np.load(basis_path)
+            if not len(vectors) == len(features) == len(entries):
+                return
+            self.entries = entries
+            self.vectors = vectors
+            self.features = features
+            self.mean = model["mean"]
+            self.basis = model["basis"]
+            self.fit_size = int(model["fit_size"])
+            self.rows = {e["family"]: i for i, e in enumerate(entries)}
+        except (OSError, ValueError, KeyError):
+            pass
+    
+    def save(self):
+        """保存索引到缓存"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        vectors_path, basis_path, entries_path, features_path = self._paths()
+        np.save(vectors_path, self.vectors)
+        np.save(features_path, self.features)
+        np.savez(basis_path, mean=self.mean, basis=self.basis, fit_size=self.fit_size)
+        with open(entries_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+    
+    def update(self, resolver, families, progress=None):
+        """增量更新索引：只为新增或文件有变化的字体提取特征"""
+        targets = {}
+        for family in families:
+            resolved = resolver.resolve(family)
+            if not resolved:
+                continue
+            try:
+                stat = os.stat(resolved[0])
+            except OSError:
+                continue
+            targets[family] = [resolved[0], resolved[1], stat.st_mtime, stat.st_size]
+        
+        kept_entries, kept_rows, pending = [], [], {}
+        for family, key in targets.items():
+            row = self.rows.get(family)
+            entry = self.entries[row] if row is not None else None
+            if entry and [entry["path"], entry["index"], entry["mtime"], entry["size"]] == key:
+                kept_entries.append(entry)
+                kept_rows.append(row)
+            else:
+                pending.setdefault(tuple(key[:2]), []).append((family, key))
+        
+        new_entries, new_features = [], []
+        if pending:
+            with create_process_pool() as executor:
+                futures = {executor.submit(extract_font_features, path, index): (path, index)
+                           for path, index in pending}
+                for done, future in enumerate(as_completed(futures), 1):
+                    try:
+                        features = future.result()
+                    except Exception:
+                        features = None
+                    if features is not None:
+                        for family, key in pending[futures[future]]:
+                            new_entries.append({"family": family, "path": key[0], "index": key[1],
+                                                "mtime": key[2], "size": key[3]})
+                            new_features.append(features)
+                    if progress:
+                        progress(done, len(futures))
+        
+        if not new_entries and len(kept_entries) == len(self.entries):
+            return
+        
+        kept_features = self.features[kept_rows] if kept_rows else None
+        self.entries = kept_entries + new_entries
+        self.rows = {e["family"]: i for i, e in enumerate(self.entries)}
+        parts = [part for part in (kept_features, np.vstack(new_features) if new_features else None)
+                 if part is not None]
+        if not parts:
+            self.features = None
+            self.vectors = np.zeros((0, self.dims), dtype=np.float32)
+            self.save()
+            return
+        
+        self.features = np.vstack(parts).astype(np.float32)
+        if self._needs_fit(self.features):
+            self._fit(self.features)
+            self.vectors = self._project(self.features)
+        else:
+            vectors = [self.vectors[kept_rows]] if kept_rows else []
+            if new_features:
+                vectors.append(self._project(np.vstack(new_features)))
+            self.vectors = np.vstack(vectors)
+        self.save()
+    
+    def _needs_fit(self, features):
+        """没有基、特征维度变化、基的列数少于样本允许的数量，或样本数翻倍时需要重新拟合"""
+        if self.basis is None or self.basis.shape[0] != features.shape[1]:
+            return True
+        possible = min(self.dims, len(features), features.shape[1])
+        return self.basis.shape[1] < possible or len(features) >= 2 * self.fit_size
+    
+    def _fit(self, features):
+        """用PCA求出压缩基（最多取2000个样本）"""
+        sample = features[:2000]
+        self.mean = sample.mean(axis=0)
+        u, s, vt = np.linalg.svd(sample - self.mean, full_matrices=False)
+        self.basis = vt[:min(self.dims, len(vt))].T.astype(np.float32)
+        self.fit_size = len(features)
+    
+    def _project(self, features):
+        """投影到压缩空间并归一化"""
+        projected = (features - self.mean) @ self.basis
+        norms = np.linalg.norm(projected, axis=1, keepdims=True)
+        return (projected / np.maximum(norms, 1e-6)).astype(np.float32)
+    
+    def query(self, family, count=10):
+        """返回与指定字体最相似的 [(家族名, 相似度), ...]
+        
+        同一字体文件的多个家族名（如本地化名称）只返回一次，查询字体自身的别名不返回。
+        """
+        row = self.rows.get(family)
+        if row is None or self.vectors is None or len(self.vectors) < 2:
+            return []
+        scores = self.vectors @ self.vectors[row]
+        own = (self.entries[row]["path"], self.entries[row]["index"])
+        seen = {own}
+        results = []
+        for i in np.argsort(-scores):
+            face = (self.entries[i]["path"], self.entries[i]["index"])
+            if face in seen:
+                continue
+            seen.add(face)
+            results.append((self.entries[i]["family"], float(scores[i])))
+            if len(results) == count:
+                break
+        return results
+
+def font_identity(family, style):
+    """规范化的字体名称标识：忽略大小写、空白、标点和版本号
+    
+    只去掉带 v/ver/version 前缀或带小数点的版本号，"Univers 55" 这类表示字重的数字保留。
+    """
+    text = f"{family} {style}".lower()
+    text = re.sub(r"\bv(er(sion)?)?\.?\s*\d+(\.\d+)*\b|\b\d+(\.\d+)+\b", "", text)
+    return re.sub(r"[\W_]+", "", text)
+
+_PHASH_PLANES = None
+
+def perceptual_hash(img_font):
+    """渲染字形集并计算256位感知哈希（对降采样字形做随机超平面投影的SimHash）
+    
+    字体缺少大部分字形（只渲染出相同的缺字框）时返回None。
+    """
+    global _PHASH_PLANES
+    glyphs = [render_glyph_array(img_font, char) for char in SIMILARITY_GLYPHS]
+    if len({glyph.tobytes() for glyph in glyphs}) < len(glyphs) // 2:
+        return None
+    
+    block = SIMILARITY_CANVAS // SIMILARITY_GRID
+    cells = np.stack([glyph.reshape(SIMILARITY_GRID, block, SIMILARITY_GRID, block).mean(axis=(1, 3)).ravel()
+                      for glyph in glyphs])
+    features = (cells - cells.mean(axis=1, keepdims=True)).ravel()
+    
+    if _PHASH_PLANES is None or _PHASH_PLANES.shape[1] != features.size:
+        # 用固定的哈希序列生成±1投影矩阵，保证不同进程和版本间结果一致
+        seed = b"".join(hashlib.sha256(f"phash-{i}".encode()).digest() for i in range(features.size))
+        signs = np.unpackbits(np.frombuffer(seed, dtype=np.uint8)).reshape(features.size, 256)
+        _PHASH_PLANES = signs.T.astype(np.float32) * 2 - 1
+    
+    bits = _PHASH_PLANES @ features > 0
+    return bytes(np.packbits(bits)).hex()
+
+def hash_font_file(path):
+    """计算字体文件的内容哈希、名称标识和各字体的感知哈希（在进程池中运行）"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    
+    faces = []
+    for face in read_font_faces(path):
+        record = {
+            "index": face["index"],
+            "family": face["family"],
+            "families": face["families"],
+            "style": face["style"],
+            "identity": font_identity(face["family"], face["style"]),
+            "phash": None
+        }
+        if PIL_AVAILABLE and NUMPY_AVAILABLE:
+            try:
+                record["phash"] = perceptual_hash(ImageFont.truetype(path, 48, index=face["index"]))
+            except Exception:
+                pass
+        faces.append(record)
+    return {"sha1": digest.hexdigest(), "faces": faces}
+
+class FontDuplicateDetector:
+    """重复和近似重复字体检测
+    
+    结合文件内容哈希、规范化的name表标识和渲染字形的感知哈希进行分组，
+    每个文件的结果按修改时间和大小缓存。
+    """
+    PHASH_THRESHOLD = 7
+    PHASH_BANDS = 8
+    
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_path = os.path.join(cache_dir, "duplicates.json")
+        self.records = {}
+    
+    def load(self):
+        """加载缓存的哈希结果"""
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                self.records = json.load(f)
+        except (OSError, ValueError):
+            self.records = {}
+    
+    def save(self):
+        """保存哈希结果到缓存"""
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        with open(self.cache_path, "w", encoding="utf-8") as f:
+            json.dump(self.records, f, ensure_ascii=False)
+    
+    def scan(self, paths, progress=None):
+        """计算所有文件的哈希，未变化的文件直接使用缓存"""
+        records = {}
+        pending = {}
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            cached = self.records.get(path)
+            if cached and cached["mtime"] == stat.st_mtime and cached["size"] == stat.st_size:
+                records[path] = cached
+            else:
+                pending[path] = (stat.st_mtime, stat.st_size)
+        
+        if pending:
+            with create_process_pool() as executor:
+                futures = {executor.submit(hash_font_file, path): path for path in pending}
+                for done, future in enumerate(as_completed(futures), 1):
+                    path = futures[future]
+                    try:
+                        record = future.result()
+                    except Exception:
+                        record = {"sha1": None, "faces": []}
+                    record["mtime"], record["size"] = pending[path]
+                    records[path] = record
+                    if progress:
+                        progress(done, len(futures))
+        
+        changed = bool(pending) or len(records) != len(self.records)
+        self.records = records
+        if changed:
+            self.save()
+    
+    def find_groups(self):
+        """返回重复字体分组 [{"reasons": [...], "faces": [...]}, ...]"""
+        faces = []
+        for path, record in self.records.items():
+            for face in record["faces"]:
+                faces.append(dict(face, path=path, sha1=record["sha1"]))
+        
+        parent = list(range(len(faces)))
+        
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        
+        edges = []
+        buckets = {}
+        for i, face in enumerate(faces):
+            if face["sha1"]:
+                buckets.setdefault(("内容相同", face["sha1"], face["index"]), []).append(i)
+            # 标识按当前规则重新计算，不使用缓存中按旧规则得到的结果
+            buckets.setdefault(("名称相同", font_identity(face["family"], face["style"])), []).append(i)
+        for key, members in buckets.items():
+            for i in members[1:]:
+                edges.append((members[0], i, key[0]))
+        
+        # 感知哈希按段分桶：汉明距离不超过阈值时至少有一段完全相同
+        band_bits = 256 // self.PHASH_BANDS
+        band_mask = (1 << band_bits) - 1
+        hashes = {i: int(face["phash"], 16) for i, face in enumerate(faces) if face["phash"]}
+        styles = {i: font_identity("", faces[i]["style"]) for i in hashes}
+        band_buckets = {}
+        for i, value in hashes.items():
+            for band in range(self.PHASH_BANDS):
+                band_buckets.setdefault((band, (value >> (band * band_bits)) & band_mask), []).append(i)
+        compared = set()
+        for members in band_buckets.values():
+            for a in range(len(members)):
+                for b in range(a + 1, len(members)):
+                    i, j = members[a], members[b]
+                    if (i, j) in compared or styles[i] != styles[j]:
+                        continue
+                    compared.add((i, j))
+                    if bin(hashes[i] ^ hashes[j]).count("1") <= self.PHASH_THRESHOLD:
+                        edges.append((i, j, "外观相近"))
+        
+        for i, j, reason in edges:
+            parent[find(i)] = find(j)
+        
+        groups = {}
+        for i, j, reason in edges:
+            group = groups.setdefault(find(i), {"reasons": set(), "members": set()})
+            group["reasons"].add(reason)
+            group["members"].update((i, j))
+        
+        result = []
+        for group in groups.values():
+            members = sorted(group["members"], key=lambda i: (faces[i]["family"], faces[i]["path"]))
+            result.append({
+                "reasons": sorted(group["reasons"]),
+                "faces": [{key: faces[i][key] for key in ("path", "index", "family", "families", "style")}
+                          for i in members]
+            })
+        result.sort(key=lambda g: g["faces"][0]["family"].lower())
+        return result
+    
+    def family_status(self, groups):
+        """返回 {小写家族名: "kept" 或 "duplicate"}，每组保留名称最短的家族"""
+        status = {}
+        for group in groups:
+            kept = min((face["family"].lower() for face in group["faces"]), key=lambda f: (len(f), f))
+            for face in group["faces"]:
+                family = face["family"].lower()
+                if family == kept:
+                    status[family] = "kept"
+                else:
+                    status.setdefault(family, "duplicate")
+        return status
+    
+    def redundant_families(self, groups):
+        """返回可隐藏的重复家族名（小写），每组保留名称最短的家族"""
+        family_faces = {}
+        aliases = {}
+        for record in self.records.values():
+            for face in record["faces"]:
+                family = face["family"].lower()
+                family_faces[family] = family_faces.get(family, 0) + 1
+                aliases.setdefault(family, set()).update(name.lower() for name in face["families"])
+        
+        duplicate_faces = {}
+        for group in groups:
+            kept = min((face["family"].lower() for face in group["faces"]), key=lambda f: (len(f), f))
+            for face in group["faces"]:
+                family = face["family"].lower()
+                if family != kept:
+                    duplicate_faces[family] = duplicate_faces.get(family, 0) + 1
+        
+        hidden = set()
+        for family, count in duplicate_faces.items():
+            if count >= family_faces.get(family, 0):
+                hidden.update(aliases.get(family, {family}))
+        return hidden
+
+# 健康检查时渲染的示例字符（取字体包含的前几个）
+HEALTH_SAMPLE_TEXT = "AaBbGgQq0123永字体あア한"
+HEALTH_SLOW_RENDER_MS = 500
+
+def sfnt_checksum(buffer, offset, length):
+    """计算sfnt表校验和（按大端32位整数求和）"""
+    padded = bytes(buffer[offset:offset + length]) + b"\0" * (-length % 4)
+    words = array.array("I", padded) if array.array("I").itemsize == 4 else array.array("L", padded)
+    if sys.byteorder == "little":
+        words.byteswap()
+    return sum(words) & 0xFFFFFFFF
+
+def check_sfnt_checksums(data, offset):
+    """返回校验和不匹配或超出文件范围的表 (不匹配列表, 越界列表)"""
+    num_tables = struct.unpack_from(">H", data, offset + 4)[0]
+    mismatched, out_of_range = [], []
+    for i in range(num_tables):
+        tag, checksum, table_offset, length = struct.unpack_from(">4sLLL", data, offset + 12 + i * 16)
+        tag = tag.decode("latin-1")
+        if table_offset + length > len(data):
+            out_of_range.append(tag)
+            continue
+        actual = sfnt_checksum(data, table_offset, length)
+        if tag == "head" and length >= 12:
+            # head表的校验和计算时 checkSumAdjustment 视为0
+            actual = (actual - struct.unpack_from(">L", data, table_offset + 8)[0]) & 0xFFFFFFFF
+        if actual != checksum:
+            mismatched.append(tag)
+    return mismatched, out_of_range
+
+def check_glyph_tables(sfnt, index, num_glyphs):
+    """检查loca/glyf/hmtx结构，返回问题列表"""
+    issues = []
+    head, hhea, hmtx = sfnt.table(index, "head"), sfnt.table(index, "hhea"), sfnt.table(index, "hmtx")
+    if hhea and hhea[2] >= 36:
+        num_metrics, = struct.unpack_from(">H", hhea[0], hhea[1] + 34)
+        if num_metrics == 0 or num_metrics > num_glyphs:
+            issues.append(f"hhea的度量数量无效: {num_metrics}")
+        elif hmtx is None or hmtx[2] < num_metrics * 4 + (num_glyphs - num_metrics) * 2:
+            issues.append("hmtx表长度不足")
+    
+    loca, glyf = sfnt.table(index, "loca"), sfnt.table(index, "glyf")
+    if loca is None or glyf is None or head is None or sfnt.data[:4] == b"wOF2":
+        return issues
+    long_offsets = struct.unpack_from(">h", head[0], head[1] + 50)[0] == 1
+    entry_size = 4 if long_offsets else 2
+    if loca[2] < (num_glyphs + 1) * entry_size:
+        issues.append(f"loca表长度不足（{num_glyphs} 个字形需要 {(num_glyphs + 1) * entry_size} 字节）")
+        return issues
+    offsets = struct.unpack_from(f">{num_glyphs + 1}{'L' if long_offsets else 'H'}", loca[0], loca[1])
+    if not long_offsets:
+        offsets = [o * 2 for o in offsets]
+    if any(b < a for a, b in zip(offsets, offsets[1:])) or offsets[-1] > glyf[2]:
+        issues.append("loca偏移无序或超出glyf表")
+        return issues
+    
+    buffer, base = glyf[0], glyf[1]
+    bad = 0
+    for start, end in zip(offsets, offsets[1:]):
+        if start == end:
+            continue
+        if end - start < 10:
+            bad += 1
+            continue
+        contours, x_min, y_min, x_max, y_max = struct.unpack_from(">hhhhh", buffer, base + start)
+        if contours < -1 or x_min > x_max or y_min > y_max:
+            bad += 1
+    if bad:
+        issues.append(f"{bad} 个字形数据无效")
+    return issues
+
+def check_font_file(path):
+    """检查单个字体文件，返回 {"status", "issues", "faces", "render_ms"}
+    
+    status: ok、warning（校验和不符、缺少cmap、渲染缓慢）或 error（结构损坏，应隔离）。
+    在健康检查的工作进程中运行，异常和崩溃由调用方处理。
+    """
+    errors, warnings = [], []
+    render_ms = 0.0
+    with SfntFile(path) as sfnt:
+        if not sfnt.faces:
+            return {"status": "error", "issues": ["不是可识别的字体文件"], "faces": 0, "render_ms": 0.0}
+        if sfnt.data[:4] not in (b"wOFF", b"wOF2"):
+            for offset in sfnt_face_offsets(sfnt.data):
+                mismatched, out_of_range = check_sfnt_checksums(sfnt.data, offset)
+                if out_of_range:
+                    errors.append(f"表超出文件范围: {', '.join(out_of_range)}")
+                if mismatched:
+                    warnings.append(f"表校验和不符: {', '.join(mismatched)}")
+            if errors:
+                return {"status": "error", "issues": errors + warnings, "faces": len(sfnt.faces), "render_ms": 0.0}
+        
+        for index in range(len(sfnt.faces)):
+            label = f"#{index} " if len(sfnt.faces) > 1 else ""
+            maxp = sfnt.table(index, "maxp")
+            if maxp is None or maxp[2] < 6:
+                errors.append(f"{label}缺少maxp表")
+                continue
+            num_glyphs, = struct.unpack_from(">H", maxp[0], maxp[1] + 4)
+            if num_glyphs == 0:
+                errors.append(f"{label}字形数量为0")
+                continue
+            errors += [label + issue for issue in check_glyph_tables(sfnt, index, num_glyphs)]
+            
+            cmap = sfnt.table(index, "cmap")
+            ranges = []
+            if cmap is None:
+                warnings.append(f"{label}缺少cmap表")
+            else:
+                try:
+                    ranges = parse_cmap_ranges(*cmap)
+                except (struct.error, IndexError) as e:
+                    errors.append(f"{label}cmap表损坏: {e}")
+            
+            if PIL_AVAILABLE and not errors:
+                sample = "".join(c for c in HEALTH_SAMPLE_TEXT
+                                 if any(first <= ord(c) <= last for first, last in ranges))
+                if not sample and ranges:
+                    sample = "".join(chr(cp) for cp in range(ranges[0][0], min(ranges[0][1], ranges[0][0] + 7) + 1))
+                started = time.perf_counter()
+                try:
+                    img_font = ImageFont.truetype(path, 48, index=index)
+                    image = Image.new("L", (48 * max(len(sample), 1) + 96, 96))
+                    ImageDraw.Draw(image).text((8, 8), sample or "A", font=img_font, fill=255)
+                except OSError as e:
+                    errors.append(f"{label}无法渲染: {e}")
+                render_ms = max(render_ms, (time.perf_counter() - started) * 1000)
+    
+    if render_ms > HEALTH_SLOW_RENDER_MS:
+        warnings.append(f"渲染缓慢: {render_ms:.0f} ms")
+    status = "error" if errors else "warning" if warnings else "ok"
+    return {"status": status, "issues": errors + warnings, "faces": len(sfnt.faces), "render_ms": round(render_ms, 2)}
+
+def font_health_worker(connection):
+    """健康检查工作进程：逐个接收文件路径并返回检查结果，收到None时退出"""
+    while True:
+        path = connection.recv()
+        if path is None:
+            break
+        try:
+            result = check_font_file(path)
+        except Exception as e:
+            result = {"status": "error", "issues": [f"检查失败: {type(e).__name__}: {e}"], "faces": 0, "render_ms": 0.0}
+        connection.send(result)
+
+class FontHealthChecker:
+    """并行的字体文件健康检查
+    
+    每个文件在独立的工作进程中检查：超时的进程被终止，崩溃的进程被替换，
+    对应文件记为 timeout / crash。结果按修改时间和大小缓存，
+    error、timeout、crash 的文件被隔离，字体映射和渲染不再使用它们。
+    """
+    CACHE_VERSION = 1
+    TIMEOUT = 20.0
+    QUARANTINE_STATUSES = ("error", "timeout", "crash")
+    
+    def __init__(self, cache_dir=CACHE_DIR, workers=None, timeout=None):
+        self.cache_path = os.path.join(cache_dir, "health.json")
+        self.workers = workers or os.cpu_count() or 2
+        self.timeout = timeout or self.TIMEOUT
+        self.records = {}
+    
+    def load(self):
+        """加载缓存的检查结果"""
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            self.records = cached["files"] if cached.get("version") == self.CACHE_VERSION else {}
+        except (OSError, ValueError, KeyError):
+            self.records = {}
+    
+    def save(self):
+        """保存检查结果到缓存"""
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        with open(self.cache_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.CACHE_VERSION, "files": self.records}, f, ensure_ascii=False)
+    
+    def quarantined(self):
+        """返回被隔离的文件路径集合"""
+        return {path for path, record in self.records.items() if record["status"] in self.QUARANTINE_STATUSES}
+    
+    def summary(self):
+        counts = {}
+        for record in self.records.values():
+            counts[record["status"]] = counts.get(record["status"], 0) + 1
+        return counts
+    
+    def _start_worker(self, context):
+        connection, child_connection = context.Pipe()
+        process = context.Process(target=font_health_worker, args=(child_connection,), daemon=True)
+        process.start()
+        child_connection.close()
+        return {"process": process, "connection": connection, "path": None, "deadline": None}
+    
+    @staticmethod
+    def _stop_worker(worker, kill=False):
+        if kill:
+            worker["process"].kill()
+        else:
+            try:
+                worker["connection"].send(None)
+            except OSError:
+                pass
+        worker["process"].join(1.0)
+        if worker["process"].is_alive():
+            worker["process"].kill()
+            worker["process"].join()
+        worker["connection"].close()
+    
+    def scan(self, paths, progress=None):
+        """检查所有文件，未变化的文件直接使用缓存"""
+        records = {}
+        pending = deque()
+        stats = {}
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            cached = self.records.get(path)
+            if cached and cached["mtime"] == stat.st_mtime and cached["size"] == stat.st_size:
+                records[path] = cached
+            else:
+                pending.append(path)
+                stats[path] = (stat.st_mtime, stat.st_size)
+        
+        total = len(pending)
+        context = multiprocessing.get_context("spawn")
+        workers = [self._start_worker(context) for _ in range(min(self.workers, total))]
+        done = 0
+        
+        def finish(worker, result):
+            nonlocal done
+            path = worker["path"]
+            result["mtime"], result["size"] = stats[path]
+            records[path] = result
+            worker["path"] = worker["deadline"] = None
+            done += 1
+            if progress:
+                progress(done, total)
+        
+        try:
+            while True:
+                for worker in workers:
+                    if worker["path"] is None and pending:
+                        worker["path"] = pending.popleft()
+                        worker["deadline"] = time.monotonic() + self.timeout
+                        worker["connection"].send(worker["path"])
+                busy = [worker for worker in workers if worker["path"] is not None]
+                if not busy:
+                    break
+                
+                timeout = max(0.0, min(worker["deadline"] for worker in busy) - time.monotonic())
+                ready = multiprocessing.connection.wait([worker["connection"] for worker in busy], timeout)
+                for index, worker in enumerate(workers):
+                    if worker["path"] is None:
+                        continue
+                    if worker["connection"] in ready:
+                        try:
+                            finish(worker, worker["connection"].recv())
+                            continue
+                        except (EOFError, OSError):
+                            worker["process"].join(1.0)
+                            result = {"status": "crash", "issues": [f"检查进程崩溃（退出码 {worker['process'].exitcode}）"]}
+                    elif time.monotonic() >= worker["deadline"]:
+                        result = {"status": "timeout", "issues": [f"检查超过 {self.timeout:.0f} 秒"]}
+                    else:
+                        continue
+                    # 崩溃或超时的进程不能再用，换一个新的
+                    path = worker["path"]
+                    self._stop_worker(worker, kill=True)
+                    workers[index] = self._start_worker(context) if pending else {"path": None, "process": None}
+                    result.update(faces=0, render_ms=0.0)
+                    finish({"path": path}, result)
+        finally:
+            for worker in workers:
+                if worker["process"] is not None:
+                    self._stop_worker(worker, kill=worker["path"] is not None)
+        
+        # 其他目录的检查结果（如只检查了某个文件夹时）保留到文件被删除为止
+        scanned = set(paths)
+        for path, record in self.records.items():
+            if path not in scanned and os.path.exists(path):
+                records[path] = record
+        changed = bool(total) or len(records) != len(self.records)
+        self.records = records
+        if changed:
+            self.save()
+
+class InotifyWatch:
+    """基于ctypes的最小inotify封装，只报告发生变化的目录"""
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_ISDIR = 0x40000000
+    MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    
+    def __init__(self, libc, fd):
+        self.libc = libc
+        self.fd = fd
+        self.watches = {}
+    
+    @classmethod
+    def create(cls, directories):
+        """创建inotify监视，平台不支持时返回None"""
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        watch = cls(libc, fd)
+        for directory in directories:
+            watch.add_tree(directory)
+        return watch
+    
+    def add_tree(self, directory):
+        """监视目录及其所有子目录"""
+        for dirpath, dirnames, filenames in os.walk(directory):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), self.MASK)
+            if wd >= 0:
+                self.watches[wd] = dirpath
+    
+    def wait(self, timeout):
+        """等待事件，返回发生变化的目录集合"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        
+        directories = set()
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset + 16 <= len(data):
+                wd, mask, cookie, length = struct.unpack_from("iIII", data, offset)
+                name = data[offset + 16:offset + 16 + length].rstrip(b"\0")
+                offset += 16 + length
+                directory = self.watches.get(wd)
+                if directory is None:
+                    continue
+                if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    self.add_tree(os.path.join(directory, os.fsdecode(name)))
+                directories.add(directory)
+        return directories
+    
+    def close(self):
+        os.close(self.fd)
+
+class FontDirectoryWatcher:
+    """监视字体目录的文件变化（Linux下使用inotify，其他平台定时轮询）
+    
+    on_change 在监视线程中以 (新增, 删除, 修改) 三个路径列表调用。
+    """
+    POLL_INTERVAL = 5.0
+    DEBOUNCE = 0.5
+    
+    def __init__(self, directories, on_change):
+        self.directories = directories
+        self.on_change = on_change
+        self.snapshot = {}
+        self.ready = False
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+    
+    def start(self):
+        """启动监视线程"""
+        threading.Thread(target=self._run, daemon=True).start()
+    
+    def stop(self):
+        self.stop_event.set()
+    
+    @staticmethod
+    def _scan(directories):
+        snapshot = {}
+        for path in iter_font_files(directories):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_mtime, stat.st_size)
+        return snapshot
+    
+    def check(self, directories=None):
+        """对比文件快照，返回 (新增, 删除, 修改)"""
+        directories = directories or self.directories
+        prefixes = tuple(os.path.join(d, "") for d in directories)
+        current = self._scan(directories)
+        with self.lock:
+            if not self.ready:
+                return [], [], []
+            previous = {p: v for p, v in self.snapshot.items() if p.startswith(prefixes)}
+            added = [p for p in current if p not in previous]
+            removed = [p for p in previous if p not in current]
+            changed = [p for p in current if p in previous and current[p] != previous[p]]
+            for path in removed:
+                del self.snapshot[path]
+            self.snapshot.update(current)
+        return added, removed, changed
+    
+    def _run(self):
+        inotify = InotifyWatch.create(self.directories)
+        snapshot = self._scan(self.directories)
+        with self.lock:
+            self.snapshot = snapshot
+            self.ready = True
+        
+        try:
+            while not self.stop_event.is_set():
+                if inotify:
+                    directories = inotify.wait(1.0)
+                    if not directories:
+                        continue
+                    # 合并短时间内的连续事件（例如安装一批字体）
+                    time.sleep(self.DEBOUNCE)
+                    directories |= inotify.wait(0)
+                    changes = self.check(sorted(directories))
+                else:
+                    if self.stop_event.wait(self.POLL_INTERVAL):
+                        break
+                    changes = self.check()
+                if any(changes):
+                    self.on_change(*changes)
+        finally:
+            if inotify:
+                inotify.close()
+
+def render_thumbnails(items, height, max_width):
+    """渲染一批字体名称缩略图（在进程池中运行），返回 [(标识, 宽, 高, 灰度像素), ...]"""
+    results = []
+    for identity, path, index, text in items:
+        try:
+            img_font = ImageFont.truetype(path, size=max(8, int(height * 0.7)), index=index)
+            left, top, right, bottom = img_font.getbbox(text)
+        except Exception:
+            continue
+        width = max(1, min(max_width, right - min(left, 0) + 4))
+        image = Image.new("L", (width, height), 255)
+        ImageDraw.Draw(image).text((2 - min(left, 0), (height - (bottom - top)) // 2 - top),
+                                   text, font=img_font, fill=0)
+        results.append((identity, width, height, image.tobytes()))
+    return results
+
+class FontThumbnailAtlas:
+    """字体名称缩略图图集
+    
+    每个家族的名称用其自身字体渲染一次，灰度像素依次追加到图集文件中，
+    索引记录每张缩略图的偏移和尺寸，键为字体文件标识（路径、索引、修改时间、大小）和文本。
+    图集文件用mmap映射，取图时只切出对应的字节并加上PGM头，
+    Tk 的 PhotoImage 可直接显示，不需要PIL，也不需要创建Tk字体。
+    """
+    VERSION = 1
+    HEIGHT = 28
+    MAX_WIDTH = 320
+    CHUNK_SIZE = 64
+    
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.atlas_path = os.path.join(cache_dir, "thumbnails.atlas")
+        self.index_path = os.path.join(cache_dir, "thumbnails.json")
+        self.entries = {}
+        self.families = {}
+        self.data = None
+        self.lock = threading.Lock()
+        # 更新会追加图集文件并可能压缩它，同一时间只能有一个更新在运行
+        self.update_lock = threading.Lock()
+    
+    def load(self):
+        """加载索引并映射图集文件"""
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("version") != self.VERSION or index.get("height") != self.HEIGHT:
+                return
+            entries, families = index["entries"], index["families"]
+        except (OSError, ValueError, KeyError):
+            return
+        with self.lock:
+            self.entries, self.families = entries, families
+            self._remap()
+    
+    def _remap(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        try:
+            with open(self.atlas_path, "rb") as f:
+                if os.fstat(f.fileno()).st_size:
+                    self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError:
+            self.entries, self.families = {}, {}
+    
+    def get(self, family):
+        """返回家族缩略图的PGM数据，没有缩略图时返回None"""
+        with self.lock:
+            entry = self.entries.get(self.families.get(family))
+            if entry is None or self.data is None:
+                return None
+            offset, width, height = entry
+            if offset + width * height > len(self.data):
+                return None
+            return b"P5 %d %d 255\n" % (width, height) + self.data[offset:offset + width * height]
+    
+    def update(self, resolver, families, progress=None):
+        """增量更新：只渲染新增或文件有变化的字体，必要时压缩图集文件（重叠的调用依次执行）"""
+        if not PIL_AVAILABLE:
+            return
+        with self.update_lock:
+            self._update(resolver, families, progress)
+    
+    def _update(self, resolver, families, progress):
+        stats = {}
+        targets = {}
+        for family in families:
+            resolved = resolver.resolve(family)
+            if not resolved:
+                continue
+            path, index = resolved
+            if path not in stats:
+                try:
+                    stats[path] = os.stat(path)
+                except OSError:
+                    stats[path] = None
+            if stats[path] is None:
+                continue
+            targets[family] = (f"{path}|{index}|{stats[path].st_mtime_ns}|{stats[path].st_size}|{family}",
+                               path, index)
+        
+        pending = [(identity, path, index, family) for family, (identity, path, index) in targets.items()
+                   if identity not in self.entries]
+        live = {identity for identity, path, index in targets.values()}
+        live_bytes = sum(w * h for identity, (offset, w, h) in self.entries.items() if identity in live)
+        dead_bytes = sum(w * h for identity, (offset, w, h) in self.entries.items() if identity not in live)
+        if not pending and not dead_bytes and len(self.families) == len(targets):
+            return
+        
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = dict(self.entries)
+        if dead_bytes > live_bytes:
+            # 无效的缩略图过多时重写图集，只保留仍在使用的部分
+            entries = self._compact(live)
+        
+        with open(self.atlas_path, "ab") as f:
+            offset = f.tell()
+            chunks = [pending[i:i + self.CHUNK_SIZE] for i in range(0, len(pending), self.CHUNK_SIZE)]
+            if chunks:
+                with create_process_pool() as executor:
+                    futures = [executor.submit(render_thumbnails, chunk, self.HEIGHT, self.MAX_WIDTH)
+                               for chunk in chunks]
+                    for done, future in enumerate(as_completed(futures), 1):
+                        try:
+                            results = future.result()
+                        except Exception:
+                            results = []
+                        for identity, width, height, pixels in results:
+                            f.write(pixels)
+                            entries[identity] = [offset, width, height]
+                            offset += len(pixels)
+                        if progress:
+                            progress(done, len(futures))
+        
+        with self.lock:
+            self.entries = {identity: entry for identity, entry in entries.items() if identity in live}
+            self.families = {family: identity for family, (identity, path, index) in targets.items()
+                             if identity in self.entries}
+            self._remap()
+            index = {"version": self.VERSION, "height": self.HEIGHT,
+                     "entries": self.entries, "families": self.families}
+        # 先写临时文件再替换，避免中途退出留下不完整的索引
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(temp_path, self.index_path)
+    
+    def _compact(self, live):
+        """把仍在使用的缩略图复制到新图集文件，返回新的索引"""
+        entries = {}
+        temp_path = self.atlas_path + ".tmp"
+        with self.lock, open(temp_path, "wb") as f:
+            for identity, (offset, width, height) in self.entries.items():
+                if identity in live and self.data is not None:
+                    entries[identity] = [f.tell(), width, height]
+                    f.write(self.data[offset:offset + width * height])
+            if self.data is not None:
+                self.data.close()
+                self.data = None
+            os.replace(temp_path, self.atlas_path)
+            self.entries = entries
+            self.families = {}
+        return dict(entries)
+
+TRACES_DIR = "traces"
+
+class InteractionRecorder:
+    """记录界面交互（动作名、参数和相对时间），保存为可回放的JSON轨迹"""
+    VERSION = 1
+    
+    def __init__(self):
+        self.events = []
+        self.started_at = time.perf_counter()
+    
+    def record(self, action, *args):
+        self.events.append({"t": round(time.perf_counter() - self.started_at, 4),
+                            "action": action, "args": list(args)})
+    
+    def save(self, path, font_count=0):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "recorded_at": datetime.now().isoformat(timespec="seconds"),
+                       "font_count": font_count, "events": self.events}, f, ensure_ascii=False, indent=1)
+
+def load_interaction_trace(path):
+    """加载交互轨迹，返回事件列表"""
+    with open(path, "r", encoding="utf-8") as f:
+        trace = json.load(f)
+    if trace.get("version") != InteractionRecorder.VERSION:
+        raise ValueError(f"不支持的轨迹版本: {trace.get('version')}")
+    return trace["events"]
+
+def latency_percentiles(samples):
+    """计算延迟分位数（毫秒，最近秩法）"""
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0}
+    
+    def rank(p):
+        return round(ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] * 1000, 2)
+    
+    return {"count": len(ordered), "p50": rank(50), "p95": rank(95), "p99": rank(99),
+            "max": round(ordered[-1] * 1000, 2)}
+
+def latency_report(latencies):
+    """按动作汇总回放延迟，latencies 为 [(动作, 秒), ...]"""
+    actions = {}
+    for action, latency in latencies:
+        actions.setdefault(action, []).append(latency)
+    return {"overall": latency_percentiles([latency for action, latency in latencies]),
+            "actions": {action: latency_percentiles(samples) for action, samples in sorted(actions.items())}}
+
+def compare_latency_reports(report, baseline, tolerance=1.25):
+    """与基准报告比较 p95，返回超出容差的动作说明列表"""
+    regressions = []
+    pairs = [("overall", report["overall"], baseline.get("overall", {}))]
+    pairs += [(action, stats, baseline.get("actions", {}).get(action, {}))
+              for action, stats in report["actions"].items()]
+    for name, stats, base in pairs:
+        if "p95" in stats and base.get("p95") and stats["p95"] > base["p95"] * tolerance:
+            regressions.append(f"{name}: p95 {stats['p95']} ms > 基准 {base['p95']} ms x {tolerance}")
+    return regressions
+
+USAGE_HISTORY_FILE = os.path.join(CACHE_DIR, "usage_history.json")
+
+class UsageHistory:
+    """持久化的字体使用记录：选择频率（按半衰期衰减）、最近使用时间、
+    选择先后关系和对比会话中的共现次数，predict() 据此估计接下来最可能打开的字体"""
+    VERSION = 1
+    HALF_LIFE = 14 * 24 * 3600
+    RECENT_WINDOW = 3600
+    MAX_FONTS = 500
+    MAX_LINKS = 32
+    
+    def __init__(self, path=USAGE_HISTORY_FILE):
+        self.path = path
+        self.fonts = {}
+        self.follows = {}
+        self.compared = {}
+        self.last_selected = None
+        self.dirty = False
+    
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != self.VERSION:
+            return
+        self.fonts = {name: list(entry) for name, entry in data["fonts"].items()}
+        self.follows = data.get("follows", {})
+        self.compared = data.get("compared", {})
+        self.last_selected = data.get("last_selected")
+    
+    def save(self):
+        """只保留得分最高的字体，写临时文件后替换，避免中途退出损坏记录"""
+        if not self.dirty:
+            return
+        now = time.time()
+        kept = sorted(self.fonts, key=lambda name: self.frequency(name, now), reverse=True)[:self.MAX_FONTS]
+        self.fonts = {name: self.fonts[name] for name in kept}
+        for links in (self.follows, self.compared):
+            for name in list(links):
+                targets = links[name]
+                if name in self.fonts:
+                    for target in [target for target in targets if target not in self.fonts]:
+                        del targets[target]
+                if name not in self.fonts or not targets:
+                    del links[name]
+        data = {"version": self.VERSION, "fonts": self.fonts, "follows": self.follows,
+                "compared": self.compared, "last_selected": self.last_selected}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+        self.dirty = False
+    
+    def frequency(self, name, now):
+        """衰减后的选择频率"""
+        entry = self.fonts.get(name)
+        if entry is None:
+            return 0.0
+        return entry[0] * 0.5 ** ((now - entry[1]) / self.HALF_LIFE)
+    
+    def _link(self, links, a, b, weight=1.0):
+        targets = links.setdefault(a, {})
+        targets[b] = targets.get(b, 0) + weight
+        if len(targets) > self.MAX_LINKS:
+            del targets[min(targets, key=targets.get)]
+    
+    def record_selection(self, name, now=None):
+        now = now or time.time()
+        entry = self.fonts.get(name)
+        count = entry[2] if entry else 0
+        self.fonts[name] = [round(self.frequency(name, now) + 1, 4), now, count + 1]
+        if self.last_selected and self.last_selected != name:
+            self._link(self.follows, self.last_selected, name)
+        self.last_selected = name
+        self.dirty = True
+    
+    def record_compare(self, names):
+        """记录一次对比会话中同时出现的字体"""
+        for a in names:
+            for b in names:
+                if a != b:
+                    self._link(self.compared, a, b)
+        self.dirty = True
+    
+    def recent(self, limit):
+        return sorted(self.fonts, key=lambda name: self.fonts[name][1], reverse=True)[:limit]
+    
+    def predict(self, current, neighbours=(), limit=8, now=None):
+        """按可能性从高到低返回接下来可能打开的字体
+        
+        得分 = 频率（相对最大值） + 最近一小时内使用的加成
+             + 从当前字体切换过去的比例 × 2 + 与当前字体一起对比的比例 × 1.5
+             + 列表中相邻字体的加成（越近越高）
+        """
+        now = now or time.time()
+        scores = {}
+        frequencies = {name: self.frequency(name, now) for name in self.fonts}
+        top = max(frequencies.values(), default=0) or 1
+        for name, value in frequencies.items():
+            recency = 0.5 ** ((now - self.fonts[name][1]) / self.RECENT_WINDOW)
+            scores[name] = value / top + 0.5 * recency
+        for links, weight in ((self.follows, 2.0), (self.compared, 1.5)):
+            targets = links.get(current, {})
+            total = sum(targets.values())
+            for name, count in targets.items():
+                scores[name] = scores.get(name, 0) + weight * count / total
+        for distance, name in enumerate(neighbours):
+            scores[name] = scores.get(name, 0) + 0.3 / (1 + distance // 2)
+        scores.pop(current, None)
+        return heapq.nlargest(limit, scores, key=scores.get)
+    
+    def clear(self):
+        self.fonts.clear()
+        self.follows.clear()
+        self.compared.clear()
+        self.last_selected = None
+        self.dirty = True
+
+class NotificationBus:
+    """线程安全的状态与通知总线
+    
+    任意线程都可以发布状态、进度和提示，界面线程每帧取一次快照：
+    同一帧内的多条状态只显示最后一条，进度按任务合并。
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.message = None
+        self.message_timeout = 0
+        self.tasks = OrderedDict()
+        self.toasts = deque()
+        self.dirty = False
+    
+    def status(self, message, timeout=3.0):
+        """发布状态栏消息，timeout 秒后恢复为“就绪”（None 表示一直显示）"""
+        with self.lock:
+            self.message = message
+            self.message_timeout = timeout
+            self.dirty = True
+    
+    def progress(self, task_id, text, done, total):
+        """发布某个任务的确定进度"""
+        with self.lock:
+            self.tasks[task_id] = (text, done, total)
+            self.dirty = True
+    
+    def finish(self, task_id):
+        """结束任务的进度显示"""
+        with self.lock:
+            if self.tasks.pop(task_id, None) is not None:
+                self.dirty = True
+    
+    def toast(self, message):
+        """发布非阻塞的提示"""
+        with self.lock:
+            self.toasts.append(message)
+            self.dirty = True
+    
+    def drain(self):
+        """取出自上次以来的变化，没有变化时返回None
+        
+        返回 (状态消息, 超时, 进度任务列表, 新提示列表)，状态消息为None表示未变化。
+        """
+        with self.lock:
+            if not self.dirty:
+                return None
+            result = (self.message, self.message_timeout, list(self.tasks.values()), list(self.toasts))
+            self.message = None
+            self.toasts.clear()
+            self.dirty = False
+            return result
+
+class SessionStore:
+    """会话快照：界面状态和预热缓存保存为分段的二进制文件
+    
+    文件头为魔数、版本和段数，每段为4字节标签、长度和zlib压缩的内容，
+    读取时只解压需要的段，未知或损坏的段直接忽略。
+    """
+    MAGIC = b"FVSS"
+    VERSION = 1
+    
+    def __init__(self, path=os.path.join(CACHE_DIR, "session.bin")):
+        self.path = path
+    
+    def load(self):
+        """返回 {标签: 原始字节}，文件不存在或格式不符时返回空字典"""
+        sections = {}
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+            magic, version, count = struct.unpack_from("<4sHH", data, 0)
+            if magic != self.MAGIC or version != self.VERSION:
+                return {}
+            offset = 8
+            for _ in range(count):
+                tag, length = struct.unpack_from("<4sI", data, offset)
+                offset += 8
+                sections[tag.decode("ascii")] = data[offset:offset + length]
+                offset += length
+        except (OSError, struct.error, UnicodeDecodeError):
+            return sections
+        return sections
+    
+    def save(self, sections):
+        """写入 {标签: 原始字节}，先写临时文件再替换，避免留下半个快照"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        parts = [struct.pack("<4sHH", self.MAGIC, self.VERSION, len(sections))]
+        for tag, payload in sections.items():
+            packed = zlib.compress(payload, 1)
+            parts.append(struct.pack("<4sI", tag.encode("ascii"), len(packed)))
+            parts.append(packed)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(b"".join(parts))
+        os.replace(temp_path, self.path)
+    
+    @staticmethod
+    def decode_json(sections, tag):
+        """解压并解析JSON段，失败时返回None"""
+        try:
+            return json.loads(zlib.decompress(sections[tag]).decode("utf-8"))
+        except (KeyError, zlib.error, ValueError):
+            return None
+    
+    @staticmethod
+    def encode_json(value):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    
+    @staticmethod
+    def encode_frames(frames):
+        """把渲染好的帧 [(key, PIL图像), ...] 编码为二进制"""
+        parts = [struct.pack("<I", len(frames))]
+        for key, image in frames:
+            header = SessionStore.encode_json([list(key[:4]) + [list(key[4])], image.mode, image.size])
+            pixels = image.tobytes()
+            parts.append(struct.pack("<II", len(header), len(pixels)))
+            parts.append(header)
+            parts.append(pixels)
+        return b"".join(parts)
+    
+    @staticmethod
+    def decode_frames(payload):
+        """解码 encode_frames 的结果，返回 [(key, PIL图像), ...]"""
+        frames = []
+        if not PIL_AVAILABLE:
+            return frames
+        try:
+            data = zlib.decompress(payload)
+            count, = struct.unpack_from("<I", data, 0)
+            offset = 4
+            for _ in range(count):
+                header_length, pixel_length = struct.unpack_from("<II", data, offset)
+                offset += 8
+                key, mode, size = json.loads(data[offset:offset + header_length].decode("utf-8"))
+                offset += header_length
+                image = Image.frombytes(mode, tuple(size), data[offset:offset + pixel_length])
+                offset += pixel_length
+                frames.append((tuple(key[:4]) + (tuple(key[4]),), image))
+        except (zlib.error, struct.error, ValueError):
+            pass
+        return frames
 
 class FontViewer:
-    def __init__(self, root):
+    SESSION_SAVE_INTERVAL = 60000
+    REPLAY_MAX_GAP = 0.2
+    NOTIFY_INTERVAL = 16
+    TOAST_DURATION = 2500
+    PREFETCH_DELAY = 400
+    PREFETCH_COUNT = 8
+    PREFETCH_NEIGHBOURS = 2
+    
+    def __init__(self, root, cache_budget=None, snapshot_path=CATALOG_SNAPSHOT_FILE):
         self.root = root
         self.root.title("字体查看器 - Python Font Viewer")
         self.root.geometry("1000x800")
         
-        # 设置图标（如果有）
-        self.set_icon()
+        # 设置图标（如果有）
+        self.set_icon()
+        
+        # 状态与通知总线（任意线程发布，界面每帧刷新一次）
+        self.notifications = NotificationBus()
+        
+        # 统一的内存预算缓存管理（字体对象、预览、轮廓、覆盖数据等）
+        self.cache_budget = cache_budget
+        self.cache_manager = CacheManager(cache_budget)
+        self.status_reset_at = None
+        self.toast_windows = []
+        
+        # 收藏的字体
+        self.favorites = []
+        self.load_favorites()
+        
+        # 字体分类（除所有字体和收藏夹外由分类规则决定）
+        try:
+            self.category_rules = load_category_rules()
+        except (OSError, ValueError) as e:
+            messagebox.showerror("错误", f"加载分类规则时出错，已使用内置规则: {e}")
+            self.category_rules = CategoryRuleSet(DEFAULT_CATEGORY_RULES)
+        self.font_categories = {"所有字体": [], "收藏夹": []}
+        for name in self.category_rules.names:
+            self.font_categories[name] = []
+        
+        # 字体使用记录（频率、最近使用、对比共现），驱动空闲时的预取
+        self.usage_history = UsageHistory()
+        try:
+            self.usage_history.load()
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+        self.prefetch_job = None
+        self.prefetch_queue = deque()
+        
+        # 最近使用的字体
+        self.max_recent = 10
+        self.recent_fonts = self.usage_history.recent(self.max_recent)
+        
+        # 对比模式相关
+        self.compare_mode = False
+        self.compare_fonts_list = []
+        
+        # 字体文件映射和相似度索引
+        self.font_resolver = FontFileResolver()
+        self.similarity_index = None
+        
+        # 分发的目录快照（与本机字体一致时代替枚举、分类和解析）
+        self.snapshot_path = snapshot_path
+        self.catalog_snapshot = None
+        self.search_index = None
+        
+        # 导出图片的排版引擎
+        self.layout_engine = TextLayoutEngine(self.cache_manager)
+        
+        # 后台导出任务队列
+        self.export_queue = ExportJobQueue(max_workers=max(1, (os.cpu_count() or 2) // 2))
+        self.export_jobs_panel = None
+        
+        # 未安装的字体文件夹来源
+        self.folder_sources = {}
+        self.folder_preview = None
+        
+        # 重复字体检测
+        self.duplicate_detector = None
+        self.duplicate_groups = []
+        self.hidden_duplicates = set()
+        
+        # 字体健康检查（启动时只加载缓存的结果，有问题的文件被隔离）
+        self.health_checker = FontHealthChecker()
+        self.health_checker.load()
+        self.quarantined_families = set()
+        self.font_resolver.set_quarantine(self.health_checker.quarantined())
+        
+        # 字体名称缩略图图集
+        self.thumbnail_atlas = FontThumbnailAtlas()
+        self.thumbnail_atlas.load()
+        self.thumbnail_images = self.cache_manager.cache("thumbnail_images", priority=1.0)
+        
+        # 逐字符回退字体检查
+        self.fallback_resolver = FontFallbackResolver(self.font_resolver, cache_manager=self.cache_manager)
+        try:
+            self.fallback_resolver.load_chains()
+        except (OSError, ValueError, AttributeError):
+            pass
+        self.fallback_job = None
+        
+        # 示例文本的共享文档（对比窗口随编辑同步）
+        self.sample_document = SampleDocument()
+        
+        # OpenType特性预览的整形结果缓存
+        self.shaped_runs = ShapedRunCache(self.cache_manager)
         
-        # 收藏的字体
-        self.favorites = []
-        self.load_favorites()
+        # 矢量导出的字形轮廓缓存
+        self.outline_cache = GlyphOutlineCache(self.cache_manager) if FONTTOOLS_AVAILABLE else None
         
-        # 字体分类
-        self.font_categories = {
-            "所有字体": [],
-            "收藏夹": [],
-            "中文字体": [],
-            "英文字体": [],
-            "等宽字体": [],
-            "衬线字体": [],
-            "无衬线字体": []
-        }
+        # 交互录制与回放
+        self.recorder = None
+        self.replaying = False
         
-        # 最近使用的字体
-        self.recent_fonts = []
-        self.max_recent = 10
+        # 最近创建的Tk字体对象，切换回来时不必重新创建
+        self.tk_fonts = self.cache_manager.cache("tk_fonts", priority=2.0)
         
-        # 对比模式相关
-        self.compare_mode = False
-        self.compare_fonts_list = []
+        # 会话快照（退出时和定期保存，启动时恢复）
+        self.session_store = SessionStore()
+        self.session = self.session_store.load()
         
         # 设置示例文本
         self.sample_text = self.create_sample_text()
@@ -70,11 +3933,36 @@ class FontViewer:
         # 创建界面
         self.create_widgets()
         
+        # 恢复上次的会话状态
+        self.restore_session()
+        
         # 加载系统字体
         self.load_system_fonts()
+        self.restore_session_view()
+        
+        # 后台建立字体文件映射（可变字体轴等功能需要）
+        self.run_in_background(lambda progress: self.font_resolver.ensure_ready(),
+                               lambda result: self.on_font_resolver_ready())
         
         # 绑定键盘快捷键
         self.bind_shortcuts()
+        
+        # 检查完成的导出任务
+        self.root.after(200, self.poll_export_jobs)
+        
+        # 监视字体目录变化，增量更新字体列表
+        self.font_changes = queue.Queue()
+        self.font_watcher = FontDirectoryWatcher(self.font_resolver.directories,
+                                                 lambda *changes: self.font_changes.put(changes))
+        self.font_watcher.start()
+        self.root.after(500, self.process_font_changes)
+        
+        # 刷新状态栏和提示
+        self.root.after(self.NOTIFY_INTERVAL, self.pump_notifications)
+        
+        # 退出时保存会话，运行期间定期保存
+        self.root.protocol("WM_DELETE_WINDOW", self.quit_app)
+        self.root.after(self.SESSION_SAVE_INTERVAL, self.autosave_session)
     
     def set_icon(self):
         """设置窗口图标"""
@@ -197,7 +4085,7 @@ The five boxing wizards jump quickly.""",
                                             width=5, textvariable=self.font_size_var,
                                             command=self.update_font_display)
         self.font_size_spinbox.pack(side=tk.LEFT, padx=(10, 0))
-        self.font_size_var.trace('w', lambda *args: self.update_font_display())
+        self.font_size_var.trace('w', lambda *args: self.on_font_size_changed())
         
         # 字体样式选项
         style_frame = ttk.LabelFrame(main_frame, text="字体样式", padding="10")
@@ -215,9 +4103,16 @@ The five boxing wizards jump quickly.""",
             var = tk.BooleanVar(value=False)
             setattr(self, var_name, var)
             check = ttk.Checkbutton(style_frame, text=text, variable=var, 
-                                   command=self.update_font_display)
+                                   command=lambda name=var_name: self.on_style_changed(name))
             check.grid(row=row, column=col, padx=(0, 10))
         
+        # 可变字体的设计轴和命名实例（选中可变字体时显示）
+        self.variation_frame = ttk.Frame(style_frame)
+        self.variation_frame.grid(row=1, column=0, columnspan=4, sticky=(tk.W, tk.E), pady=(10, 0))
+        self.variation_frame.grid_remove()
+        self.variation_state = None
+        self.variation_renderer = None
+        
         # 字体信息显示
         info_frame = ttk.Frame(main_frame)
         info_frame.grid(row=4, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
@@ -255,10 +4150,16 @@ The five boxing wizards jump quickly.""",
         file_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="文件", menu=file_menu)
         file_menu.add_command(label="导出为图片", command=self.export_as_image)
+        file_menu.add_command(label="导出为SVG", command=self.export_as_svg)
+        file_menu.add_command(label="导出任务", command=self.show_export_jobs)
+        file_menu.add_separator()
+        file_menu.add_command(label="打开字体文件夹", command=self.open_font_folder)
         file_menu.add_separator()
         file_menu.add_command(label="导入自定义文本", command=self.import_sample_text)
+        file_menu.add_command(label="导出目录报告", command=self.export_catalog_report)
+        file_menu.add_command(label="导出目录快照", command=self.export_catalog_snapshot)
         file_menu.add_separator()
-        file_menu.add_command(label="退出", command=self.root.quit)
+        file_menu.add_command(label="退出", command=self.quit_app)
         
         # 编辑菜单
         edit_menu = tk.Menu(menubar, tearoff=0)
@@ -273,7 +4174,32 @@ The five boxing wizards jump quickly.""",
         menubar.add_cascade(label="查看", menu=view_menu)
         view_menu.add_command(label="刷新字体列表", command=self.refresh_fonts)
         view_menu.add_command(label="显示最近使用", command=self.show_recent_fonts)
+        view_menu.add_command(label="清除使用记录", command=self.clear_usage_history)
         view_menu.add_command(label="显示收藏夹", command=lambda: self.show_font_category("收藏夹"))
+        view_menu.add_command(label="浏览收藏夹", command=self.show_favorite_fonts)
+        view_menu.add_command(label="样张墙", command=self.show_specimen_wall)
+        view_menu.add_command(label="OpenType特性预览", command=self.show_feature_preview)
+        view_menu.add_command(label="缓存统计", command=self.show_cache_stats)
+        view_menu.add_separator()
+        view_menu.add_command(label="查找相似字体", command=self.show_similar_fonts)
+        view_menu.add_command(label="编辑分类规则", command=self.edit_category_rules)
+        view_menu.add_command(label="重复字体报告", command=self.show_duplicate_report)
+        view_menu.add_command(label="字体健康检查", command=self.show_health_report)
+        self.quarantine_var = tk.BooleanVar(value=True)
+        view_menu.add_checkbutton(label="隔离有问题的字体", variable=self.quarantine_var,
+                                  command=self.apply_quarantine)
+        self.hide_duplicates_var = tk.BooleanVar(value=False)
+        view_menu.add_checkbutton(label="隐藏重复字体", variable=self.hide_duplicates_var,
+                                  command=self.toggle_hide_duplicates)
+        view_menu.add_separator()
+        self.show_fallback_var = tk.BooleanVar(value=False)
+        view_menu.add_checkbutton(label="标记回退字符", variable=self.show_fallback_var,
+                                  command=self.update_fallback_marks)
+        view_menu.add_command(label="回退字符检查器", command=self.show_fallback_inspector)
+        view_menu.add_separator()
+        self.recording_var = tk.BooleanVar(value=False)
+        view_menu.add_checkbutton(label="录制交互", variable=self.recording_var,
+                                  command=self.toggle_interaction_recording)
         
         # 帮助菜单
         help_menu = tk.Menu(menubar, tearoff=0)
@@ -310,6 +4236,9 @@ The five boxing wizards jump quickly.""",
         
         # 绑定右键事件
         self.text_display.bind("<Button-3>", self.show_text_context_menu)
+        
+        # 文本修改后重新标记回退字符
+        self.text_display.bind("<<Modified>>", self.on_text_modified)
     
     def create_bottom_buttons(self, parent):
         """创建底部按钮"""
@@ -322,7 +4251,7 @@ The five boxing wizards jump quickly.""",
             ("保存预设", self.save_preset, 2),
             ("加载预设", self.load_preset, 3),
             ("重置", self.reset_settings, 4),
-            ("退出", self.root.quit, 5)
+            ("退出", self.quit_app, 5)
         ]
         
         for text, command, column in buttons:
@@ -331,43 +4260,150 @@ The five boxing wizards jump quickly.""",
     
     def create_status_bar(self):
         """创建状态栏"""
-        self.status_bar = ttk.Label(self.root, text="就绪", relief=tk.SUNKEN, anchor=tk.W)
-        self.status_bar.grid(row=1, column=0, sticky=(tk.W, tk.E))
+        status_frame = ttk.Frame(self.root, relief=tk.SUNKEN)
+        status_frame.grid(row=1, column=0, sticky=(tk.W, tk.E))
+        status_frame.columnconfigure(0, weight=1)
+        
+        self.status_bar = ttk.Label(status_frame, text="就绪", anchor=tk.W)
+        self.status_bar.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        
+        # 长任务的确定进度（有任务时才显示）
+        self.progress_label = ttk.Label(status_frame, anchor=tk.E)
+        self.progress_bar = ttk.Progressbar(status_frame, mode="determinate", length=160)
+    
+    def update_status(self, message, timeout=3.0):
+        """更新状态栏（可在任意线程调用）"""
+        self.notifications.status(message, timeout)
+    
+    def show_toast(self, message):
+        """显示非阻塞提示（可在任意线程调用）"""
+        self.notifications.toast(message)
+    
+    def pump_notifications(self):
+        """每帧把总线上的变化合并成一次界面更新"""
+        changes = self.notifications.drain()
+        now = time.monotonic()
+        if changes is not None:
+            message, timeout, tasks, toasts = changes
+            if message is not None:
+                self.status_bar.config(text=f"{message} | {datetime.now().strftime('%H:%M:%S')}")
+                self.status_reset_at = now + timeout if timeout is not None else None
+            self.update_progress_display(tasks)
+            for toast in toasts:
+                self.open_toast(toast)
+        
+        if self.status_reset_at is not None and now >= self.status_reset_at:
+            self.status_bar.config(text="就绪")
+            self.status_reset_at = None
+        self.root.after(self.NOTIFY_INTERVAL, self.pump_notifications)
+    
+    def update_progress_display(self, tasks):
+        """显示进行中任务的进度，多个任务时合计"""
+        if not tasks:
+            self.progress_label.grid_remove()
+            self.progress_bar.grid_remove()
+            return
+        done = sum(task[1] for task in tasks)
+        total = sum(task[2] for task in tasks)
+        text = tasks[-1][0] if len(tasks) == 1 else f"{len(tasks)} 个任务"
+        self.progress_label.config(text=f"{text} {done}/{total}")
+        self.progress_bar.config(maximum=max(total, 1), value=done)
+        self.progress_label.grid(row=0, column=1, padx=5)
+        self.progress_bar.grid(row=0, column=2, padx=(0, 5))
+    
+    def open_toast(self, message):
+        """在主窗口右下角弹出自动消失的提示，不获取焦点"""
+        toast = tk.Toplevel(self.root)
+        toast.overrideredirect(True)
+        toast.attributes("-topmost", True)
+        ttk.Label(toast, text=message, padding=(12, 6), relief=tk.SOLID, borderwidth=1).pack()
+        toast.update_idletasks()
+        
+        self.toast_windows = [w for w in self.toast_windows if w.winfo_exists()]
+        offset = sum(w.winfo_height() + 6 for w in self.toast_windows)
+        x = self.root.winfo_rootx() + self.root.winfo_width() - toast.winfo_width() - 20
+        y = self.root.winfo_rooty() + self.root.winfo_height() - toast.winfo_height() - 40 - offset
+        toast.geometry(f"+{x}+{y}")
+        self.toast_windows.append(toast)
+        
+        def close():
+            if toast.winfo_exists():
+                toast.destroy()
+        
+        toast.bind("<Button-1>", lambda e: close())
+        self.root.after(self.TOAST_DURATION, close)
     
-    def update_status(self, message):
-        """更新状态栏"""
-        self.status_bar.config(text=f"{message} | {datetime.now().strftime('%H:%M:%S')}")
-        self.root.after(3000, lambda: self.status_bar.config(text="就绪"))
+    def run_in_background(self, task, on_done, status_text=None):
+        """在后台线程执行任务，完成后在主线程回调
+        
+        task 接收一个 progress(已完成, 总数) 回调参数。
+        """
+        result = {}
+        task_id = object()
+        
+        def progress(done, total):
+            self.notifications.progress(task_id, status_text or "后台任务", done, total)
+        
+        def worker():
+            try:
+                result["value"] = task(progress)
+            except Exception as e:
+                result["error"] = e
+        
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        
+        def poll():
+            if thread.is_alive():
+                self.root.after(100, poll)
+                return
+            self.notifications.finish(task_id)
+            if "error" in result:
+                messagebox.showerror("错误", f"后台任务出错: {result['error']}")
+            else:
+                on_done(result.get("value"))
+        
+        if status_text:
+            self.update_status(status_text, timeout=None)
+        self.root.after(100, poll)
     
     def load_system_fonts(self):
         """加载系统可用字体"""
         try:
             self.update_status("正在加载字体...")
             
-            # 获取系统所有字体
-            font_families = list(font.families())
-            font_families.sort()
-            
-            # 分类字体
-            self.categorize_fonts(font_families)
+            # 优先采用目录快照，没有可用快照时枚举系统字体
+            font_families = self.adopt_catalog_snapshot()
+            if font_families is None:
+                font_families = list(font.families())
+                font_families.sort()
+                
+                # 分类字体（字体列表与会话快照一致时直接使用其中的分类结果）
+                if not self.restore_font_index(font_families):
+                    self.categorize_fonts(font_families)
             
             # 设置字体分类下拉框
             self.font_category_combo['values'] = list(self.font_categories.keys())
             
-            # 显示所有字体
-            self.font_family_combo['values'] = self.font_categories["所有字体"]
+            # 显示当前分类的字体
+            if self.font_category_var.get() not in self.font_categories:
+                self.font_category_var.set("所有字体")
+            self.font_family_combo['values'] = self.current_font_list()
             
-            # 设置默认字体
+            # 设置默认字体（恢复的会话字体仍然存在时保留）
             default_fonts = ['Microsoft YaHei', 'Arial', 'SimSun', 'Times New Roman', 'Segoe UI']
-            for df in default_fonts:
-                if df in font_families:
-                    self.font_family_var.set(df)
-                    self.add_to_recent(df)
-                    break
+            if self.font_family_var.get() in font_families:
+                pass
             else:
-                if font_families:
-                    self.font_family_var.set(font_families[0])
-                    self.add_to_recent(font_families[0])
+                for df in default_fonts:
+                    if df in font_families:
+                        self.font_family_var.set(df)
+                        self.add_to_recent(df)
+                        break
+                else:
+                    if font_families:
+                        self.font_family_var.set(font_families[0])
+                        self.add_to_recent(font_families[0])
             
             # 更新字体显示
             self.update_font_display()
@@ -378,40 +4414,292 @@ The five boxing wizards jump quickly.""",
             self.font_family_combo['values'] = ['字体加载失败']
             self.font_family_var.set('字体加载失败')
     
+    def adopt_catalog_snapshot(self):
+        """先直接采用目录快照，返回排序后的字体家族列表，再在后台与本机字体核对
+        
+        快照中的家族、分类和字体映射直接使用；核对完成后只重新解析变化的文件并重新分类涉及的家族，
+        差异过大时改为扫描字体。没有快照或快照无效时返回None。
+        """
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return None
+        try:
+            snapshot = CatalogSnapshot(self.snapshot_path)
+        except (OSError, ValueError, KeyError, struct.error) as e:
+            self.update_status(f"目录快照无效，改为扫描字体: {e}")
+            return None
+        
+        with self.font_resolver.lock:
+            self.font_resolver.faces = SnapshotFaceMap(snapshot)
+            self.font_resolver.ready = True
+        
+        font_families = snapshot.families()
+        if snapshot.info["rules"] != category_rules_digest(self.category_rules):
+            self.categorize_fonts(font_families)
+        else:
+            self.font_categories.update(snapshot.categories())
+            self.font_categories["所有字体"] = font_families
+            self.font_categories["收藏夹"] = self.favorites
+        self.catalog_snapshot = snapshot
+        self.search_index = snapshot
+        
+        directories = self.font_resolver.directories
+        
+        def validate(progress):
+            # 已核对过哈希的文件按修改时间记录，之后启动只需stat
+            verified_path = os.path.join(CACHE_DIR, "snapshot_verified.json")
+            try:
+                with open(verified_path, "r", encoding="utf-8") as f:
+                    verified = json.load(f)
+            except (OSError, ValueError):
+                verified = {}
+            updated, removed = snapshot.validate(directories, verified)
+            try:
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                with open(verified_path, "w", encoding="utf-8") as f:
+                    json.dump(verified, f, ensure_ascii=False)
+            except OSError:
+                pass
+            if len(updated) + len(removed) > snapshot.file_count // 2:
+                return None
+            
+            affected = {face["family"] for face in snapshot.faces_of_files(updated + removed)}
+            if updated or removed:
+                with self.font_resolver.lock:
+                    parsed = self.font_resolver.update_files(updated, removed)
+                affected.update(face["family"] for face in parsed)
+            return updated, removed, affected
+        
+        self.run_in_background(validate, lambda result: self.reconcile_catalog_snapshot(snapshot, result),
+                               "正在核对目录快照")
+        return font_families
+    
+    def reconcile_catalog_snapshot(self, snapshot, result):
+        """后台核对完成后更新变化文件涉及的家族；差异过大时放弃快照，改为枚举和扫描字体"""
+        if self.catalog_snapshot is not snapshot:
+            return
+        if result is None:
+            with self.font_resolver.lock:
+                self.font_resolver.faces = {}
+                self.font_resolver.ready = False
+            self.catalog_snapshot = None
+            self.search_index = None
+            snapshot.close()
+            self.sync_font_catalog()
+            self.update_status("目录快照与本机字体差异过大，改为扫描字体")
+            self.run_in_background(lambda progress: self.font_resolver.ensure_ready(progress),
+                                   lambda result: self.on_font_resolver_ready(), "正在扫描字体文件")
+            return
+        
+        updated, removed, affected = result
+        # 变化文件涉及的家族：不再有字体的移除，其余重新分类
+        if affected:
+            font_families = self.font_categories["所有字体"]
+            present = {family for family in affected if self.font_resolver.faces.get(family.lower())}
+            for category, fonts in self.font_categories.items():
+                if category not in ("所有字体", "收藏夹") and category not in self.folder_sources:
+                    fonts[:] = [f for f in fonts if f not in affected]
+            self.font_categories["所有字体"] = sorted((set(font_families) - affected) | present)
+            for font_name in sorted(present):
+                for category in self.categorize_font(font_name):
+                    bisect.insort(self.font_categories[category], font_name)
+            self.search_index = None
+            self.fallback_resolver.invalidate()
+            self.apply_quarantine()
+            self.refresh_font_views()
+        self.update_status(f"已采用目录快照: 变化 {len(updated)}, 删除 {len(removed)}")
+    
+    def export_catalog_snapshot(self):
+        """把当前的字体映射、分类和搜索索引导出为目录快照，供其他机器直接加载"""
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".snap",
+            filetypes=[("目录快照", "*.snap"), ("所有文件", "*.*")],
+            initialfile=os.path.basename(CATALOG_SNAPSHOT_FILE)
+        )
+        if not file_path:
+            return
+        families = list(self.font_categories["所有字体"])
+        categories = {name: list(fonts) for name, fonts in self.font_categories.items()
+                      if name not in ("所有字体", "收藏夹") and name not in self.folder_sources}
+        rules_digest = category_rules_digest(self.category_rules)
+        
+        def task(progress):
+            self.font_resolver.ensure_ready()
+            return CatalogSnapshot.write(file_path, self.font_resolver, families, categories, rules_digest, progress)
+        
+        def finished(result):
+            self.update_status(f"目录快照已保存: {os.path.basename(file_path)}（{result[1]} 个字体，{result[0]} 个文件）")
+        
+        self.run_in_background(task, finished, "正在生成目录快照")
+    
     def categorize_fonts(self, font_families):
         """对字体进行分类"""
         self.font_categories["所有字体"] = font_families
+        for category in self.font_categories:
+            if category not in ("所有字体", "收藏夹") and category not in self.folder_sources:
+                self.font_categories[category] = []
         
-        # 简单分类逻辑（实际应用中可能需要更复杂的检测）
         for font_name in font_families:
-            font_lower = font_name.lower()
-            
-            # 中文字体检测
-            if any(keyword in font_lower for keyword in ['song', 'hei', 'kai', 'fang', 'sim', 'microsoft', 'yahei']):
-                self.font_categories["中文字体"].append(font_name)
-            
-            # 英文字体检测
-            if any(keyword in font_lower for keyword in ['arial', 'times', 'courier', 'verdana', 'tahoma', 'georgia']):
-                self.font_categories["英文字体"].append(font_name)
-            
-            # 等宽字体检测
-            if any(keyword in font_lower for keyword in ['mono', 'courier', 'consolas', 'fixedsys']):
-                self.font_categories["等宽字体"].append(font_name)
-            
-            # 衬线/无衬线字体（简单判断）
-            if any(keyword in font_lower for keyword in ['times', 'georgia', '宋体', 'simsun']):
-                self.font_categories["衬线字体"].append(font_name)
-            elif any(keyword in font_lower for keyword in ['arial', 'helvetica', 'verdana', 'tahoma', '黑体', 'yahei']):
-                self.font_categories["无衬线字体"].append(font_name)
+            for category in self.categorize_font(font_name):
+                self.font_categories[category].append(font_name)
         
         # 收藏夹
         self.font_categories["收藏夹"] = self.favorites
     
+    def categorize_font(self, font_name):
+        """返回单个字体所属的分类"""
+        face = None
+        if self.category_rules.needs_metadata and self.font_resolver.ready:
+            face = self.font_resolver.resolve_face(font_name)
+        return self.category_rules.classify(font_name, face)
+    
+    def on_font_resolver_ready(self):
+        """字体文件映射建立后，计算依赖元数据的分类并更新可变字体面板"""
+        # 采用快照时分类已按元数据计算过
+        if self.category_rules.needs_metadata and self.catalog_snapshot is None:
+            self.apply_category_rules(self.category_rules, self.category_rules.metadata_names)
+        self.apply_quarantine()
+        self.update_variation_panel()
+        self.update_thumbnail_atlas()
+    
+    def apply_category_rules(self, rules, names=None):
+        """按新规则重新计算分类；names 为需要重新计算的分类，None 表示全部规则"""
+        old_names = set(self.category_rules.names)
+        self.category_rules = rules
+        if names is None:
+            names = set(rules.names)
+        
+        # 重新组织分类顺序：所有字体、收藏夹、规则分类、文件夹来源
+        categories = {"所有字体": self.font_categories["所有字体"], "收藏夹": self.favorites}
+        for name in rules.names:
+            categories[name] = [] if name in names or name not in old_names else self.font_categories[name]
+        for source in self.folder_sources:
+            categories[source] = self.font_categories[source]
+        
+        for font_name in categories["所有字体"]:
+            for category in self.categorize_font(font_name):
+                if category in names:
+                    categories[category].append(font_name)
+        self.font_categories = categories
+        
+        self.font_category_combo['values'] = list(self.font_categories.keys())
+        if self.font_category_var.get() not in self.font_categories:
+            self.font_category_var.set("所有字体")
+        self.refresh_font_views()
+    
+    def edit_category_rules(self):
+        """编辑分类规则（JSON），保存后只重新计算变化的分类"""
+        editor = tk.Toplevel(self.root)
+        editor.title("分类规则")
+        editor.geometry("640x520")
+        
+        help_text = ("每条规则: name, keywords, exclude, unless, monospace, italic, variable, "
+                     "weight_min/max, width_min/max, min_codepoints, coverage {文字: 比例}\n"
+                     f"可用文字: {', '.join(SCRIPT_RANGES)}")
+        ttk.Label(editor, text=help_text, wraplength=600, padding="10").pack(fill=tk.X)
+        
+        text = tk.Text(editor, wrap=tk.NONE, font=("Consolas", 10))
+        text.pack(fill=tk.BOTH, expand=True, padx=10)
+        text.insert(1.0, json.dumps(self.category_rules.rules, ensure_ascii=False, indent=2))
+        
+        def save():
+            try:
+                rules = CategoryRuleSet(json.loads(text.get(1.0, tk.END)))
+            except ValueError as e:
+                messagebox.showerror("错误", f"分类规则无效: {e}", parent=editor)
+                return
+            try:
+                with open(CATEGORY_RULES_FILE, "w", encoding="utf-8") as f:
+                    json.dump(rules.rules, f, ensure_ascii=False, indent=2)
+            except Exception as e:
+                messagebox.showerror("错误", f"保存分类规则时出错: {e}", parent=editor)
+                return
+            
+            changed = rules.affected_by(self.category_rules)
+            self.apply_category_rules(rules, changed)
+            editor.destroy()
+            self.update_status(f"分类规则已保存，重新计算了 {len(changed)} 个分类")
+        
+        def restore_defaults():
+            text.delete(1.0, tk.END)
+            text.insert(1.0, json.dumps(DEFAULT_CATEGORY_RULES, ensure_ascii=False, indent=2))
+        
+        button_frame = ttk.Frame(editor, padding="10")
+        button_frame.pack(fill=tk.X)
+        ttk.Button(button_frame, text="保存", command=save).pack(side=tk.RIGHT)
+        ttk.Button(button_frame, text="恢复内置规则", command=restore_defaults).pack(side=tk.RIGHT, padx=5)
+    
+    def sync_font_catalog(self):
+        """与系统字体列表对比，只更新新增和移除的字体，返回 (新增数, 移除数)"""
+        current = set(self.font_categories["所有字体"])
+        families = set(font.families())
+        added = sorted(families - current)
+        removed = current - families
+        if not added and not removed:
+            return 0, 0
+        
+        self.search_index = None
+        for category, fonts in self.font_categories.items():
+            if category not in ("所有字体", "收藏夹") and category not in self.folder_sources and removed:
+                fonts[:] = [f for f in fonts if f not in removed]
+        self.font_categories["所有字体"] = sorted((current - removed) | set(added))
+        for font_name in added:
+            for category in self.categorize_font(font_name):
+                bisect.insort(self.font_categories[category], font_name)
+        
+        self.refresh_font_views()
+        return len(added), len(removed)
+    
+    def refresh_font_views(self):
+        """刷新字体列表，保留当前选中的字体"""
+        fonts = self.current_font_list()
+        self.font_family_combo['values'] = fonts
+        if self.font_family_var.get() not in self.font_categories["所有字体"] and fonts:
+            self.font_family_var.set(fonts[0])
+            self.update_font_display()
+            self.update_favorite_button()
+    
+    def process_font_changes(self):
+        """处理监视线程报告的字体文件变化"""
+        added, removed, changed = [], [], []
+        while True:
+            try:
+                changes = self.font_changes.get_nowait()
+            except queue.Empty:
+                break
+            added += changes[0]
+            removed += changes[1]
+            changed += changes[2]
+        
+        if added or removed or changed:
+            self.apply_font_changes(added, removed, changed)
+        self.root.after(500, self.process_font_changes)
+    
+    def apply_font_changes(self, added, removed, changed):
+        """只更新变化文件相关的字体映射、分类和索引"""
+        if self.font_resolver.ready:
+            self.font_resolver.update_files(added + changed, removed)
+        self.fallback_resolver.invalidate()
+        added_families, removed_families = self.sync_font_catalog()
+        self.update_thumbnail_atlas()
+        
+        if self.similarity_index is not None:
+            index = self.similarity_index
+            families = list(self.font_categories["所有字体"])
+            self.run_in_background(lambda progress: index.update(self.font_resolver, families, progress),
+                                   lambda result: None)
+        if self.duplicate_detector is not None:
+            self.scan_duplicates(self.refresh_font_views)
+        
+        self.update_status(f"字体文件变化: 新增 {len(added)}, 删除 {len(removed)}, 修改 {len(changed)} | "
+                           f"字体列表: +{added_families} -{removed_families}")
+    
     def filter_fonts_by_category(self, event=None):
         """根据分类过滤字体"""
         category = self.font_category_var.get()
+        if event is not None:
+            self.record_interaction("category", category)
         if category in self.font_categories:
-            fonts = self.font_categories[category]
+            fonts = self.apply_font_filters(self.font_categories[category])
             self.font_family_combo['values'] = fonts
             if fonts:
                 self.font_family_var.set(fonts[0])
@@ -420,26 +4708,49 @@ The five boxing wizards jump quickly.""",
     def filter_fonts_by_search(self, event=None):
         """根据搜索词过滤字体"""
         search_term = self.search_var.get().lower()
+        if event is not None:
+            self.record_interaction("search", self.search_var.get())
         if not search_term:
             self.filter_fonts_by_category()
             return
         
+        filtered_fonts = self.current_font_list()
+        self.font_family_combo['values'] = filtered_fonts
+        
+        if filtered_fonts:
+            self.font_family_var.set(filtered_fonts[0])
+            self.update_font_display()
+    
+    def current_font_list(self):
+        """按当前分类、搜索词和过滤选项计算字体列表"""
         current_category = self.font_category_var.get()
         if current_category in self.font_categories:
             all_fonts = self.font_categories[current_category]
         else:
             all_fonts = self.font_categories["所有字体"]
         
-        filtered_fonts = [f for f in all_fonts if search_term in f.lower()]
-        self.font_family_combo['values'] = filtered_fonts
-        
-        if filtered_fonts:
-            self.font_family_var.set(filtered_fonts[0])
-            self.update_font_display()
+        all_fonts = self.apply_font_filters(all_fonts)
+        search_term = self.search_var.get().lower()
+        if search_term:
+            if self.search_index is not None:
+                matches = self.search_index.search(search_term)
+                return [f for f in all_fonts if f in matches]
+            return [f for f in all_fonts if search_term in f.lower()]
+        return all_fonts
+    
+    def apply_font_filters(self, fonts):
+        """应用列表过滤选项（隐藏重复字体、隔离有问题的字体）"""
+        if self.hide_duplicates_var.get() and self.hidden_duplicates:
+            fonts = [f for f in fonts if f.lower() not in self.hidden_duplicates]
+        if self.quarantined_families:
+            fonts = [f for f in fonts if f.lower() not in self.quarantined_families]
+        return fonts
     
     def on_font_selected(self, event=None):
         """字体被选中时的处理"""
         font_name = self.font_family_var.get()
+        if event is not None:
+            self.record_interaction("font", font_name)
         if font_name:
             if self.compare_mode:
                 self.add_to_compare_list(font_name)
@@ -449,7 +4760,10 @@ The five boxing wizards jump quickly.""",
                 self.update_favorite_button()
     
     def add_to_recent(self, font_name):
-        """添加到最近使用"""
+        """添加到最近使用，记录使用情况并在空闲时预取接下来可能打开的字体"""
+        if not self.replaying:
+            self.usage_history.record_selection(font_name)
+        self.schedule_prefetch()
         if font_name in self.recent_fonts:
             self.recent_fonts.remove(font_name)
         self.recent_fonts.insert(0, font_name)
@@ -458,14 +4772,77 @@ The five boxing wizards jump quickly.""",
         if len(self.recent_fonts) > self.max_recent:
             self.recent_fonts = self.recent_fonts[:self.max_recent]
     
+    def schedule_prefetch(self):
+        """界面空闲一段时间后开始预取（期间再次选择字体会重新计时）"""
+        if self.prefetch_job is not None:
+            self.root.after_cancel(self.prefetch_job)
+        self.prefetch_queue.clear()
+        self.prefetch_job = self.root.after(self.PREFETCH_DELAY, self.start_prefetch)
+    
+    def start_prefetch(self):
+        """按使用记录和列表中的相邻字体确定预取队列"""
+        self.prefetch_job = None
+        if self.font_category_var.get() in self.folder_sources:
+            return
+        current = self.font_family_var.get()
+        fonts = self.current_font_list()
+        neighbours = []
+        try:
+            position = fonts.index(current)
+        except ValueError:
+            position = None
+        if position is not None:
+            for offset in range(1, self.PREFETCH_NEIGHBOURS + 1):
+                neighbours += [fonts[i] for i in (position + offset, position - offset) if 0 <= i < len(fonts)]
+        
+        installed = set(self.font_categories["所有字体"])
+        predicted = self.usage_history.predict(current, neighbours, limit=self.PREFETCH_COUNT * 2)
+        self.prefetch_queue = deque([name for name in predicted if name in installed][:self.PREFETCH_COUNT])
+        if self.prefetch_queue:
+            self.prefetch_job = self.root.after_idle(self.prefetch_step)
+    
+    def prefetch_step(self):
+        """每次空闲只预热一个字体，用户操作的事件可以插在两次之间处理"""
+        self.prefetch_job = None
+        if not self.prefetch_queue:
+            return
+        family = self.prefetch_queue.popleft()
+        try:
+            # Tk字体对象在第一次量度时才真正加载字体，这里用当前样式和示例文本首行预先量度
+            tk_font = self.get_tk_font(family, self.font_size_var.get(),
+                                       "bold" if self.bold_var.get() else "normal",
+                                       "italic" if self.italic_var.get() else "roman",
+                                       self.underline_var.get(), self.overstrike_var.get())
+            tk_font.metrics("linespace")
+            tk_font.measure(self.text_display.get(1.0, "1.end")[:200])
+            self.thumbnail_image(family)
+            if self.font_resolver.ready:
+                self.fallback_resolver.coverage(family)
+        except (tk.TclError, OSError, ValueError):
+            pass
+        self.prefetch_job = self.root.after_idle(self.prefetch_step)
+    
+    def clear_usage_history(self):
+        """清除使用记录和最近使用列表"""
+        if not messagebox.askyesno("清除使用记录", "确定要清除字体使用记录吗？"):
+            return
+        self.usage_history.clear()
+        self.recent_fonts = []
+        try:
+            self.usage_history.save()
+        except OSError as e:
+            messagebox.showerror("错误", f"保存使用记录时出错: {e}")
+            return
+        self.update_status("使用记录已清除")
+    
     def add_to_compare_list(self, font_name):
         """添加到对比列表"""
         if font_name in self.compare_fonts_list:
             self.compare_fonts_list.remove(font_name)
-            messagebox.showinfo("提示", f"已从对比列表移除: {font_name}")
+            self.show_toast(f"已从对比列表移除: {font_name}")
         else:
             self.compare_fonts_list.append(font_name)
-            messagebox.showinfo("提示", f"已添加到对比列表: {font_name}")
+            self.show_toast(f"已添加到对比列表: {font_name}")
         
         # 更新对比模式按钮显示
         if self.compare_mode:
@@ -503,10 +4880,15 @@ The five boxing wizards jump quickly.""",
             font_underline = self.underline_var.get()
             font_overstrike = self.overstrike_var.get()
             
+            # 文件夹来源的字体未安装，使用PIL渲染预览
+            source = self.font_category_var.get()
+            if source in self.folder_sources:
+                self.show_folder_font_preview(self.folder_sources[source], font_family, font_size)
+                return
+            
             # 创建字体
-            current_font = font.Font(family=font_family, size=font_size,
-                                     weight=font_weight, slant=font_slant,
-                                     underline=font_underline, overstrike=font_overstrike)
+            current_font = self.get_tk_font(font_family, font_size, font_weight, font_slant,
+                                            font_underline, font_overstrike)
             
             # 应用到文本显示框
             self.text_display.configure(font=current_font)
@@ -526,9 +4908,316 @@ The five boxing wizards jump quickly.""",
             font_info = " | ".join(font_info_parts)
             self.font_info_label.config(text=font_info)
             
+            # 更新可变字体轴和回退字符标记
+            self.update_variation_panel()
+            self.update_fallback_marks()
+            
         except Exception as e:
             messagebox.showerror("错误", f"更新字体时出错: {e}")
     
+    def get_tk_font(self, family, size, weight="normal", slant="roman", underline=False, overstrike=False):
+        """返回Tk字体对象，最近使用的对象会被复用"""
+        spec = (family, size, weight, slant, bool(underline), bool(overstrike))
+        tk_font = self.tk_fonts.get(spec)
+        if tk_font is None:
+            tk_font = font.Font(family=family, size=size, weight=weight, slant=slant,
+                                underline=underline, overstrike=overstrike)
+            self.tk_fonts.put(spec, tk_font, size=16 * 1024, cost=4.0)
+        return tk_font
+    
+    def on_text_modified(self, event=None):
+        """文本修改后同步对比窗口，并稍作延迟再检查回退字符（连续输入只检查一次）"""
+        self.text_display.edit_modified(False)
+        self.sync_sample_document()
+        if not self.show_fallback_var.get():
+            return
+        if self.fallback_job is not None:
+            self.root.after_cancel(self.fallback_job)
+        self.fallback_job = self.root.after(300, self.update_fallback_marks)
+    
+    def sync_sample_document(self):
+        """把示例文本的修改同步到共享文档，订阅的对比窗格只更新变化的行"""
+        self.sample_document.update(self.text_display.get(1.0, "end-1c"))
+    
+    def update_fallback_marks(self):
+        """用回退字体显示并高亮不由当前字体渲染的字符"""
+        self.fallback_job = None
+        for tag in self.text_display.tag_names():
+            if tag.startswith("fallback"):
+                self.text_display.tag_delete(tag)
+        if not self.show_fallback_var.get():
+            return
+        if not self.font_resolver.ready:
+            self.update_status("字体文件映射尚未建立，稍后再试")
+            return
+        
+        primary = self.font_family_var.get()
+        runs = self.fallback_resolver.runs(primary, self.text_display.get(1.0, "end-1c"))
+        counts = {}
+        for line, start, end, family in runs:
+            tag = f"fallback:{family or ''}"
+            if tag not in counts:
+                if family:
+                    self.text_display.tag_configure(tag, background="#fff3b0", font=self.get_tk_font(
+                        family, self.font_size_var.get(),
+                        "bold" if self.bold_var.get() else "normal",
+                        "italic" if self.italic_var.get() else "roman"))
+                else:
+                    self.text_display.tag_configure(tag, background="#ffc0c0")
+                counts[tag] = 0
+            self.text_display.tag_add(tag, f"{line}.{start}", f"{line}.{end}")
+            counts[tag] += end - start
+        
+        if counts:
+            summary = ", ".join(f"{tag.split(':', 1)[1] or '无字体'} {count}"
+                                for tag, count in sorted(counts.items(), key=lambda item: -item[1]))
+            self.update_status(f"{sum(counts.values())} 个字符由其他字体渲染: {summary}")
+        else:
+            self.update_status(f"所有字符均由 {primary} 渲染")
+    
+    def show_fallback_inspector(self):
+        """列出示例文本中每个替换字符的实际渲染字体，并编辑回退链"""
+        if not self.font_resolver.ready:
+            messagebox.showinfo("回退字符检查器", "字体文件映射尚未建立，请稍后再试")
+            return
+        
+        inspector = tk.Toplevel(self.root)
+        inspector.title("回退字符检查器")
+        inspector.geometry("560x480")
+        
+        chain_frame = ttk.Frame(inspector, padding="10")
+        chain_frame.pack(fill=tk.X)
+        chain_frame.columnconfigure(1, weight=1)
+        primary_var = tk.StringVar()
+        chain_var = tk.StringVar()
+        default_var = tk.StringVar(value=", ".join(self.fallback_resolver.chains.get("*", [])))
+        ttk.Label(chain_frame, textvariable=primary_var).grid(row=0, column=0, sticky=tk.W)
+        ttk.Entry(chain_frame, textvariable=chain_var).grid(row=0, column=1, sticky=(tk.W, tk.E), padx=5)
+        ttk.Label(chain_frame, text="默认回退链:").grid(row=1, column=0, sticky=tk.W, pady=(5, 0))
+        ttk.Entry(chain_frame, textvariable=default_var).grid(row=1, column=1, sticky=(tk.W, tk.E),
+                                                               padx=5, pady=(5, 0))
+        
+        columns = ("char", "code", "font")
+        tree = ttk.Treeview(inspector, columns=columns, show="headings")
+        for column, heading, width in zip(columns, ("字符", "码位", "渲染字体"), (60, 100, 300)):
+            tree.heading(column, text=heading)
+            tree.column(column, width=width)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10)
+        
+        def refresh():
+            primary = self.font_family_var.get()
+            primary_var.set(f"{primary} 的回退链:")
+            chain_var.set(", ".join(self.fallback_resolver.chains.get(primary, [])))
+            tree.delete(*tree.get_children())
+            seen = set()
+            for char in self.text_display.get(1.0, "end-1c"):
+                if char in seen:
+                    continue
+                seen.add(char)
+                family = self.fallback_resolver.resolve(primary, ord(char))
+                if family != primary:
+                    tree.insert("", tk.END, values=(char, f"U+{ord(char):04X}", family or "（无字体包含）"))
+        
+        def apply_chains():
+            chains = dict(self.fallback_resolver.chains)
+            chains[self.font_family_var.get()] = [f.strip() for f in chain_var.get().split(",") if f.strip()]
+            chains["*"] = [f.strip() for f in default_var.get().split(",") if f.strip()]
+            self.fallback_resolver.set_chains(chains)
+            try:
+                self.fallback_resolver.save_chains()
+            except Exception as e:
+                messagebox.showerror("错误", f"保存回退链时出错: {e}", parent=inspector)
+            refresh()
+            self.update_fallback_marks()
+        
+        button_frame = ttk.Frame(inspector, padding="10")
+        button_frame.pack(fill=tk.X)
+        ttk.Button(button_frame, text="应用回退链", command=apply_chains).pack(side=tk.RIGHT)
+        ttk.Button(button_frame, text="刷新", command=refresh).pack(side=tk.RIGHT, padx=5)
+        refresh()
+    
+    def open_font_folder(self):
+        """打开未安装的字体文件夹，作为独立的字体来源浏览"""
+        folder = filedialog.askdirectory(title="选择字体文件夹")
+        if not folder:
+            return
+        
+        def scan(progress):
+            catalog = FontFolderCatalog(folder)
+            catalog.load()
+            catalog.scan(progress)
+            return catalog
+        
+        def finished(catalog):
+            source = f"文件夹: {os.path.basename(catalog.folder) or catalog.folder}"
+            resolver = catalog.resolver()
+            self.folder_sources[source] = resolver
+            self.font_categories[source] = resolver.families()
+            self.font_category_combo['values'] = list(self.font_categories.keys())
+            self.show_font_category(source)
+            self.update_status(f"已加载 {catalog.folder}: {len(self.font_categories[source])} 个字体家族")
+        
+        self.run_in_background(scan, finished, "正在扫描字体文件夹")
+    
+    def show_folder_font_preview(self, resolver, family, font_size):
+        """用PIL渲染未安装字体的预览"""
+        if not PIL_AVAILABLE:
+            self.font_info_label.config(text="预览未安装的字体需要PIL库")
+            return
+        
+        resolved = resolver.resolve(family, self.bold_var.get(), self.italic_var.get())
+        if resolved is None:
+            return
+        path, index = resolved
+        
+        img_font = ImageFont.truetype(path, font_size, index=index)
+        face = resolver.resolve_face(family, self.bold_var.get(), self.italic_var.get())
+        text = self.text_display.get(1.0, tk.END)
+        lines = self.layout_engine.wrap(text, img_font, (path, index), 860)[:60]
+        line_height = self.layout_engine.line_height(img_font, face)
+        image = Image.new("RGB", (900, line_height * len(lines) + 40), "#FFFFFF")
+        draw = ImageDraw.Draw(image)
+        for i, line in enumerate(lines):
+            draw.text((20, 20 + i * line_height), line, fill="#000000", font=img_font)
+        
+        if self.folder_preview is None or not self.folder_preview["window"].winfo_exists():
+            preview_window = tk.Toplevel(self.root)
+            preview_window.geometry("920x600")
+            canvas = tk.Canvas(preview_window, background="#FFFFFF")
+            scrollbar = ttk.Scrollbar(preview_window, orient=tk.VERTICAL, command=canvas.yview)
+            canvas.configure(yscrollcommand=scrollbar.set)
+            canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            self.folder_preview = {"window": preview_window, "canvas": canvas, "image": None}
+        
+        photo = ImageTk.PhotoImage(image)
+        canvas = self.folder_preview["canvas"]
+        canvas.delete("all")
+        canvas.create_image(0, 0, image=photo, anchor="nw")
+        canvas.configure(scrollregion=(0, 0, image.width, image.height))
+        self.folder_preview["image"] = photo
+        self.folder_preview["window"].title(f"文件夹字体预览 - {family}")
+        
+        self.font_info_label.config(text=f"{family} | {font_size}pt | {os.path.basename(path)} (未安装)")
+    
+    def update_variation_panel(self):
+        """显示当前字体的可变字体轴滑块和命名实例"""
+        if not PIL_AVAILABLE or not self.font_resolver.ready:
+            return
+        
+        face = self.font_resolver.resolve_face(self.font_family_var.get(),
+                                               self.bold_var.get(), self.italic_var.get())
+        if not face or not face.get("axes"):
+            if self.variation_state is not None:
+                self.variation_frame.grid_remove()
+                self.variation_state = None
+            return
+        
+        if self.variation_state is None or self.variation_state["face"] is not face:
+            self.variation_renderer.forget_failures()
+            self.build_variation_controls(face)
+        self.render_variation_frame()
+    
+    def build_variation_controls(self, face):
+        """为可变字体创建每个设计轴的滑块"""
+        for child in self.variation_frame.winfo_children():
+            child.destroy()
+        if self.variation_renderer is None:
+            self.variation_renderer = VariationFrameRenderer(cache_manager=self.cache_manager)
+        
+        ttk.Label(self.variation_frame, text="命名实例:").grid(row=0, column=0, sticky=tk.W)
+        instance_var = tk.StringVar()
+        instance_combo = ttk.Combobox(self.variation_frame, textvariable=instance_var, width=25,
+                                      values=[i["name"] for i in face["instances"]], state="readonly")
+        instance_combo.grid(row=0, column=1, sticky=tk.W, pady=2)
+        
+        axis_vars = []
+        value_labels = []
+        for i, axis in enumerate(face["axes"]):
+            var = tk.DoubleVar(value=axis["default"])
+            ttk.Label(self.variation_frame, text=f"{axis['name']} ({axis['tag']}):").grid(
+                row=i + 1, column=0, sticky=tk.W)
+            ttk.Scale(self.variation_frame, from_=axis["min"], to=axis["max"], variable=var, length=300,
+                      command=lambda value, i=i: self.on_variation_changed(i)).grid(
+                row=i + 1, column=1, sticky=(tk.W, tk.E))
+            value_label = ttk.Label(self.variation_frame, width=8)
+            value_label.grid(row=i + 1, column=2, sticky=tk.W, padx=(5, 0))
+            axis_vars.append(var)
+            value_labels.append(value_label)
+        
+        preview = ttk.Label(self.variation_frame)
+        preview.grid(row=len(face["axes"]) + 1, column=0, columnspan=3, sticky=tk.W, pady=(5, 0))
+        
+        def apply_instance(event):
+            for instance in face["instances"]:
+                if instance["name"] == instance_var.get():
+                    for var, value in zip(axis_vars, instance["coordinates"]):
+                        var.set(value)
+                    self.render_variation_frame()
+                    break
+        
+        instance_combo.bind('<<ComboboxSelected>>', apply_instance)
+        self.variation_state = {"face": face, "vars": axis_vars, "labels": value_labels,
+                                "preview": preview, "photo": None, "key": None, "polling": False}
+        self.variation_frame.grid()
+    
+    def on_variation_changed(self, axis_index):
+        """拖动设计轴滑块"""
+        try:
+            key = self.render_variation_frame()
+        except tk.TclError:
+            return
+        self.variation_renderer.prefetch(key, self.variation_state["face"]["axes"], axis_index)
+        # 预取的帧入队后再把当前帧提到最前，滑块下的帧总是最先渲染
+        self.variation_renderer.request(key)
+    
+    def render_variation_frame(self):
+        """显示当前轴坐标的实例，已缓存时直接显示，否则交给后台渲染"""
+        state = self.variation_state
+        face = state["face"]
+        coordinates = self.variation_renderer.quantize(face["axes"], [var.get() for var in state["vars"]])
+        for label, value in zip(state["labels"], coordinates):
+            label.config(text=f"{value:g}")
+        
+        lines = self.text_display.get(1.0, tk.END).split("\n")
+        text = next((line for line in lines if line.strip()), face["family"])[:60]
+        key = (face["path"], face["index"], self.font_size_var.get(), text, coordinates)
+        state["key"] = key
+        
+        image = self.variation_renderer.get(key)
+        if image is not None:
+            self.show_variation_frame(image)
+        else:
+            self.variation_renderer.request(key)
+            self.poll_variation_frame()
+        return key
+    
+    def poll_variation_frame(self):
+        """等待后台渲染完成当前帧"""
+        state = self.variation_state
+        if state["polling"]:
+            return
+        state["polling"] = True
+        
+        def poll():
+            state["polling"] = False
+            if self.variation_state is not state:
+                return
+            image = self.variation_renderer.get(state["key"])
+            if image is not None:
+                self.show_variation_frame(image)
+            elif not self.variation_renderer.has_failed(state["key"]):
+                state["polling"] = True
+                self.root.after(15, poll)
+        
+        self.root.after(15, poll)
+    
+    def show_variation_frame(self, image):
+        """显示渲染好的实例预览"""
+        photo = ImageTk.PhotoImage(image)
+        self.variation_state["preview"].config(image=photo)
+        self.variation_state["photo"] = photo
+    
     def toggle_favorite(self):
         """切换收藏状态"""
         font_name = self.font_family_var.get()
@@ -537,10 +5226,10 @@ The five boxing wizards jump quickly.""",
         
         if font_name in self.favorites:
             self.favorites.remove(font_name)
-            messagebox.showinfo("提示", f"已从收藏夹移除: {font_name}")
+            self.show_toast(f"已从收藏夹移除: {font_name}")
         else:
             self.favorites.append(font_name)
-            messagebox.showinfo("提示", f"已添加到收藏夹: {font_name}")
+            self.show_toast(f"已添加到收藏夹: {font_name}")
         
         self.save_favorites()
         self.font_categories["收藏夹"] = self.favorites
@@ -614,13 +5303,14 @@ The five boxing wizards jump quickly.""",
             text_content = self.text_display.get(1.0, tk.END)
             font_name = self.font_family_var.get()
             font_size = self.font_size_var.get()
+            bold = self.bold_var.get()
+            italic = self.italic_var.get()
             
             # 询问图片尺寸
             size_window = tk.Toplevel(self.root)
             size_window.title("设置图片尺寸")
             size_window.geometry("300x200")
             size_window.transient(self.root)
-            size_window.grab_set()
             
             ttk.Label(size_window, text="设置导出图片尺寸", font=("Microsoft YaHei", 12)).pack(pady=10)
             
@@ -662,35 +5352,175 @@ The five boxing wizards jump quickly.""",
                 )
                 
                 if file_path:
-                    try:
-                        # 创建图片
-                        image = Image.new('RGB', (width, height), bg_color)
-                        draw = ImageDraw.Draw(image)
-                        
-                        # 尝试加载字体
-                        try:
-                            img_font = ImageFont.truetype(font_name, font_size)
-                        except:
-                            img_font = ImageFont.load_default()
-                        
-                        # 绘制文字
-                        draw.text((20, 20), text_content, fill=text_color, font=img_font)
+                    def task(job):
+                        # 加载字体并排版（自动折行，超出高度时分页）
+                        img_font, font_key, face = self.load_image_font(font_name, font_size, bold, italic)
+                        pages = self.layout_engine.iter_pages(text_content, img_font, font_key, width, height,
+                                                              background=bg_color, foreground=text_color,
+                                                              face=face)
                         
-                        # 保存图片
-                        image.save(file_path)
-                        
-                        size_window.destroy()
-                        self.update_status(f"已导出图片: {os.path.basename(file_path)}")
-                        messagebox.showinfo("导出成功", f"图片已成功导出到:\n{file_path}")
-                        
-                    except Exception as e:
-                        messagebox.showerror("导出失败", f"导出图片时出错: {e}")
+                        # 保存图片（多页时按页码编号）
+                        file_root, file_ext = os.path.splitext(file_path)
+                        for page_number, total, image in pages:
+                            job.report(page_number - 1, total)
+                            if total > 1:
+                                image.save(f"{file_root}_{page_number}{file_ext}")
+                            else:
+                                image.save(file_path)
+                    
+                    size_window.destroy()
+                    self.submit_export_job(f"图片: {os.path.basename(file_path)}", task)
             
             ttk.Button(size_window, text="导出", command=do_export).pack(pady=10)
             
         except Exception as e:
             messagebox.showerror("错误", f"导出图片时出错: {e}")
     
+    def export_as_svg(self):
+        """把示例文本导出为矢量SVG（字形轮廓取自字体文件）"""
+        if not FONTTOOLS_AVAILABLE:
+            messagebox.showerror("缺少依赖库", "导出SVG需要fontTools库。\n请安装: pip install fonttools")
+            return
+        
+        font_name = self.font_family_var.get()
+        face = self.resolve_font_face(font_name, self.bold_var.get(), self.italic_var.get())
+        if face is None:
+            messagebox.showerror("错误", f"找不到字体 {font_name} 的字体文件，无法读取字形轮廓")
+            return
+        
+        width = simpledialog.askinteger("导出为SVG", "页面宽度（像素）:", initialvalue=800,
+                                        minvalue=200, maxvalue=10000, parent=self.root)
+        if not width:
+            return
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".svg",
+            filetypes=[("SVG 文件", "*.svg"), ("所有文件", "*.*")],
+            initialfile=f"font_{font_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.svg"
+        )
+        if not file_path:
+            return
+        
+        text_content = self.text_display.get(1.0, tk.END)
+        font_size = self.font_size_var.get()
+        
+        def task(job):
+            export_text_svg(file_path, text_content, face, font_size, width, self.layout_engine,
+                            self.outline_cache, progress=job.report)
+        
+        self.submit_export_job(f"SVG: {os.path.basename(file_path)}", task)
+    
+    def resolve_font_face(self, font_name, bold=False, italic=False):
+        """查找家族名对应的字体文件头部信息（包括已打开的字体文件夹），找不到时返回None"""
+        for source, resolver in self.folder_sources.items():
+            if font_name in self.font_categories.get(source, []):
+                return resolver.resolve_face(font_name, bold, italic)
+        if self.font_resolver.ready:
+            return self.font_resolver.resolve_face(font_name, bold, italic)
+        return None
+    
+    def load_image_font(self, font_name, font_size, bold=False, italic=False):
+        """按家族名加载PIL字体，返回 (字体, 字体标识, 字体头部信息)
+        
+        优先使用字体文件映射找到真实的字体文件，找不到时退回PIL默认字体。
+        """
+        face = self.resolve_font_face(font_name, bold, italic)
+        if face is not None:
+            return (ImageFont.truetype(face["path"], font_size, index=face["index"]),
+                    (face["path"], face["index"]), face)
+        
+        try:
+            return ImageFont.truetype(font_name, font_size), font_name, None
+        except OSError:
+            try:
+                return ImageFont.load_default(font_size), "default", None
+            except TypeError:
+                return ImageFont.load_default(), "default", None
+    
+    def submit_export_job(self, title, task):
+        """提交后台导出任务并显示任务面板"""
+        self.export_queue.submit(title, task)
+        self.update_status(f"已加入导出队列: {title}")
+        self.show_export_jobs()
+    
+    def poll_export_jobs(self):
+        """在状态栏报告完成的导出任务"""
+        while True:
+            try:
+                job = self.export_queue.finished.get_nowait()
+            except queue.Empty:
+                break
+            self.notifications.finish(job)
+            if job.status == "已完成":
+                self.update_status(f"导出完成: {job.title} ({job.elapsed():.1f} 秒)")
+            elif job.status == "失败":
+                self.update_status(f"导出失败: {job.title}: {job.error}")
+        
+        # 进行中的导出任务显示在状态栏进度条上
+        with self.export_queue.condition:
+            running = [job for job in self.export_queue.jobs if job.status == "进行中"]
+        for job in running:
+            self.notifications.progress(job, f"导出 {job.title}", round(job.progress * 100), 100)
+        self.root.after(200, self.poll_export_jobs)
+    
+    def show_export_jobs(self):
+        """显示导出任务面板（进度、耗时和取消）"""
+        if self.export_jobs_panel is not None and self.export_jobs_panel.winfo_exists():
+            self.export_jobs_panel.lift()
+            return
+        
+        panel = tk.Toplevel(self.root)
+        panel.title("导出任务")
+        panel.geometry("640x360")
+        self.export_jobs_panel = panel
+        
+        control_frame = ttk.Frame(panel, padding="10")
+        control_frame.pack(fill=tk.X)
+        ttk.Label(control_frame, text="并发数:").pack(side=tk.LEFT)
+        workers_var = tk.IntVar(value=self.export_queue.max_workers)
+        ttk.Spinbox(control_frame, from_=1, to=32, width=5, textvariable=workers_var,
+                    command=lambda: self.export_queue.set_max_workers(workers_var.get())).pack(side=tk.LEFT, padx=5)
+        
+        tree = ttk.Treeview(panel, columns=("status", "progress", "elapsed"), selectmode="extended")
+        tree.heading("#0", text="任务")
+        tree.heading("status", text="状态")
+        tree.heading("progress", text="进度")
+        tree.heading("elapsed", text="耗时")
+        tree.column("#0", width=320)
+        tree.column("status", width=80)
+        tree.column("progress", width=80)
+        tree.column("elapsed", width=80)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10)
+        
+        def cancel_selected():
+            for job in self.export_queue.jobs:
+                if str(job.id) in tree.selection():
+                    job.cancel()
+        
+        def clear_finished():
+            self.export_queue.clear_finished()
+            for item in tree.get_children():
+                if item not in {str(job.id) for job in self.export_queue.jobs}:
+                    tree.delete(item)
+        
+        button_frame = ttk.Frame(panel, padding="10")
+        button_frame.pack(fill=tk.X)
+        ttk.Button(button_frame, text="取消选中", command=cancel_selected).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="清除已结束", command=clear_finished).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="关闭", command=panel.destroy).pack(side=tk.RIGHT, padx=5)
+        
+        def refresh():
+            if not panel.winfo_exists():
+                return
+            for job in self.export_queue.jobs:
+                values = (job.status, f"{job.progress:.0%}", f"{job.elapsed():.1f} 秒")
+                if tree.exists(str(job.id)):
+                    tree.item(str(job.id), values=values)
+                else:
+                    tree.insert("", tk.END, iid=str(job.id), text=job.title, values=values)
+            panel.after(200, refresh)
+        
+        refresh()
+    
     def copy_font_info(self):
         """复制字体信息到剪贴板"""
         try:
@@ -747,48 +5577,758 @@ The five boxing wizards jump quickly.""",
         finally:
             self.text_context_menu.grab_release()
     
-    def refresh_fonts(self):
-        """刷新字体列表"""
-        self.load_system_fonts()
-        self.update_status("字体列表已刷新")
+    def refresh_fonts(self):
+        """刷新字体列表（只处理有变化的字体文件，保留当前选择）"""
+        def finished(changes):
+            added, removed, changed = changes
+            if added or removed or changed:
+                self.apply_font_changes(added, removed, changed)
+            else:
+                added_families, removed_families = self.sync_font_catalog()
+                self.update_status(f"字体列表已刷新: +{added_families} -{removed_families}")
+        
+        self.run_in_background(lambda progress: self.font_watcher.check(), finished)
+    
+    def show_recent_fonts(self):
+        """显示最近使用的字体"""
+        self.font_category_var.set("所有字体")
+        self.search_var.set("")
+        
+        if self.recent_fonts:
+            self.show_font_thumbnails("最近使用的字体", self.recent_fonts)
+        else:
+            messagebox.showinfo("最近使用", "暂无最近使用的字体")
+    
+    def update_thumbnail_atlas(self):
+        """在后台增量生成字体名称缩略图"""
+        if not PIL_AVAILABLE or not self.font_resolver.ready:
+            return
+        families = list(self.font_categories["所有字体"])
+        
+        def finished(result):
+            self.thumbnail_images.clear()
+        
+        self.run_in_background(lambda progress: self.thumbnail_atlas.update(self.font_resolver, families, progress),
+                               finished)
+    
+    def thumbnail_image(self, family):
+        """返回家族名称缩略图的PhotoImage（从图集映射中直接取），没有时返回None"""
+        image = self.thumbnail_images.get(family)
+        if image is None:
+            data = self.thumbnail_atlas.get(family)
+            if data is None:
+                return None
+            image = tk.PhotoImage(data=data, format="PPM")
+            self.thumbnail_images.put(family, image, size=image.width() * image.height() * 4)
+        return image
+    
+    def create_thumbnail_list(self, parent, rows):
+        """创建带字体缩略图的列表，rows 为 [(文本, 字体名), ...]，返回 Treeview"""
+        style = ttk.Style()
+        style.configure("Thumbnail.Treeview", rowheight=FontThumbnailAtlas.HEIGHT + 4)
+        tree = ttk.Treeview(parent, columns=("name",), show="tree headings", style="Thumbnail.Treeview", height=8)
+        tree.heading("#0", text="预览")
+        tree.heading("name", text="名称")
+        tree.column("#0", width=FontThumbnailAtlas.MAX_WIDTH // 2 + 40)
+        tree.column("name", width=160)
+        # 列表自己持有图像引用，缓存淘汰时已显示的缩略图不会消失
+        tree.images = []
+        for text, family in rows:
+            image = self.thumbnail_image(family)
+            if image:
+                tree.images.append(image)
+            tree.insert("", tk.END, iid=text, values=(text,), **({"image": image} if image else {}))
+        
+        scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=tree.yview)
+        tree.config(yscrollcommand=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        return tree
     
-    def show_recent_fonts(self):
-        """显示最近使用的字体"""
-        self.font_category_var.set("所有字体")
-        self.search_var.set("")
+    def show_font_thumbnails(self, title, fonts):
+        """在窗口中以缩略图列出字体，双击应用"""
+        window = tk.Toplevel(self.root)
+        window.title(title)
+        window.geometry("420x400")
+        tree = self.create_thumbnail_list(window, [(font_name, font_name) for font_name in fonts])
         
-        if self.recent_fonts:
-            recent_window = tk.Toplevel(self.root)
-            recent_window.title("最近使用的字体")
-            recent_window.geometry("300x400")
+        def select_font(event):
+            selection = tree.selection()
+            if selection:
+                self.font_family_var.set(selection[0])
+                self.add_to_recent(selection[0])
+                self.update_font_display()
+                self.update_favorite_button()
+                window.destroy()
+        
+        tree.bind('<Double-Button-1>', select_font)
+    
+    def show_favorite_fonts(self):
+        """以缩略图显示收藏的字体"""
+        if self.favorites:
+            self.show_font_thumbnails("收藏的字体", self.favorites)
+        else:
+            messagebox.showinfo("收藏夹", "暂无收藏的字体")
+    
+    def show_specimen_wall(self):
+        """样张墙：以虚拟化网格显示当前列表中的所有字体，只绘制可见的卡片"""
+        if not PIL_AVAILABLE:
+            messagebox.showerror("缺少依赖库", "样张墙需要PIL库。\n请安装: pip install pillow")
+            return
+        
+        fonts = list(self.current_font_list())
+        card_width, card_height = 280, 84
+        sample_height, sample_size = 54, 26
+        renderer = SpecimenRenderer(cache_manager=self.cache_manager)
+        
+        wall = tk.Toplevel(self.root)
+        wall.title(f"样张墙 - {len(fonts)} 种字体")
+        wall.geometry("1180x760")
+        
+        toolbar = ttk.Frame(wall, padding="5")
+        toolbar.pack(fill=tk.X)
+        ttk.Label(toolbar, text="样张文本:").pack(side=tk.LEFT)
+        first_line = next((line for line in self.sample_document.lines if line.strip()), "AaBbCc 123")
+        sample_var = tk.StringVar(value=first_line.strip()[:40])
+        sample_entry = ttk.Entry(toolbar, textvariable=sample_var, width=50)
+        sample_entry.pack(side=tk.LEFT, padx=5)
+        
+        canvas = tk.Canvas(wall, background="#F0F0F0", highlightthickness=0)
+        scrollbar = ttk.Scrollbar(wall, orient=tk.VERTICAL, command=lambda *args: (canvas.yview(*args), redraw()))
+        canvas.configure(yscrollcommand=scrollbar.set)
+        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        # 可见卡片 {序号: (背景, 名称, 图像, 键)}，滚出视口的画布对象放回空闲列表复用
+        cards = {}
+        free_items = []
+        photos = {}
+        layout = {"columns": 1, "range": None}
+        
+        def card_key(index):
+            face = self.resolve_font_face(fonts[index])
+            if face is None:
+                return None
+            return (face["path"], face["index"], sample_size, sample_var.get(), card_width - 12, sample_height)
+        
+        def place_card(index):
+            column, row = index % layout["columns"], index // layout["columns"]
+            x, y = column * card_width + 6, row * card_height + 6
+            if free_items:
+                background, name, image = free_items.pop()
+            else:
+                background = canvas.create_rectangle(0, 0, 0, 0, fill="#FFFFFF", outline="#D0D0D0")
+                name = canvas.create_text(0, 0, anchor=tk.NW, fill="#555555")
+                image = canvas.create_image(0, 0, anchor=tk.NW)
+            canvas.coords(background, x, y, x + card_width - 6, y + card_height - 6)
+            canvas.coords(name, x + 6, y + 4)
+            canvas.coords(image, x + 3, y + 22)
+            canvas.itemconfig(name, text=fonts[index])
+            canvas.itemconfig(image, image="")
+            for item in (background, name, image):
+                canvas.itemconfig(item, state=tk.NORMAL)
+            key = card_key(index)
+            cards[index] = (background, name, image, key)
+            if key is None:
+                canvas.itemconfig(name, text=f"{fonts[index]}（无字体文件）")
+            else:
+                show_image(index)
+        
+        def show_image(index):
+            background, name, image, key = cards[index]
+            rendered = renderer.get(key)
+            if rendered is None:
+                renderer.request(key)
+                return
+            photo = photos.get(key)
+            if photo is None:
+                photo = photos[key] = ImageTk.PhotoImage(rendered)
+            canvas.itemconfig(image, image=photo)
+        
+        def redraw(event=None, force=False):
+            columns = max(1, canvas.winfo_width() // card_width)
+            total_rows = math.ceil(len(fonts) / columns)
+            if columns != layout["columns"] or force:
+                layout["columns"] = columns
+                layout["range"] = None
+                canvas.configure(scrollregion=(0, 0, columns * card_width, total_rows * card_height))
             
-            listbox = tk.Listbox(recent_window, font=("Microsoft YaHei", 10))
-            scrollbar = ttk.Scrollbar(recent_window, orient=tk.VERTICAL, command=listbox.yview)
-            listbox.config(yscrollcommand=scrollbar.set)
+            top = canvas.canvasy(0)
+            first = max(0, int(top // card_height)) * columns
+            last = min(len(fonts), (int((top + canvas.winfo_height()) // card_height) + 1) * columns)
+            if layout["range"] == (first, last):
+                return
+            layout["range"] = (first, last)
             
-            for font_name in self.recent_fonts:
-                listbox.insert(tk.END, font_name)
+            visible = range(first, last)
+            for index in [i for i in cards if i not in visible or force]:
+                background, name, image, key = cards.pop(index)
+                for item in (background, name, image):
+                    canvas.itemconfig(item, state=tk.HIDDEN)
+                free_items.append((background, name, image))
+            for index in visible:
+                if index not in cards:
+                    place_card(index)
             
-            listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            # 只保留可见卡片的渲染请求和图像对象，内存由视口大小和缓存预算决定
+            keys = {card[3] for card in cards.values() if card[3] is not None}
+            renderer.retain(keys)
+            for key in [key for key in photos if key not in keys]:
+                del photos[key]
+        
+        def poll():
+            if not wall.winfo_exists():
+                return
+            completed = set(renderer.take_completed())
+            if completed:
+                for index, card in list(cards.items()):
+                    if card[3] in completed:
+                        show_image(index)
+            wall.after(16, poll)
+        
+        def on_click(event):
+            x, y = canvas.canvasx(event.x), canvas.canvasy(event.y)
+            column, row = int(x // card_width), int(y // card_height)
+            index = row * layout["columns"] + column
+            if column < layout["columns"] and 0 <= index < len(fonts):
+                self.font_family_var.set(fonts[index])
+                self.add_to_recent(fonts[index])
+                self.update_font_display()
+                self.update_favorite_button()
+        
+        def on_wheel(event):
+            if getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0:
+                canvas.yview_scroll(-1, "units")
+            else:
+                canvas.yview_scroll(1, "units")
+            redraw()
+        
+        canvas.configure(yscrollincrement=card_height // 3)
+        canvas.bind("<Configure>", redraw)
+        canvas.bind("<Button-1>", on_click)
+        canvas.bind("<MouseWheel>", on_wheel)
+        canvas.bind("<Button-4>", on_wheel)
+        canvas.bind("<Button-5>", on_wheel)
+        sample_entry.bind("<Return>", lambda e: redraw(force=True))
+        wall.bind("<Destroy>", lambda e: renderer.close() if e.widget is wall else None)
+        wall.after(16, poll)
+    
+    def show_feature_preview(self):
+        """OpenType特性预览：用 raqm 整形渲染示例文本，可开关特性并列出用到的字距对
+        
+        只绘制可见的行，每行的整形结果按 (字体, 特性, 行文本) 缓存；
+        编辑示例文本、滚动或来回切换特性时，只有变化的行需要重新整形。
+        """
+        if not PIL_AVAILABLE or not RAQM_AVAILABLE:
+            messagebox.showerror("缺少依赖库", "OpenType特性预览需要支持 libraqm 的PIL库。\n"
+                                            "请安装 libraqm 后重新安装: pip install pillow")
+            return
+        
+        self.sync_sample_document()
+        window = tk.Toplevel(self.root)
+        window.title("OpenType特性预览")
+        window.geometry("1200x760")
+        
+        state = {"font": None, "font_key": None, "lines": list(self.sample_document.lines),
+                 "depth": 0, "range": None, "pairs_job": None}
+        # 可见行 {行号: (画布图像, 键)}，图像对象只保留可见行的
+        items = {}
+        photos = {}
+        
+        toolbar = ttk.Frame(window, padding="5")
+        toolbar.pack(fill=tk.X)
+        font_label = ttk.Label(toolbar, text="")
+        font_label.pack(side=tk.LEFT)
+        ttk.Label(toolbar, text="字号:").pack(side=tk.LEFT, padx=(15, 0))
+        size_var = tk.IntVar(value=self.font_size_var.get())
+        size_spin = ttk.Spinbox(toolbar, from_=8, to=144, textvariable=size_var, width=5)
+        size_spin.pack(side=tk.LEFT, padx=5)
+        
+        # 左侧特性开关，样式集单独排成网格
+        feature_frame = ttk.Frame(window, padding="5")
+        feature_frame.pack(side=tk.LEFT, fill=tk.Y)
+        feature_vars = {}
+        set_frame = ttk.LabelFrame(feature_frame, text="样式集", padding="3")
+        for tag, label, default in OPENTYPE_FEATURES:
+            feature_vars[tag] = tk.BooleanVar(value=default)
+            if tag.startswith("ss"):
+                number = int(tag[2:]) - 1
+                ttk.Checkbutton(set_frame, text=tag, variable=feature_vars[tag],
+                                command=lambda: redraw(force=True)).grid(row=number // 4, column=number % 4, sticky=tk.W)
+            else:
+                ttk.Checkbutton(feature_frame, text=f"{tag}  {label}", variable=feature_vars[tag],
+                                command=lambda: redraw(force=True)).pack(anchor=tk.W)
+        set_frame.pack(fill=tk.X, pady=(8, 0))
+        
+        # 右侧字距对列表
+        pairs_frame = ttk.Frame(window, padding="5")
+        pairs_frame.pack(side=tk.RIGHT, fill=tk.Y)
+        ttk.Label(pairs_frame, text="可见行中的字距对").pack(anchor=tk.W)
+        pairs_tree = ttk.Treeview(pairs_frame, columns=("adjust", "count"), show="tree headings", height=20)
+        pairs_tree.heading("#0", text="字符对")
+        pairs_tree.heading("adjust", text="调整(px)")
+        pairs_tree.heading("count", text="次数")
+        pairs_tree.column("#0", width=70)
+        pairs_tree.column("adjust", width=70)
+        pairs_tree.column("count", width=50)
+        pairs_tree.pack(fill=tk.Y, expand=True)
+        
+        canvas_frame = ttk.Frame(window)
+        canvas_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        canvas = tk.Canvas(canvas_frame, background="#FFFFFF", highlightthickness=0)
+        y_scroll = ttk.Scrollbar(canvas_frame, orient=tk.VERTICAL,
+                                 command=lambda *args: (canvas.yview(*args), redraw()))
+        x_scroll = ttk.Scrollbar(canvas_frame, orient=tk.HORIZONTAL,
+                                 command=lambda *args: (canvas.xview(*args), redraw()))
+        canvas.configure(yscrollcommand=y_scroll.set, xscrollcommand=x_scroll.set)
+        y_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        x_scroll.pack(side=tk.BOTTOM, fill=tk.X)
+        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        def current_settings():
+            enabled = {tag for tag, var in feature_vars.items() if var.get()}
+            return feature_settings(enabled), "ttb" if "vert" in enabled else None
+        
+        def load_font():
+            try:
+                size = max(8, min(144, int(size_var.get())))
+            except (ValueError, tk.TclError):
+                return
+            font_name = self.font_family_var.get()
+            try:
+                img_font, font_key, face = self.load_image_font(font_name, size, self.bold_var.get(),
+                                                                self.italic_var.get())
+            except OSError as e:
+                messagebox.showerror("错误", f"加载字体时出错: {e}")
+                return
+            state["font"], state["font_key"] = img_font, font_key
+            font_label.config(text=f"{font_name} | {size}pt")
+            redraw(force=True)
+        
+        def slot(index, pitch, direction):
+            # 竖排时从右向左排列各列
+            if direction == "ttb":
+                return state["extent"] - 8 - (index + 1) * pitch, 8
+            return 8, 8 + index * pitch
+        
+        def redraw(event=None, force=False):
+            if state["font"] is None:
+                return
+            settings, direction = current_settings()
+            img_font = state["font"]
+            pitch = ShapedRunCache.line_box(img_font, direction) + 6
+            count = len(state["lines"])
+            if force:
+                for item, key in items.values():
+                    canvas.delete(item)
+                items.clear()
+                state["range"] = None
+                if direction != state.get("direction"):
+                    state["depth"] = 0
+                    state["direction"] = direction
+                    canvas.xview_moveto(1.0 if direction == "ttb" else 0.0)
+                    canvas.yview_moveto(0.0)
             
-            def select_font(event):
-                selection = listbox.curselection()
-                if selection:
-                    font_name = listbox.get(selection[0])
-                    self.font_family_var.set(font_name)
-                    self.update_font_display()
-                    recent_window.destroy()
+            width, height = canvas.winfo_width(), canvas.winfo_height()
+            if direction == "ttb":
+                state["extent"] = max(count * pitch + 16, width)
+                left = canvas.canvasx(0)
+                first = max(0, int((state["extent"] - 8 - left - width) // pitch))
+                last = min(count, int((state["extent"] - 8 - left) // pitch) + 1)
+            else:
+                top = canvas.canvasy(0)
+                first = max(0, int((top - 8) // pitch))
+                last = min(count, int((top + height - 8) // pitch) + 1)
             
-            listbox.bind('<Double-Button-1>', select_font)
-        else:
-            messagebox.showinfo("最近使用", "暂无最近使用的字体")
+            visible = range(first, last)
+            for index in [i for i in items if i not in visible]:
+                canvas.delete(items.pop(index)[0])
+            for index in visible:
+                line = state["lines"][index]
+                key = (state["font_key"], img_font.size, settings, direction, line)
+                if index in items and items[index][1] == key:
+                    continue
+                photo = photos.get(key)
+                if photo is None:
+                    run = self.shaped_runs.run(img_font, state["font_key"], settings, direction, line)
+                    photo = photos[key] = ImageTk.PhotoImage(run.point(lambda v: 255 - v))
+                    state["depth"] = max(state["depth"], run.height if direction == "ttb" else run.width)
+                if index in items:
+                    canvas.delete(items.pop(index)[0])
+                x, y = slot(index, pitch, direction)
+                items[index] = (canvas.create_image(x, y, anchor=tk.NW, image=photo), key)
+            
+            if direction == "ttb":
+                canvas.configure(scrollregion=(0, 0, state["extent"], max(state["depth"] + 16, height)))
+            else:
+                canvas.configure(scrollregion=(0, 0, max(state["depth"] + 16, width), count * pitch + 16))
+            keys = {key for item, key in items.values()}
+            for key in [key for key in photos if key not in keys]:
+                del photos[key]
+            
+            if state["range"] != (first, last, settings) or force:
+                state["range"] = (first, last, settings)
+                if state["pairs_job"] is not None:
+                    window.after_cancel(state["pairs_job"])
+                state["pairs_job"] = window.after(120, update_pairs)
+        
+        def update_pairs():
+            """汇总可见行用到的字距对"""
+            state["pairs_job"] = None
+            if not window.winfo_exists():
+                return
+            settings, direction = current_settings()
+            counts = {}
+            for index in sorted(items):
+                for pair, adjust in self.shaped_runs.kerning_pairs(state["font"], state["font_key"], settings,
+                                                                   direction, state["lines"][index]):
+                    previous = counts.get(pair, (adjust, 0))
+                    counts[pair] = (adjust, previous[1] + 1)
+            pairs_tree.delete(*pairs_tree.get_children())
+            for pair, (adjust, count) in sorted(counts.items(), key=lambda item: -abs(item[1][0])):
+                pairs_tree.insert("", tk.END, text=pair, values=(f"{adjust:+.2f}", count))
+        
+        def apply_change(start, removed, inserted):
+            # 变化之后的行位置可能移动，重新放置；内容未变的行直接取缓存的整形结果
+            state["lines"][start:start + removed] = inserted
+            for index in [i for i in items if i >= start]:
+                canvas.delete(items.pop(index)[0])
+            redraw()
+        
+        def on_wheel(event):
+            step = -1 if getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0 else 1
+            if state.get("direction") == "ttb":
+                canvas.xview_scroll(step, "units")
+            else:
+                canvas.yview_scroll(step, "units")
+            redraw()
+        
+        canvas.configure(yscrollincrement=20, xscrollincrement=20)
+        canvas.bind("<Configure>", redraw)
+        canvas.bind("<MouseWheel>", on_wheel)
+        canvas.bind("<Button-4>", on_wheel)
+        canvas.bind("<Button-5>", on_wheel)
+        size_spin.bind("<Return>", lambda e: load_font())
+        size_spin.configure(command=load_font)
+        ttk.Button(toolbar, text="使用当前字体", command=load_font).pack(side=tk.LEFT, padx=5)
+        self.sample_document.subscribe(apply_change)
+        window.bind("<Destroy>", lambda e: self.sample_document.unsubscribe(apply_change)
+                    if e.widget is window else None)
+        load_font()
+    
+    def show_cache_stats(self):
+        """显示各缓存的命中率、占用和淘汰次数，可调整全局内存预算"""
+        stats_window = tk.Toplevel(self.root)
+        stats_window.title("缓存统计")
+        stats_window.geometry("780x420")
+        
+        control_frame = ttk.Frame(stats_window, padding="10")
+        control_frame.pack(fill=tk.X)
+        ttk.Label(control_frame, text="内存预算 (MB):").pack(side=tk.LEFT)
+        budget_var = tk.IntVar(value=self.cache_manager.budget_bytes // (1024 * 1024))
+        ttk.Spinbox(control_frame, from_=16, to=65536, increment=64, width=8,
+                    textvariable=budget_var).pack(side=tk.LEFT, padx=5)
+        summary_label = ttk.Label(control_frame)
+        summary_label.pack(side=tk.RIGHT)
+        
+        columns = ("name", "priority", "entries", "size", "hits", "misses", "hit_rate", "evictions")
+        headings = ("缓存", "优先级", "条目", "占用 (MB)", "命中", "未命中", "命中率", "淘汰")
+        tree = ttk.Treeview(stats_window, columns=columns, show="headings")
+        for column, heading in zip(columns, headings):
+            tree.heading(column, text=heading)
+            tree.column(column, width=130 if column == "name" else 80, anchor=tk.W if column == "name" else tk.E)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10)
+        
+        def format_rate(rate):
+            return "-" if rate is None else f"{rate:.1%}"
+        
+        def refresh():
+            if not stats_window.winfo_exists():
+                return
+            stats = self.cache_manager.stats()
+            tree.delete(*tree.get_children())
+            for name, cache in sorted(stats["caches"].items()):
+                tree.insert("", tk.END, values=(name, cache["priority"], cache["entries"],
+                                                f"{cache['bytes'] / 1048576:.1f}", cache["hits"], cache["misses"],
+                                                format_rate(cache["hit_rate"]), cache["evictions"]))
+            summary_label.config(text=f"已用 {stats['used_bytes'] / 1048576:.1f} / "
+                                      f"{stats['budget_bytes'] / 1048576:.0f} MB | "
+                                      f"命中率 {format_rate(stats['hit_rate'])} | 淘汰 {stats['evictions']}")
+            stats_window.after(1000, refresh)
+        
+        def apply_budget():
+            try:
+                self.cache_manager.set_budget(budget_var.get() * 1024 * 1024)
+            except (tk.TclError, ValueError):
+                return
+            self.cache_budget = None
+            self.update_status(f"缓存预算已设为 {budget_var.get()} MB")
+        
+        def clear_caches():
+            for cache in self.cache_manager.caches.values():
+                cache.clear()
+        
+        button_frame = ttk.Frame(stats_window, padding="10")
+        button_frame.pack(fill=tk.X)
+        ttk.Button(button_frame, text="应用预算", command=apply_budget).pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="清空缓存", command=clear_caches).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="关闭", command=stats_window.destroy).pack(side=tk.RIGHT)
+        refresh()
     
     def show_font_category(self, category):
         """显示指定分类的字体"""
         self.font_category_var.set(category)
         self.filter_fonts_by_category()
     
+    def show_similar_fonts(self):
+        """查找与当前字体外观相似的字体"""
+        if not (PIL_AVAILABLE and NUMPY_AVAILABLE):
+            messagebox.showerror("缺少依赖库", "相似字体搜索需要PIL和NumPy库。\n请安装: pip install pillow numpy")
+            return
+        
+        font_name = self.font_family_var.get()
+        if self.similarity_index is not None:
+            self.show_similar_fonts_window(font_name)
+            return
+        
+        families = list(self.font_categories["所有字体"])
+        
+        def build(progress):
+            self.font_resolver.ensure_ready()
+            index = FontSimilarityIndex()
+            index.load()
+            index.update(self.font_resolver, families, progress)
+            return index
+        
+        def on_done(index):
+            self.similarity_index = index
+            self.update_status(f"相似度索引已就绪，共 {len(index.entries)} 种字体")
+            self.show_similar_fonts_window(font_name)
+        
+        self.run_in_background(build, on_done, "正在建立相似度索引")
+    
+    def show_similar_fonts_window(self, font_name):
+        """显示相似字体结果窗口"""
+        similar_window = tk.Toplevel(self.root)
+        similar_window.title(f"相似字体 - {font_name}")
+        similar_window.geometry("400x450")
+        
+        control_frame = ttk.Frame(similar_window, padding="10")
+        control_frame.pack(fill=tk.X)
+        
+        ttk.Label(control_frame, text="数量:").pack(side=tk.LEFT)
+        count_var = tk.IntVar(value=10)
+        ttk.Spinbox(control_frame, from_=1, to=100, textvariable=count_var, width=5).pack(side=tk.LEFT, padx=5)
+        
+        list_frame = ttk.Frame(similar_window)
+        list_frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        
+        listbox = tk.Listbox(list_frame, font=("Microsoft YaHei", 10))
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=listbox.yview)
+        listbox.config(yscrollcommand=scrollbar.set)
+        listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        results = []
+        
+        def search():
+            start = time.perf_counter()
+            results[:] = self.similarity_index.query(font_name, count_var.get())
+            elapsed = (time.perf_counter() - start) * 1000
+            
+            listbox.delete(0, tk.END)
+            for family, score in results:
+                listbox.insert(tk.END, f"{family}  ({score:.3f})")
+            if not results:
+                listbox.insert(tk.END, "未找到该字体的字体文件")
+            self.update_status(f"相似字体查询耗时 {elapsed:.1f} ms")
+        
+        def select_font(event):
+            selection = listbox.curselection()
+            if selection and selection[0] < len(results):
+                family = results[selection[0]][0]
+                self.font_family_var.set(family)
+                self.add_to_recent(family)
+                self.update_font_display()
+                self.update_favorite_button()
+        
+        ttk.Button(control_frame, text="查找", command=search).pack(side=tk.LEFT, padx=5)
+        listbox.bind('<Double-Button-1>', select_font)
+        search()
+    
+    def scan_duplicates(self, on_done):
+        """在后台扫描重复字体"""
+        directories = self.font_resolver.directories
+        
+        def scan(progress):
+            detector = FontDuplicateDetector()
+            detector.load()
+            detector.scan(list(iter_font_files(directories)), progress)
+            return detector, detector.find_groups()
+        
+        def finished(result):
+            self.duplicate_detector, self.duplicate_groups = result
+            self.hidden_duplicates = self.duplicate_detector.redundant_families(self.duplicate_groups)
+            self.update_status(f"发现 {len(self.duplicate_groups)} 组重复字体")
+            on_done()
+        
+        self.run_in_background(scan, finished, "正在检测重复字体")
+    
+    def toggle_hide_duplicates(self):
+        """切换是否隐藏重复字体"""
+        if self.hide_duplicates_var.get() and self.duplicate_detector is None:
+            self.scan_duplicates(self.toggle_hide_duplicates)
+            return
+        self.font_family_combo['values'] = self.current_font_list()
+    
+    def show_duplicate_report(self):
+        """显示重复字体报告"""
+        if self.duplicate_detector is None:
+            self.scan_duplicates(self.show_duplicate_report)
+            return
+        
+        report_window = tk.Toplevel(self.root)
+        report_window.title(f"重复字体报告 - 共 {len(self.duplicate_groups)} 组")
+        report_window.geometry("900x500")
+        
+        tree_frame = ttk.Frame(report_window)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        tree = ttk.Treeview(tree_frame, columns=("style", "reason", "path"))
+        tree.heading("#0", text="字体")
+        tree.heading("style", text="样式")
+        tree.heading("reason", text="原因")
+        tree.heading("path", text="文件路径")
+        tree.column("#0", width=220)
+        tree.column("style", width=100)
+        tree.column("reason", width=140)
+        tree.column("path", width=400)
+        
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        for group in self.duplicate_groups:
+            faces = group["faces"]
+            parent = tree.insert("", tk.END, text=f"{faces[0]['family']} ({len(faces)})",
+                                 values=("", "、".join(group["reasons"]), ""))
+            for face in faces:
+                tree.insert(parent, tk.END, text=face["family"],
+                            values=(face["style"], "", f"{face['path']}#{face['index']}"))
+        
+        def export_report():
+            file_path = filedialog.asksaveasfilename(
+                defaultextension=".json",
+                filetypes=[("JSON 文件", "*.json"), ("所有文件", "*.*")],
+                initialfile=f"重复字体报告_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+            )
+            if file_path:
+                try:
+                    with open(file_path, "w", encoding="utf-8") as f:
+                        json.dump(self.duplicate_groups, f, ensure_ascii=False, indent=2)
+                    self.update_status(f"报告已保存: {os.path.basename(file_path)}")
+                except Exception as e:
+                    messagebox.showerror("错误", f"保存报告时出错: {e}")
+        
+        def rescan():
+            report_window.destroy()
+            self.scan_duplicates(self.show_duplicate_report)
+        
+        button_frame = ttk.Frame(report_window)
+        button_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        ttk.Button(button_frame, text="导出报告", command=export_report).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="重新扫描", command=rescan).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="关闭", command=report_window.destroy).pack(side=tk.RIGHT, padx=5)
+    
+    def apply_quarantine(self):
+        """按健康检查结果隔离有问题的字体文件：不再用于渲染，所有文件都有问题的家族从列表中隐藏"""
+        paths = self.health_checker.quarantined() if self.quarantine_var.get() else set()
+        self.font_resolver.set_quarantine(paths)
+        self.quarantined_families = self.font_resolver.quarantined_families() if self.font_resolver.ready else set()
+        self.fallback_resolver.invalidate()
+        self.font_family_combo['values'] = self.current_font_list()
+    
+    def scan_font_health(self, on_done):
+        """在后台检查所有字体文件（每个文件在独立进程中检查）"""
+        directories = self.font_resolver.directories + [resolver.directories[0] for resolver in self.folder_sources.values()]
+        
+        def scan(progress):
+            paths = list(iter_font_files(directories))
+            self.health_checker.scan(paths, progress)
+            return self.health_checker.summary()
+        
+        def finished(summary):
+            self.apply_quarantine()
+            problems = sum(summary.get(status, 0) for status in FontHealthChecker.QUARANTINE_STATUSES)
+            self.update_status(f"健康检查完成：{problems} 个文件有问题，{summary.get('warning', 0)} 个有警告")
+            on_done()
+        
+        self.run_in_background(scan, finished, "正在检查字体文件")
+    
+    def show_health_report(self):
+        """显示字体健康检查结果（只列出有问题或有警告的文件）"""
+        if not self.health_checker.records:
+            self.scan_font_health(self.show_health_report)
+            return
+        
+        status_names = {"error": "损坏", "timeout": "超时", "crash": "崩溃", "warning": "警告"}
+        flagged = sorted(((path, record) for path, record in self.health_checker.records.items()
+                          if record["status"] != "ok"),
+                         key=lambda item: (item[1]["status"] == "warning", item[0]))
+        report_window = tk.Toplevel(self.root)
+        report_window.title(f"字体健康检查 - 共 {len(self.health_checker.records)} 个文件，{len(flagged)} 个需要注意")
+        report_window.geometry("900x500")
+        
+        tree_frame = ttk.Frame(report_window)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        tree = ttk.Treeview(tree_frame, columns=("status", "render", "issues"))
+        tree.heading("#0", text="文件")
+        tree.heading("status", text="状态")
+        tree.heading("render", text="渲染耗时")
+        tree.heading("issues", text="问题")
+        tree.column("#0", width=320)
+        tree.column("status", width=60)
+        tree.column("render", width=80)
+        tree.column("issues", width=420)
+        
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        for path, record in flagged:
+            tree.insert("", tk.END, text=path,
+                        values=(status_names.get(record["status"], record["status"]),
+                                f"{record.get('render_ms', 0):.0f} ms", "；".join(record["issues"])))
+        if not flagged:
+            tree.insert("", tk.END, text="所有字体文件都通过了检查")
+        
+        def export_report():
+            file_path = filedialog.asksaveasfilename(
+                defaultextension=".json",
+                filetypes=[("JSON 文件", "*.json"), ("所有文件", "*.*")],
+                initialfile=f"字体健康检查_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+            )
+            if file_path:
+                try:
+                    with open(file_path, "w", encoding="utf-8") as f:
+                        json.dump(dict(flagged), f, ensure_ascii=False, indent=2)
+                    self.update_status(f"报告已保存: {os.path.basename(file_path)}")
+                except Exception as e:
+                    messagebox.showerror("错误", f"保存报告时出错: {e}")
+        
+        def rescan():
+            report_window.destroy()
+            self.scan_font_health(self.show_health_report)
+        
+        button_frame = ttk.Frame(report_window)
+        button_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        ttk.Button(button_frame, text="导出报告", command=export_report).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="重新检查", command=rescan).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="关闭", command=report_window.destroy).pack(side=tk.RIGHT, padx=5)
+    
     def compare_fonts(self):
         """字体对比功能"""
         if not self.compare_fonts_list or len(self.compare_fonts_list) < 2:
@@ -799,6 +6339,10 @@ The five boxing wizards jump quickly.""",
     
     def show_compare_window(self):
         """显示对比窗口"""
+        self.record_interaction("compare", list(self.compare_fonts_list))
+        if not self.replaying:
+            self.usage_history.record_compare(self.compare_fonts_list)
+        self.sync_sample_document()
         compare_window = tk.Toplevel(self.root)
         compare_window.title("字体对比")
         compare_window.geometry("1200x700")
@@ -835,8 +6379,8 @@ The five boxing wizards jump quickly.""",
         cols = math.ceil(math.sqrt(num_fonts))
         rows = math.ceil(num_fonts / cols)
         
-        # 获取文本内容
-        sample_text = self.text_display.get(1.0, tk.END)
+        # 各窗格的文本随主窗口的示例文本同步
+        text_widgets = []
         
         # 创建字体显示区域
         for i, font_name in enumerate(self.compare_fonts_list[:num_fonts]):
@@ -853,15 +6397,9 @@ The five boxing wizards jump quickly.""",
             font_frame.columnconfigure(0, weight=1)
             font_frame.rowconfigure(0, weight=1)
             
-            # 创建字体
-            current_font = font.Font(
-                family=font_name, 
-                size=font_size,
-                weight="bold" if bold else "normal",
-                slant="italic" if italic else "roman",
-                underline=underline,
-                overstrike=overstrike
-            )
+            # 创建字体（复用最近创建过的字体对象）
+            current_font = self.get_tk_font(font_name, font_size, "bold" if bold else "normal",
+                                            "italic" if italic else "roman", underline, overstrike)
             
             # 创建文本显示框
             text_widget = tk.Text(
@@ -881,8 +6419,35 @@ The five boxing wizards jump quickly.""",
             text_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
             
             # 添加文本
-            text_widget.insert(1.0, sample_text)
+            text_widget.insert(1.0, self.sample_document.text)
             text_widget.config(state=tk.DISABLED)
+            text_widgets.append(text_widget)
+        
+        def apply_change(start, removed, inserted):
+            """只替换变化的行，Text 组件只重新排版这些行"""
+            first = f"{start + 1}.0"
+            block = "\n".join(inserted)
+            for text_widget in text_widgets:
+                text_widget.config(state=tk.NORMAL)
+                if text_widget.compare(f"{start + removed + 1}.0", ">=", "end"):
+                    # 变化延伸到最后一行：从前一行的行尾删除到文本末尾
+                    if start:
+                        text_widget.delete(f"{start}.end", "end-1c")
+                        if inserted:
+                            text_widget.insert("end-1c", "\n" + block)
+                    else:
+                        text_widget.delete(1.0, "end-1c")
+                        text_widget.insert(1.0, block)
+                else:
+                    if removed:
+                        text_widget.delete(first, f"{start + removed + 1}.0")
+                    if inserted:
+                        text_widget.insert(first, block + "\n")
+                text_widget.config(state=tk.DISABLED)
+        
+        self.sample_document.subscribe(apply_change)
+        compare_window.bind("<Destroy>", lambda e: self.sample_document.unsubscribe(apply_change)
+                            if e.widget is compare_window else None)
         
         # 添加控制按钮
         button_frame = ttk.Frame(compare_window)
@@ -905,53 +6470,138 @@ The five boxing wizards jump quickly.""",
                     ],
                     initialfile=f"font_comparison_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
                 )
+                compare_fonts = list(self.compare_fonts_list[:num_fonts])
+                sample_text = self.sample_document.text
                 
-                if file_path:
-                    # 计算图片尺寸
+                def task(job):
                     img_width = 1200
-                    img_height = 800
+                    max_lines = 10  # 每种字体最多显示10行
+                    title_font = self.load_image_font("Arial", 20)[0]
+                    label_font = self.load_image_font("Arial", 14)[0]
+                    
+                    # 先排版每种字体，按实际行高计算图片高度
+                    blocks = []
+                    for i, font_name in enumerate(compare_fonts):
+                        job.report(i, len(compare_fonts) + 1)
+                        img_font, font_key, face = self.load_image_font(font_name, font_size, bold, italic)
+                        lines = self.layout_engine.wrap(sample_text, img_font, font_key, img_width - 120)
+                        line_height = self.layout_engine.line_height(img_font, face)
+                        blocks.append((font_name, img_font, lines[:max_lines], line_height))
+                    img_height = 60 + sum(30 + len(lines) * lh + 30 for _, _, lines, lh in blocks)
                     
                     # 创建图片
                     image = Image.new('RGB', (img_width, img_height), '#FFFFFF')
                     draw = ImageDraw.Draw(image)
                     
                     # 绘制标题
-                    draw.text((50, 20), "字体对比结果", fill='#000000', 
-                             font=ImageFont.truetype("arial.ttf", 20))
+                    draw.text((50, 20), "字体对比结果", fill='#000000', font=title_font)
                     
                     # 绘制字体对比
                     y_offset = 60
-                    sample_lines = sample_text.split('\n')[:10]  # 只取前10行
-                    
-                    for i, font_name in enumerate(self.compare_fonts_list[:num_fonts]):
-                        try:
-                            img_font = ImageFont.truetype(font_name, font_size)
-                        except:
-                            img_font = ImageFont.load_default()
-                        
+                    for font_name, img_font, lines, line_height in blocks:
                         # 绘制字体名称
-                        draw.text((50, y_offset), f"{font_name}:", fill='#000000', 
-                                 font=ImageFont.truetype("arial.ttf", 14))
+                        draw.text((50, y_offset), f"{font_name}:", fill='#000000', font=label_font)
                         
                         # 绘制示例文本
                         text_y = y_offset + 30
-                        for line in sample_lines[:3]:  # 只取前3行
+                        for line in lines:
                             draw.text((70, text_y), line, fill='#000000', font=img_font)
-                            text_y += 30
+                            text_y += line_height
                         
-                        y_offset += 150
+                        y_offset = text_y + 30
                     
                     # 保存图片
+                    job.report(len(compare_fonts), len(compare_fonts) + 1)
                     image.save(file_path)
-                    self.update_status(f"对比结果已导出: {os.path.basename(file_path)}")
-                    messagebox.showinfo("导出成功", f"对比结果已导出到:\n{file_path}")
+                
+                if file_path:
+                    self.submit_export_job(f"对比: {os.path.basename(file_path)}", task)
                     
             except Exception as e:
                 messagebox.showerror("导出失败", f"导出对比结果时出错: {e}")
         
         ttk.Button(button_frame, text="导出为图片", command=export_comparison).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="像素差异",
+                   command=lambda: self.show_pixel_diff_window(self.compare_fonts_list[:num_fonts])).pack(
+            side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="关闭", command=compare_window.destroy).pack(side=tk.RIGHT, padx=5)
     
+    def show_pixel_diff_window(self, font_names):
+        """显示两种字体渲染结果的像素差异"""
+        if not (PIL_AVAILABLE and NUMPY_AVAILABLE):
+            messagebox.showerror("缺少依赖库", "像素差异功能需要PIL和NumPy库。\n请安装: pip install pillow numpy")
+            return
+        
+        diff_window = tk.Toplevel(self.root)
+        diff_window.title("像素差异")
+        diff_window.geometry("1100x700")
+        
+        control_frame = ttk.Frame(diff_window, padding="10")
+        control_frame.pack(fill=tk.X)
+        font_a_var = tk.StringVar(value=font_names[0])
+        font_b_var = tk.StringVar(value=font_names[1] if len(font_names) > 1 else font_names[0])
+        ttk.Label(control_frame, text="字体A (红):").pack(side=tk.LEFT)
+        ttk.Combobox(control_frame, textvariable=font_a_var, values=font_names, width=25).pack(side=tk.LEFT, padx=5)
+        ttk.Label(control_frame, text="字体B (蓝):").pack(side=tk.LEFT)
+        ttk.Combobox(control_frame, textvariable=font_b_var, values=font_names, width=25).pack(side=tk.LEFT, padx=5)
+        full_set_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(control_frame, text="比较全部共有字符", variable=full_set_var).pack(side=tk.LEFT, padx=5)
+        
+        content = ttk.PanedWindow(diff_window, orient=tk.HORIZONTAL)
+        content.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+        
+        canvas_frame = ttk.Frame(content)
+        canvas = tk.Canvas(canvas_frame, background="#FFFFFF")
+        canvas_scrollbar = ttk.Scrollbar(canvas_frame, orient=tk.VERTICAL, command=canvas.yview)
+        canvas.configure(yscrollcommand=canvas_scrollbar.set)
+        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        canvas_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        content.add(canvas_frame, weight=3)
+        
+        list_frame = ttk.LabelFrame(content, text="差异最大的字形", padding="5")
+        listbox = tk.Listbox(list_frame, font=("Microsoft YaHei", 11))
+        list_scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=listbox.yview)
+        listbox.config(yscrollcommand=list_scrollbar.set)
+        listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        list_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        content.add(list_frame, weight=1)
+        
+        def compute():
+            face_a = self.resolve_font_face(font_a_var.get(), self.bold_var.get(), self.italic_var.get())
+            face_b = self.resolve_font_face(font_b_var.get(), self.bold_var.get(), self.italic_var.get())
+            if face_a is None or face_b is None:
+                messagebox.showerror("像素差异", "找不到字体文件，无法渲染")
+                return
+            
+            text = self.text_display.get(1.0, tk.END)
+            full_set = full_set_var.get()
+            
+            def task(progress):
+                diff = FontPixelDiff(face_a, face_b)
+                heatmap, ratio = diff.text_heatmap(text, 760, self.layout_engine)
+                chars = None if full_set else sorted(set(text) - set(" \n\t"))
+                return heatmap, ratio, diff.glyph_scores(chars, progress)
+            
+            def finished(result):
+                if not diff_window.winfo_exists():
+                    return
+                heatmap, ratio, scores = result
+                photo = ImageTk.PhotoImage(heatmap)
+                canvas.delete("all")
+                canvas.create_image(0, 0, image=photo, anchor="nw")
+                canvas.configure(scrollregion=(0, 0, heatmap.width, heatmap.height))
+                canvas.image = photo
+                
+                listbox.delete(0, tk.END)
+                for char, score in scores[:500]:
+                    listbox.insert(tk.END, f"{char}  U+{ord(char):04X}  {score:.3f}")
+                diff_window.title(f"像素差异 - 文本差异 {ratio:.1%}，比较了 {len(scores)} 个字形")
+            
+            self.run_in_background(task, finished, "正在计算像素差异")
+        
+        ttk.Button(control_frame, text="计算", command=compute).pack(side=tk.LEFT, padx=5)
+        compute()
+    
     def generate_report(self):
         """生成字体报告"""
         try:
@@ -1012,6 +6662,41 @@ The five boxing wizards jump quickly.""",
         except Exception as e:
             messagebox.showerror("错误", f"生成报告时出错: {e}")
     
+    def export_catalog_report(self):
+        """将当前分类的所有字体导出为CSV或JSON Lines报告"""
+        category = self.font_category_var.get()
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV 文件", "*.csv"), ("JSON Lines 文件", "*.jsonl"), ("所有文件", "*.*")],
+            initialfile=f"字体目录报告_{category}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        )
+        if not file_path:
+            return
+        resume = os.path.exists(file_path) and messagebox.askyesno(
+            "目录报告", "文件已存在，是否从中断的位置继续？\n选择“否”将覆盖该文件。")
+        
+        families = list(self.font_categories.get(category, self.font_categories["所有字体"]))
+        categories = {}
+        for name, fonts in self.font_categories.items():
+            if name not in ("所有字体",):
+                for family in fonts:
+                    categories.setdefault(family, []).append(name)
+        
+        def task(progress):
+            self.font_resolver.ensure_ready()
+            if self.duplicate_detector is not None:
+                duplicates = self.duplicate_detector.family_status(self.duplicate_groups)
+            else:
+                duplicates = load_duplicate_status()
+            items = [(family, categories.get(family, []), self.resolve_font_face(family),
+                      duplicates.get(family.lower(), "")) for family in families]
+            return CatalogReport(file_path).write(items, progress, resume)
+        
+        def finished(written):
+            self.update_status(f"目录报告已保存: {os.path.basename(file_path)}，写入 {written} 行")
+        
+        self.run_in_background(task, finished, "正在生成目录报告")
+    
     def save_preset(self):
         """保存当前设置为预设"""
         preset = {
@@ -1059,22 +6744,17 @@ The five boxing wizards jump quickly.""",
             # 创建选择窗口
             preset_window = tk.Toplevel(self.root)
             preset_window.title("加载预设")
-            preset_window.geometry("400x300")
+            preset_window.geometry("440x400")
             
-            listbox = tk.Listbox(preset_window, font=("Microsoft YaHei", 10))
-            scrollbar = ttk.Scrollbar(preset_window, orient=tk.VERTICAL, command=listbox.yview)
-            listbox.config(yscrollcommand=scrollbar.set)
-            
-            for preset_name in presets.keys():
-                listbox.insert(tk.END, preset_name)
-            
-            listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=10, pady=10)
-            scrollbar.pack(side=tk.RIGHT, fill=tk.Y, pady=10)
+            list_frame = ttk.Frame(preset_window, padding="10")
+            list_frame.pack(fill=tk.BOTH, expand=True)
+            tree = self.create_thumbnail_list(
+                list_frame, [(name, preset["font_family"]) for name, preset in presets.items()])
             
             def load_selected_preset():
-                selection = listbox.curselection()
+                selection = tree.selection()
                 if selection:
-                    preset_name = listbox.get(selection[0])
+                    preset_name = selection[0]
                     preset = presets[preset_name]
                     
                     self.font_family_var.set(preset["font_family"])
@@ -1112,6 +6792,234 @@ The five boxing wizards jump quickly.""",
         self.update_font_display()
         self.update_status("设置已重置")
     
+    def collect_session(self):
+        """收集当前会话状态和预热缓存，返回 {标签: 字节}"""
+        first_visible = self.text_display.yview()[0]
+        state = {
+            "font_family": self.font_family_var.get(),
+            "font_size": self.font_size_var.get(),
+            "bold": self.bold_var.get(),
+            "italic": self.italic_var.get(),
+            "underline": self.underline_var.get(),
+            "overstrike": self.overstrike_var.get(),
+            "category": self.font_category_var.get(),
+            "search": self.search_var.get(),
+            "sample_text": self.text_display.get(1.0, "end-1c"),
+            "scroll": first_visible,
+            "compare_mode": self.compare_mode,
+            "compare_fonts": self.compare_fonts_list,
+            "recent_fonts": self.recent_fonts,
+            "geometry": self.root.geometry(),
+            "tk_fonts": [list(spec) for spec in self.tk_fonts.keys()],
+            "cache_budget": self.cache_manager.budget_bytes
+        }
+        
+        # 分类结果只保存内置分类，文件夹来源下次需要重新打开
+        builtin = {name: fonts for name, fonts in self.font_categories.items() if name not in self.folder_sources}
+        families = self.font_categories["所有字体"]
+        index = {
+            "digest": self.font_index_digest(families),
+            "categories": builtin
+        }
+        
+        sections = {
+            "STAT": SessionStore.encode_json(state),
+            "INDX": SessionStore.encode_json(index)
+        }
+        if self.variation_renderer is not None:
+            with self.variation_renderer.condition:
+                frames = list(self.variation_renderer.frames.items())[-8:]
+            sections["FRAM"] = SessionStore.encode_frames(frames)
+        return sections
+    
+    def save_session(self):
+        """保存会话快照（回放时不保存，避免覆盖真实会话）"""
+        if self.replaying:
+            return
+        try:
+            self.session_store.save(self.collect_session())
+        except (OSError, tk.TclError):
+            pass
+        # 会话保存失败时仍保存使用记录
+        try:
+            self.usage_history.save()
+        except OSError:
+            pass
+    
+    def autosave_session(self):
+        """定期保存会话快照，防止异常退出时丢失"""
+        self.save_session()
+        self.root.after(self.SESSION_SAVE_INTERVAL, self.autosave_session)
+    
+    def quit_app(self):
+        """保存会话后退出"""
+        self.save_session()
+        self.root.quit()
+    
+    def restore_session(self):
+        """在加载字体前恢复界面状态，使首次显示就是上次离开时的样子"""
+        state = SessionStore.decode_json(self.session, "STAT")
+        if not state:
+            return
+        try:
+            self.root.geometry(state["geometry"])
+            if self.cache_budget is None and state.get("cache_budget"):
+                self.cache_manager.set_budget(state["cache_budget"])
+            self.font_family_var.set(state["font_family"])
+            self.font_size_var.set(state["font_size"])
+            for name in ("bold", "italic", "underline", "overstrike"):
+                getattr(self, f"{name}_var").set(state[name])
+            self.font_category_var.set(state["category"])
+            self.search_var.set(state["search"])
+            self.text_display.delete(1.0, tk.END)
+            self.text_display.insert(1.0, state["sample_text"])
+            self.recent_fonts = state["recent_fonts"][:self.max_recent]
+            self.compare_fonts_list = list(state["compare_fonts"])
+            if state["compare_mode"]:
+                self.compare_mode = True
+                self.compare_mode_btn.config(text=f"对比模式({len(self.compare_fonts_list)}/4)",
+                                             style="Accent.TButton")
+        except (KeyError, TypeError, tk.TclError):
+            pass
+    
+    def font_index_digest(self, font_families):
+        """字体列表和分类规则的摘要，任一变化时快照中的分类结果失效"""
+        digest = hashlib.sha1("\n".join(font_families).encode("utf-8"))
+        digest.update(json.dumps(self.category_rules.rules, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+    
+    def restore_font_index(self, font_families):
+        """字体列表与快照一致时恢复分类结果，返回是否成功"""
+        index = SessionStore.decode_json(self.session, "INDX")
+        if not index:
+            return False
+        if index.get("digest") != self.font_index_digest(font_families):
+            return False
+        for name, fonts in index["categories"].items():
+            self.font_categories[name] = fonts
+        self.font_categories["所有字体"] = font_families
+        self.font_categories["收藏夹"] = self.favorites
+        return True
+    
+    def restore_session_view(self):
+        """字体加载后恢复滚动位置，并在空闲时预热上次使用的字体和帧"""
+        state = SessionStore.decode_json(self.session, "STAT") or {}
+        scroll = state.get("scroll")
+        if scroll:
+            self.root.after_idle(lambda: self.text_display.yview_moveto(scroll))
+        
+        def warm():
+            for spec in state.get("tk_fonts", []):
+                try:
+                    self.get_tk_font(*spec)
+                except (TypeError, tk.TclError):
+                    continue
+            frames = SessionStore.decode_frames(self.session["FRAM"]) if "FRAM" in self.session else []
+            if frames:
+                if self.variation_renderer is None:
+                    self.variation_renderer = VariationFrameRenderer(cache_manager=self.cache_manager)
+                with self.variation_renderer.condition:
+                    for key, image in frames:
+                        self.variation_renderer.frames.setdefault(key, image)
+            self.session = {}
+        
+        self.root.after_idle(warm)
+    
+    def on_style_changed(self, name):
+        """样式复选框变化"""
+        self.record_interaction("style", name, getattr(self, name).get())
+        self.update_font_display()
+    
+    def on_font_size_changed(self):
+        """字体大小变化（滑块、输入框）"""
+        self.record_interaction("size", self.font_size_var.get())
+        self.update_font_display()
+    
+    def record_interaction(self, action, *args):
+        """正在录制时记录一次交互"""
+        if self.recorder is not None and not self.replaying:
+            self.recorder.record(action, *args)
+    
+    def toggle_interaction_recording(self):
+        """开始或停止录制交互，停止时保存轨迹"""
+        if self.recorder is None:
+            self.recorder = InteractionRecorder()
+            self.update_status("正在录制交互，再次选择菜单项停止", timeout=None)
+            return
+        
+        recorder, self.recorder = self.recorder, None
+        self.recording_var.set(False)
+        if not recorder.events:
+            self.update_status("没有录制到交互")
+            return
+        os.makedirs(TRACES_DIR, exist_ok=True)
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            initialdir=TRACES_DIR,
+            filetypes=[("JSON 文件", "*.json"), ("所有文件", "*.*")],
+            initialfile=f"trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        )
+        if file_path:
+            try:
+                recorder.save(file_path, len(self.font_categories["所有字体"]))
+                self.update_status(f"已保存 {len(recorder.events)} 个交互: {os.path.basename(file_path)}")
+            except Exception as e:
+                messagebox.showerror("错误", f"保存交互轨迹时出错: {e}")
+    
+    def apply_interaction(self, action, args):
+        """执行一个录制的交互（与界面操作走相同的处理函数）"""
+        if action == "size":
+            self.font_size_var.set(args[0])
+        elif action == "search":
+            self.search_var.set(args[0])
+            self.filter_fonts_by_search()
+        elif action == "style":
+            getattr(self, args[0]).set(args[1])
+            self.update_font_display()
+        elif action == "category":
+            self.font_category_var.set(args[0])
+            self.filter_fonts_by_category()
+        elif action == "font":
+            self.font_family_var.set(args[0])
+            self.on_font_selected()
+        elif action == "compare":
+            self.compare_fonts_list = list(args[0])
+            self.show_compare_window()
+        else:
+            raise ValueError(f"未知的交互动作: {action}")
+    
+    def replay_interactions(self, events, on_done):
+        """按录制时的间隔（最多 REPLAY_MAX_GAP 秒）回放交互，测量每个事件从计划时间到绘制完成的延迟
+        
+        on_done 接收 [(动作, 秒), ...]。
+        """
+        self.replaying = True
+        latencies = []
+        
+        def run(position, scheduled_at):
+            if position >= len(events):
+                self.replaying = False
+                on_done(latencies)
+                return
+            event = events[position]
+            existing = set(self.root.winfo_children())
+            self.apply_interaction(event["action"], event["args"])
+            self.root.update_idletasks()
+            latencies.append((event["action"], time.perf_counter() - scheduled_at))
+            
+            # 回放打开的窗口在测量后关闭
+            for child in self.root.winfo_children():
+                if child not in existing and isinstance(child, tk.Toplevel):
+                    child.destroy()
+            
+            if position + 1 < len(events):
+                gap = min(self.REPLAY_MAX_GAP, max(0.0, events[position + 1]["t"] - event["t"]))
+            else:
+                gap = 0.0
+            self.root.after(int(gap * 1000), run, position + 1, time.perf_counter() + gap)
+        
+        run(0, time.perf_counter())
+    
     def bind_shortcuts(self):
         """绑定键盘快捷键"""
         # Ctrl+S: 保存预设
@@ -1133,7 +7041,7 @@ The five boxing wizards jump quickly.""",
         self.root.bind('<Control-t>', lambda e: self.customize_sample_text())
         
         # Ctrl+Q: 退出
-        self.root.bind('<Control-q>', lambda e: self.root.quit())
+        self.root.bind('<Control-q>', lambda e: self.quit_app())
         
         # Ctrl+M: 对比模式
         self.root.bind('<Control-m>', lambda e: self.toggle_compare_mode())
@@ -1179,6 +7087,37 @@ Ctrl + Q: 退出程序
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="字体查看器 - Python Font Viewer")
+    parser.add_argument("--report", metavar="文件", help="不启动界面，直接生成目录报告（.csv 或 .jsonl）")
+    parser.add_argument("--category", help="只报告指定分类的字体")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="报告格式（默认按扩展名判断）")
+    parser.add_argument("--resume", action="store_true", help="从中断的报告继续写入")
+    parser.add_argument("--replay", metavar="轨迹", help="回放录制的交互轨迹并报告延迟分位数（可在 xvfb-run 下运行）")
+    parser.add_argument("--replay-output", metavar="文件", help="把回放延迟报告写入JSON文件")
+    parser.add_argument("--baseline", metavar="文件", help="与基准延迟报告比较，p95 超出容差时返回非零退出码")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="相对基准 p95 的容差倍数（默认 1.25）")
+    parser.add_argument("--cache-budget", type=int, metavar="MB", help="缓存内存预算（默认为物理内存的1/16）")
+    parser.add_argument("--health-check", nargs="*", metavar="目录",
+                        help="不启动界面，检查字体文件（默认为系统字体目录），有问题的文件会被隔离")
+    parser.add_argument("--timeout", type=float, default=FontHealthChecker.TIMEOUT, help="健康检查中每个文件的超时秒数")
+    parser.add_argument("--build-snapshot", metavar="文件", help="不启动界面，生成可分发的目录快照")
+    parser.add_argument("--snapshot", metavar="文件", default=CATALOG_SNAPSHOT_FILE,
+                        help=f"启动时采用的目录快照（默认 {CATALOG_SNAPSHOT_FILE}）")
+    args = parser.parse_args()
+    
+    if args.build_snapshot:
+        run_build_snapshot(args.build_snapshot)
+        return
+    
+    if args.health_check is not None:
+        sys.exit(run_health_check(args.health_check or None, args.timeout))
+    
+    if args.report:
+        run_catalog_report(args.report, args.category, args.format, args.resume)
+        return
+    
+    events = load_interaction_trace(args.replay) if args.replay else None
+    
     root = tk.Tk()
     
     # 设置窗口风格
@@ -1195,7 +7134,30 @@ def main():
     except:
         pass
     
-    app = FontViewer(root)
+    app = FontViewer(root, args.cache_budget * 1024 * 1024 if args.cache_budget else None, args.snapshot)
+    
+    if events is not None:
+        result = {}
+        
+        def replay_done(latencies):
+            report = latency_report(latencies)
+            print(json.dumps(report, ensure_ascii=False, indent=2))
+            if args.replay_output:
+                with open(args.replay_output, "w", encoding="utf-8") as f:
+                    json.dump(report, f, ensure_ascii=False, indent=2)
+            if args.baseline:
+                with open(args.baseline, "r", encoding="utf-8") as f:
+                    regressions = compare_latency_reports(report, json.load(f), args.tolerance)
+                for regression in regressions:
+                    sys.stderr.write(f"延迟回归 {regression}\n")
+                result["failed"] = bool(regressions)
+            root.quit()
+        
+        # 等待启动时的字体加载和首次绘制完成后再开始回放
+        root.after(1000, lambda: app.replay_interactions(events, replay_done))
+        root.mainloop()
+        sys.exit(1 if result.get("failed") else 0)
+    
     root.mainloop()
 
 if __name__ == "__main__":